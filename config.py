@@ -29,6 +29,7 @@ class Config:
         self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
         self.EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
         self.CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "512"))
+        self.CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
         self.TIMEOUT = int(os.getenv("TIMEOUT", "30"))
         self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
         self.MONITORING_ENABLED = os.getenv("MONITORING_ENABLED", "false").lower() == "true"
@@ -73,6 +74,7 @@ class Config:
             'OPENAI_API_KEY': self.OPENAI_API_KEY,
             'EMBEDDING_MODEL': self.EMBEDDING_MODEL,
             'CHUNK_SIZE': self.CHUNK_SIZE,
+            'CHUNK_OVERLAP': self.CHUNK_OVERLAP,
             'TIMEOUT': self.TIMEOUT,
             'LOG_LEVEL': self.LOG_LEVEL,
             'MONITORING_ENABLED': self.MONITORING_ENABLED
@@ -0,0 +1,431 @@
+"""
+Per-Session Conversation Store
+Keeps every conversation session in its own append-only JSONL file so adding
+a turn is a single line append, loads sessions lazily on first access and
+serves recent history from an in-memory ring buffer. Recent history can also
+be retrieved under a token budget, optionally led by a rolling summary of the
+older turns, and followed incrementally by search indexes.
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from memory_store import FileLock
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Per-message framing overhead of chat prompts (role markers, separators)
+TURN_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate: about four characters per token for BPE vocabularies."""
+    return (len(text) + 3) // 4
+
+
+def extractive_turn_summary(previous: Optional[str], turns: List[Any], max_chars: int = 2000) -> str:
+    """Default rolling summary: the previous summary plus one clipped line per turn, newest text kept."""
+    lines = [previous] if previous else []
+    lines += [f"{turn.role}: {turn.content.strip().split(chr(10), 1)[0][:200]}" for turn in turns]
+    text = "\n".join(lines)
+    return text if len(text) <= max_chars else "..." + text[-(max_chars - 3):]
+
+
+@dataclass(frozen=True, slots=True)
+class ConversationSearchResult:
+    """Immutable search hit for a single conversation turn."""
+    session_id: str
+    role: str
+    content: str
+    timestamp: float
+    agent_name: Optional[str]
+    score: float
+
+    @classmethod
+    def from_turn(cls, session_id: str, turn: Any, score: float) -> "ConversationSearchResult":
+        return cls(session_id, turn.role, turn.content, turn.timestamp, turn.agent_name, float(score))
+
+
+class ConversationStore:
+    """Sharded, lazily loaded conversation history.
+
+    Session ``s`` lives in ``<directory>/<quote(s)>.jsonl`` with one JSON
+    object per turn. Only the last ``history_window`` turns of a session are
+    kept in memory; longer histories are streamed back from the file when a
+    caller asks for more than that. Expiry rewrites only the sessions that
+    actually contain expired turns and runs in a background thread.
+
+    Several processes may share the directory: appends and rewrites hold an
+    exclusive ``flock`` on ``.lock``, and a session's ring buffer is reloaded
+    when its file size no longer matches what this process last saw.
+    """
+
+    SUFFIX = ".jsonl"
+    SUMMARY_SUFFIX = ".summary.json"
+
+    def __init__(self, directory: str, turn_factory: Callable[..., Any], history_window: int = 1000,
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        self.directory = directory
+        self.turn_factory = turn_factory
+        self.history_window = history_window
+        self.token_counter = token_counter
+
+        self._lock = threading.RLock()
+        self._recent: Dict[str, Deque[Any]] = {}
+        self._counts: Dict[str, int] = {}
+        self._sizes: Dict[str, int] = {}
+        self._expiry_thread: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._file_lock = FileLock(os.path.join(directory, ".lock"))
+        self._session_ids = {
+            unquote(name[:-len(self.SUFFIX)])
+            for name in os.listdir(directory) if name.endswith(self.SUFFIX)
+        }
+
+    def __len__(self) -> int:
+        return len(self._session_ids)
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._known(session_id)
+
+    def session_ids(self) -> List[str]:
+        return sorted(self._session_ids)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, quote(session_id, safe="") + self.SUFFIX)
+
+    def _summary_path(self, session_id: str) -> str:
+        return os.path.join(self.directory, quote(session_id, safe="") + self.SUMMARY_SUFFIX)
+
+    def _known(self, session_id: str) -> bool:
+        """Whether the session exists, picking up sessions other processes created."""
+        if session_id not in self._session_ids and os.path.exists(self._path(session_id)):
+            self._session_ids.add(session_id)
+        return session_id in self._session_ids
+
+    def _file_size(self, session_id: str) -> int:
+        try:
+            return os.path.getsize(self._path(session_id))
+        except FileNotFoundError:
+            return 0
+
+    def _read(self, session_id: str) -> Iterator[Any]:
+        """Stream the turns of a session from disk, skipping a torn last line."""
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield self.turn_factory(**json.loads(line))
+                except (ValueError, TypeError):
+                    logger.warning(f"Skipping unreadable conversation line in {path}")
+
+    def _session(self, session_id: str) -> Deque[Any]:
+        """Ring buffer of a session's recent turns, (re)loading it when the file changed."""
+        recent = self._recent.get(session_id)
+        if recent is None or self._sizes.get(session_id) != self._file_size(session_id):
+            self._sizes[session_id] = self._file_size(session_id)
+            recent = deque(maxlen=self.history_window)
+            count = 0
+            for turn in self._read(session_id):
+                recent.append(turn)
+                count += 1
+            self._recent[session_id] = recent
+            self._counts[session_id] = count
+        return recent
+
+    # ------------------------------------------------------------------
+    # Access
+    # ------------------------------------------------------------------
+
+    def turn_tokens(self, turn: Any) -> int:
+        """Token count of a turn, computed once and cached on the turn."""
+        if turn.tokens is None:
+            turn.tokens = self.token_counter(turn.content) + TURN_OVERHEAD_TOKENS
+        return turn.tokens
+
+    def append(self, session_id: str, turn: Any):
+        """Append a turn to its session file and ring buffer."""
+        self.turn_tokens(turn)
+        line = json.dumps(asdict(turn)) + "\n"
+        with self._lock, self._file_lock.hold():
+            recent = self._session(session_id)
+            with open(self._path(session_id), 'a', encoding='utf-8') as f:
+                f.write(line)
+                self._sizes[session_id] = f.tell()
+            recent.append(turn)
+            self._counts[session_id] += 1
+            self._session_ids.add(session_id)
+
+    def append_many(self, session_id: str, turns: List[Any]):
+        """Append several turns with a single write."""
+        if not turns:
+            return
+        for turn in turns:
+            self.turn_tokens(turn)
+        data = "".join(json.dumps(asdict(turn)) + "\n" for turn in turns)
+        with self._lock, self._file_lock.hold():
+            recent = self._session(session_id)
+            with open(self._path(session_id), 'a', encoding='utf-8') as f:
+                f.write(data)
+                self._sizes[session_id] = f.tell()
+            recent.extend(turns)
+            self._counts[session_id] += len(turns)
+            self._session_ids.add(session_id)
+
+    def count(self, session_id: str) -> int:
+        """Number of turns stored for a session."""
+        with self._lock:
+            if not self._known(session_id):
+                return 0
+            self._session(session_id)
+            return self._counts[session_id]
+
+    def history(self, session_id: str, last_n: Optional[int] = None) -> List[Any]:
+        """Turns of a session in order; the last ``last_n`` come straight from the ring buffer."""
+        with self._lock:
+            if not self._known(session_id):
+                return []
+            recent = self._session(session_id)
+            total = self._counts[session_id]
+            if last_n and last_n <= len(recent):
+                return list(islice(reversed(recent), last_n))[::-1]
+            if total <= len(recent):
+                return list(recent)
+        # Older than the ring buffer holds: stream the file
+        turns = list(self._read(session_id))
+        return turns[-last_n:] if last_n else turns
+
+    def window(self, session_id: str, max_tokens: int,
+               use_summary: bool = True) -> Tuple[Optional[Dict[str, Any]], List[Any]]:
+        """Most recent turns whose cached token counts fit in ``max_tokens``.
+
+        Returns ``(summary, turns)``. When ``use_summary`` is set and the
+        session has a rolling summary that fits, its tokens are reserved
+        first and only turns newer than the summary are considered.
+        """
+        summary = self.get_summary(session_id) if use_summary else None
+        if summary is not None and summary["tokens"] > max_tokens:
+            summary = None
+        budget = max_tokens - (summary["tokens"] if summary else 0)
+        after = summary["through"] if summary else None
+
+        with self._lock:
+            if not self._known(session_id):
+                return summary, []
+            recent = self._session(session_id)
+            turns, exhausted = self._fit(reversed(recent), budget, after)
+            if exhausted and self._counts[session_id] > len(recent):
+                # The budget reaches past the ring buffer: walk the whole file instead
+                turns, _ = self._fit(reversed(list(self._read(session_id))), budget, after)
+        return summary, turns[::-1]
+
+    def _fit(self, newest_first: Iterator[Any], budget: int, after: Optional[float]) -> Tuple[List[Any], bool]:
+        """Take turns newest first until the budget or the summary boundary; report if all fit."""
+        turns = []
+        for turn in newest_first:
+            if after is not None and turn.timestamp <= after:
+                return turns, False
+            tokens = self.turn_tokens(turn)
+            if tokens > budget:
+                return turns, False
+            budget -= tokens
+            turns.append(turn)
+        return turns, True
+
+    def changes(self, marks: Dict[str, Tuple[int, Optional[float]]]) -> List[Tuple[str, bool, List[Any]]]:
+        """Turns written to any session since ``marks`` was last passed in.
+
+        ``marks`` maps session ids to ``(bytes read, first line timestamp)`` and
+        is updated in place, so an index that keeps it only ever reads the
+        appended tail of each session file. Each change is ``(session_id,
+        reset, turns)``; ``reset`` means the session was rewritten (expired)
+        or removed since, and ``turns`` then holds its whole new content.
+        """
+        changes = []
+        with self._lock, self._file_lock.hold(shared=True):
+            sizes = {}
+            with os.scandir(self.directory) as listing:
+                for item in listing:
+                    if item.name.endswith(self.SUFFIX):
+                        sizes[unquote(item.name[:-len(self.SUFFIX)])] = item.stat().st_size
+            for session_id in [session_id for session_id in marks if session_id not in sizes]:
+                del marks[session_id]
+                changes.append((session_id, True, []))
+
+            for session_id, size in sizes.items():
+                mark = marks.get(session_id)
+                if mark is not None and mark[0] == size:
+                    continue
+                self._session_ids.add(session_id)
+                # Appends never change the first line; a rewrite by expiry does
+                reset = mark is not None and (size < mark[0] or self._first_timestamp(session_id) != mark[1])
+                if mark is None or reset:
+                    turns, end = self._read_from(session_id, 0)
+                    marks[session_id] = (end, self._first_timestamp(session_id))
+                else:
+                    turns, end = self._read_from(session_id, mark[0])
+                    marks[session_id] = (end, mark[1])
+                changes.append((session_id, reset, turns))
+        return changes
+
+    def _read_from(self, session_id: str, offset: int) -> Tuple[List[Any], int]:
+        """Turns stored after byte ``offset`` of a session file, and the offset past the last complete line.
+
+        A line still being written (no trailing newline) is left for the next
+        call; complete lines that do not parse are skipped, as in :meth:`_read`.
+        """
+        path = self._path(session_id)
+        turns = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    turns.append(self.turn_factory(**json.loads(line)))
+                except (ValueError, TypeError):
+                    logger.warning(f"Skipping unreadable conversation line in {path}")
+        return turns, offset
+
+    def _first_timestamp(self, session_id: str) -> Optional[float]:
+        with open(self._path(session_id), 'rb') as f:
+            line = f.readline()
+        try:
+            return json.loads(line)["timestamp"] if line.endswith(b"\n") else None
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    # ------------------------------------------------------------------
+    # Rolling summaries
+    # ------------------------------------------------------------------
+
+    def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Stored summary ``{"content", "through", "tokens"}`` of a session, if any.
+
+        ``through`` is the timestamp of the newest turn the summary covers.
+        """
+        try:
+            with open(self._summary_path(session_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f"Ignoring unreadable conversation summary for {session_id}")
+            return None
+
+    def set_summary(self, session_id: str, content: str, through: float):
+        """Store a summary covering every turn with ``timestamp <= through``."""
+        summary = {
+            "content": content,
+            "through": through,
+            "tokens": self.token_counter(content) + TURN_OVERHEAD_TOKENS,
+        }
+        path = self._summary_path(session_id)
+        with self._file_lock.hold():
+            with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(summary, f)
+            os.replace(path + ".tmp", path)
+
+    def summarize(self, session_id: str, summarizer: Callable[[Optional[str], List[Any]], str],
+                  keep_tokens: int) -> Optional[Dict[str, Any]]:
+        """Roll every turn older than the newest ``keep_tokens`` worth into the summary.
+
+        ``summarizer(previous_summary, turns)`` folds the newly covered turns
+        into the previous summary text (None for the first summary).
+        """
+        summary = self.get_summary(session_id)
+        after = summary["through"] if summary else None
+        _, kept = self.window(session_id, keep_tokens, use_summary=False)
+        boundary = kept[0].timestamp if kept else None
+        older = [turn for turn in self.history(session_id)
+                 if (after is None or turn.timestamp > after)
+                 and (boundary is None or turn.timestamp < boundary)]
+        if not older:
+            return summary
+        content = summarizer(summary["content"] if summary else None, older)
+        self.set_summary(session_id, content, older[-1].timestamp)
+        return self.get_summary(session_id)
+
+    # ------------------------------------------------------------------
+    # Expiry
+    # ------------------------------------------------------------------
+
+    def expire(self, cutoff_time: float, wait: bool = False):
+        """Drop turns older than ``cutoff_time`` in a background thread."""
+        with self._lock:
+            if self._expiry_thread is not None and self._expiry_thread.is_alive():
+                if not wait:
+                    return
+                self._expiry_thread.join()
+            self._expiry_thread = threading.Thread(
+                target=self._expire, args=(cutoff_time,),
+                name="conversation-expiry", daemon=True
+            )
+            self._expiry_thread.start()
+        if wait:
+            self._expiry_thread.join()
+
+    def _expire(self, cutoff_time: float):
+        removed_sessions = 0
+        for session_id in list(self._session_ids):
+            try:
+                with self._lock, self._file_lock.hold():
+                    removed_sessions += self._expire_session(session_id, cutoff_time)
+            except Exception as e:
+                logger.error(f"Failed to expire conversation {session_id}: {e}")
+        if removed_sessions:
+            logger.info(f"Expired {removed_sessions} conversation sessions")
+
+    def _expire_session(self, session_id: str, cutoff_time: float) -> int:
+        path = self._path(session_id)
+        if not os.path.exists(path) or os.path.getmtime(path) <= cutoff_time:
+            # Nothing was appended since the cutoff, so every turn has expired
+            self._forget(session_id)
+            return 1
+
+        # Turns are appended in time order: if the first one is fresh, all are
+        first = next(self._read(session_id), None)
+        if first is None or first.timestamp > cutoff_time:
+            return 0
+
+        kept = [turn for turn in self._read(session_id) if turn.timestamp > cutoff_time]
+        if not kept:
+            self._forget(session_id)
+            return 1
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(asdict(turn)) + "\n" for turn in kept)
+        os.replace(tmp_path, path)
+        self._recent[session_id] = deque(kept, maxlen=self.history_window)
+        self._counts[session_id] = len(kept)
+        self._sizes[session_id] = self._file_size(session_id)
+        return 0
+
+    def _forget(self, session_id: str):
+        for path in (self._path(session_id), self._summary_path(session_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        self._session_ids.discard(session_id)
+        self._recent.pop(session_id, None)
+        self._counts.pop(session_id, None)
+        self._sizes.pop(session_id, None)
+
+    def close(self):
+        """Wait for a running expiry pass."""
+        thread = self._expiry_thread
+        if thread is not None:
+            thread.join()
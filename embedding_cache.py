@@ -0,0 +1,225 @@
+"""
+Content-Addressed Embedding Cache
+Avoids re-embedding identical text by caching vectors keyed by
+(model, sha256(text)) in an in-process LRU backed by a fixed-size float32
+slot file on disk.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from memory_store import FileLock
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 32
+
+
+class EmbeddingCache:
+    """Two-tier LRU cache of embedding vectors.
+
+    The memory tier holds up to ``memory_items`` vectors. The disk tier is a
+    memory-mapped array of fixed-size ``(key, float32 vector)`` slots whose
+    capacity is derived from ``max_disk_mb``; when it is full the least
+    recently used slot is overwritten. Keys are stored with each slot, so the
+    disk tier is rebuilt by reading the key column on startup.
+
+    Several processes may share ``cache_dir``. Writes take an exclusive
+    ``flock`` on ``cache.lock`` and draw never-used slots from a counter file
+    shared by all of them; disk reads take a shared lock and check the key
+    stored in the slot, since another process may have reused it.
+    """
+
+    LOCK_NAME = "cache.lock"
+
+    def __init__(self, cache_dir: Optional[str], memory_items: int = 10000, max_disk_mb: int = 256):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_mb * 1024 * 1024
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._disk_slots: "OrderedDict[bytes, int]" = OrderedDict()
+        self._disk: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        self._file_lock: Optional[FileLock] = None
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._file_lock = FileLock(os.path.join(cache_dir, self.LOCK_NAME))
+            with self._file_lock.hold():
+                self._open_existing()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> bytes:
+        """Cache key for a (model, text) pair."""
+        text_digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return hashlib.sha256(model.encode("utf-8") + b"\x00" + text_digest).digest()
+
+    def _disk_path(self, dim: int) -> str:
+        return os.path.join(self.cache_dir, f"embeddings-{dim}.f32")
+
+    def _counter_path(self, dim: int) -> str:
+        return self._disk_path(dim) + ".next"
+
+    def _slot_dtype(self, dim: int) -> np.dtype:
+        return np.dtype([("key", "u1", (KEY_BYTES,)), ("vector", "<f4", (dim,))])
+
+    def _open_existing(self):
+        for name in sorted(os.listdir(self.cache_dir)):
+            if name.startswith("embeddings-") and name.endswith(".f32"):
+                try:
+                    self._open_disk(int(name[len("embeddings-"):-len(".f32")]))
+                except (ValueError, OSError) as e:
+                    logger.warning(f"Ignoring embedding cache file {name}: {e}")
+                    continue
+                return
+
+    def _open_disk(self, dim: int):
+        """Map (creating if needed) the slot file for ``dim``; called with the file lock held."""
+        dtype = self._slot_dtype(dim)
+        capacity = max(1, self.max_disk_bytes // dtype.itemsize)
+        path = self._disk_path(dim)
+        mode = "r+" if os.path.exists(path) and os.path.getsize(path) == capacity * dtype.itemsize else "w+"
+        self._disk = np.memmap(path, dtype=dtype, mode=mode, shape=(capacity,))
+        self._dim = dim
+        used = self._load_slots()
+        if mode == "w+" or not os.path.exists(self._counter_path(dim)):
+            self._write_counter(used)
+
+    def _load_slots(self) -> int:
+        """Rebuild the slot map from the key column; returns one past the highest used slot."""
+        self._disk_slots = OrderedDict()
+        keys = self._disk["key"]
+        used = 0
+        for slot in np.flatnonzero(keys.any(axis=1)):
+            self._disk_slots[keys[slot].tobytes()] = int(slot)
+            used = int(slot) + 1
+        return used
+
+    def _write_counter(self, next_slot: int):
+        tmp_path = self._counter_path(self._dim) + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(next_slot))
+        os.replace(tmp_path, self._counter_path(self._dim))
+
+    def _claim_slot(self) -> Optional[int]:
+        """Next slot no process has used yet, or None when the file is full (file lock held)."""
+        try:
+            with open(self._counter_path(self._dim), 'r') as f:
+                next_slot = int(f.read())
+        except (OSError, ValueError):
+            next_slot = max(self._disk_slots.values(), default=-1) + 1
+        if next_slot >= len(self._disk):
+            return None
+        self._write_counter(next_slot + 1)
+        return next_slot
+
+    def _evict_slot(self) -> int:
+        """Least recently used slot this process knows of (file lock held)."""
+        if not self._disk_slots:
+            # Every slot this process knew was reused by others; pick from the current keys
+            self._load_slots()
+        return self._disk_slots.popitem(last=False)[1]
+
+    def _read_slot(self, key: bytes) -> Optional[np.ndarray]:
+        """Vector stored for ``key`` on disk, or None if its slot now holds another key."""
+        slot = self._disk_slots[key]
+        if self._disk[slot]["key"].tobytes() != key:
+            # Another process reused the slot since this one last saw it
+            del self._disk_slots[key]
+            return None
+        self._disk_slots.move_to_end(key)
+        return np.array(self._disk[slot]["vector"])
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for ``texts`` (None where missing)."""
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            on_disk = []
+            for i, text in enumerate(texts):
+                key = self.make_key(model, text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                elif key in self._disk_slots:
+                    on_disk.append((i, key))
+                else:
+                    self.misses += 1
+                results.append(vector)
+
+            if on_disk:
+                with self._file_lock.hold(shared=True):
+                    for i, key in on_disk:
+                        vector = self._read_slot(key)
+                        if vector is None:
+                            self.misses += 1
+                            continue
+                        self._remember(key, vector)
+                        results[i] = vector
+                        self.hits += 1
+                        self.disk_hits += 1
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[Any]):
+        """Store vectors in both tiers, evicting least recently used entries."""
+        with self._lock:
+            items = []
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(model, text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                items.append((key, vector))
+            if not self.cache_dir or not items:
+                return
+
+            with self._file_lock.hold():
+                if self._disk is None:
+                    self._open_disk(items[0][1].shape[0])
+                for key, vector in items:
+                    if vector.shape[0] != self._dim:
+                        continue
+                    slot = self._disk_slots.get(key)
+                    if slot is None or self._disk[slot]["key"].tobytes() != key:
+                        slot = self._claim_slot()
+                        if slot is None:
+                            slot = self._evict_slot()
+                    self._disk["key"][slot] = np.frombuffer(key, dtype=np.uint8)
+                    self._disk["vector"][slot] = vector
+                    self._disk_slots[key] = slot
+                    self._disk_slots.move_to_end(key)
+
+    def flush(self):
+        """Flush the disk tier to the backing file."""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": len(self._disk_slots),
+        }
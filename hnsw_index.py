@@ -0,0 +1,314 @@
+"""
+Approximate Nearest Neighbour Index for Agent Memory
+A NumPy-only Hierarchical Navigable Small World (HNSW) graph over cosine
+similarity, used by VectorMemory once per-agent memory grows past the point
+where a brute-force scan is fast enough.
+"""
+
+import os
+import math
+import time
+import heapq
+import random
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class HNSWIndex:
+    """Incremental HNSW graph keyed by string labels.
+
+    Vectors are stored L2-normalized so similarity is a dot product. Deleted
+    labels become tombstones: they keep routing searches through the graph but
+    never appear in results, and the graph is rebuilt from the live nodes once
+    tombstones exceed ``max_tombstone_ratio`` of all nodes.
+    """
+
+    def __init__(self, dim: int, M: int = 16, ef_construction: int = 100, ef_search: int = 64,
+                 max_tombstone_ratio: float = 0.3, seed: Optional[int] = None):
+        self.dim = dim
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.max_tombstone_ratio = max_tombstone_ratio
+        self.seed = seed
+
+        self._level_mult = 1.0 / math.log(M)
+        self._rng = random.Random(seed)
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._labels: List[str] = []
+        self._node_of: Dict[str, int] = {}
+        self._links: List[List[List[int]]] = []
+        self._deleted: Set[int] = set()
+        self._entry_point = -1
+        self._max_level = -1
+
+    def __len__(self) -> int:
+        return len(self._node_of)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._node_of
+
+    @property
+    def labels(self) -> List[str]:
+        """Labels of all live (non-tombstoned) nodes."""
+        return list(self._node_of)
+
+    @property
+    def tombstones(self) -> int:
+        return len(self._deleted)
+
+    # ------------------------------------------------------------------
+    # Graph primitives
+    # ------------------------------------------------------------------
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[int], ef: int, level: int,
+                      accept: Optional[Callable[[int], bool]] = None) -> List[Tuple[float, int]]:
+        """Best-first search of one layer; returns (similarity, node) pairs, best first.
+
+        Nodes rejected by ``accept`` are still traversed but never returned.
+        """
+        visited = set(entry_points)
+        sims = (self._vectors[entry_points] @ query).tolist()
+        candidates = [(-sim, node) for sim, node in zip(sims, entry_points)]
+        heapq.heapify(candidates)
+        results = [(sim, node) for sim, node in zip(sims, entry_points) if accept is None or accept(node)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+            neighbors = [n for n in self._links[node][level] if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for sim, neighbor in zip((self._vectors[neighbors] @ query).tolist(), neighbors):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbor))
+                    if accept is None or accept(neighbor):
+                        heapq.heappush(results, (sim, neighbor))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _select_neighbors(self, scored: List[Tuple[float, int]], m: int) -> List[int]:
+        """Pick up to ``m`` diverse neighbours (HNSW heuristic), topping up with the closest rest."""
+        if len(scored) <= m:
+            return [node for _, node in scored]
+        sims = [sim for sim, _ in scored]
+        nodes = [node for _, node in scored]
+        # Pairwise similarities between all candidates in one product; track each
+        # candidate's closest already-selected neighbour as selection proceeds
+        pairwise = self._vectors[nodes] @ self._vectors[nodes].T
+        closest_selected = np.full(len(nodes), -np.inf, dtype=np.float32)
+        selected: List[int] = []
+        skipped: List[int] = []
+        for i in range(len(nodes)):
+            if closest_selected[i] > sims[i]:
+                skipped.append(i)
+                continue
+            selected.append(i)
+            if len(selected) >= m:
+                break
+            np.maximum(closest_selected, pairwise[i], out=closest_selected)
+        return [nodes[i] for i in selected + skipped[:m - len(selected)]]
+
+    def _greedy_descend(self, query: np.ndarray, target_level: int) -> List[int]:
+        entry = [self._entry_point]
+        for level in range(self._max_level, target_level, -1):
+            entry = [self._search_layer(query, entry, 1, level)[0][1]]
+        return entry
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+
+    def add(self, label: str, vector) -> int:
+        """Insert (or replace) a labelled vector and return its node id."""
+        if label in self._node_of:
+            self.remove(label)
+
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        query = vector / norm if norm else vector
+
+        node = len(self._labels)
+        if node >= len(self._vectors):
+            grown = np.zeros((max(1024, 2 * len(self._vectors)), self.dim), dtype=np.float32)
+            grown[:node] = self._vectors[:node]
+            self._vectors = grown
+        self._vectors[node] = query
+        self._labels.append(label)
+        self._node_of[label] = node
+
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+        self._links.append([[] for _ in range(level + 1)])
+        if self._entry_point < 0:
+            self._entry_point, self._max_level = node, level
+            return node
+
+        entry = self._greedy_descend(query, level)
+        for layer in range(min(level, self._max_level), -1, -1):
+            scored = self._search_layer(query, entry, self.ef_construction, layer)
+            max_links = self.M0 if layer == 0 else self.M
+            neighbors = self._select_neighbors(scored, max_links)
+            self._links[node][layer] = neighbors
+            for neighbor in neighbors:
+                links = self._links[neighbor][layer]
+                links.append(node)
+                if len(links) > max_links:
+                    sims = (self._vectors[links] @ self._vectors[neighbor]).tolist()
+                    self._links[neighbor][layer] = self._select_neighbors(
+                        sorted(zip(sims, links), reverse=True), max_links
+                    )
+            entry = [n for _, n in scored]
+
+        if level > self._max_level:
+            self._entry_point, self._max_level = node, level
+        return node
+
+    def remove(self, label: str):
+        """Tombstone a label; it stays routable but is never returned."""
+        node = self._node_of.pop(label, None)
+        if node is not None:
+            self._deleted.add(node)
+
+    def compact(self, force: bool = False) -> bool:
+        """Rebuild the graph from live nodes when tombstones pile up."""
+        if not self._labels:
+            return False
+        if not force and len(self._deleted) <= self.max_tombstone_ratio * len(self._labels):
+            return False
+        live = [(label, self._vectors[node].copy()) for label, node in self._node_of.items()]
+        self.__init__(self.dim, self.M, self.ef_construction, self.ef_search,
+                      self.max_tombstone_ratio, self.seed)
+        for label, vector in live:
+            self.add(label, vector)
+        logger.info(f"Rebuilt HNSW index with {len(live)} live nodes")
+        return True
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, query, top_k: int = 5, ef: Optional[int] = None,
+               accept: Optional[Callable[[str], bool]] = None) -> Tuple[List[str], np.ndarray]:
+        """Approximate top-k ``(labels, cosine_scores)``, optionally restricted by a label predicate."""
+        if not self._node_of or top_k <= 0:
+            return [], np.zeros(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        deleted, labels = self._deleted, self._labels
+        if accept is None:
+            node_ok = lambda node: node not in deleted
+        else:
+            node_ok = lambda node: node not in deleted and accept(labels[node])
+
+        entry = self._greedy_descend(query, 0)
+        found = self._search_layer(query, entry, max(ef or self.ef_search, top_k), 0, accept=node_ok)[:top_k]
+        return [labels[node] for _, node in found], np.array([sim for sim, _ in found], dtype=np.float32)
+
+    def exact_search(self, query, top_k: int = 5) -> Tuple[List[str], np.ndarray]:
+        """Brute-force top-k over live nodes, used as ground truth."""
+        if not self._node_of:
+            return [], np.zeros(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        nodes = np.fromiter(self._node_of.values(), dtype=np.int64, count=len(self._node_of))
+        sims = self._vectors[nodes] @ query
+        best = np.argsort(-sims, kind="stable")[:top_k]
+        return [self._labels[node] for node in nodes[best]], sims[best]
+
+    def recall_report(self, queries, top_k: int = 10, ef: Optional[int] = None) -> Dict[str, Any]:
+        """Measure recall@k and latency of ANN search against exact search."""
+        queries = np.asarray(queries, dtype=np.float32)
+        hits = 0
+        ann_seconds = exact_seconds = 0.0
+        for query in queries:
+            start = time.perf_counter()
+            approx, _ = self.search(query, top_k, ef=ef)
+            ann_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            exact, _ = self.exact_search(query, top_k)
+            exact_seconds += time.perf_counter() - start
+            hits += len(set(approx) & set(exact))
+
+        expected = len(queries) * min(top_k, len(self))
+        return {
+            "queries": len(queries),
+            "top_k": top_k,
+            "ef_search": max(ef or self.ef_search, top_k),
+            f"recall@{top_k}": hits / expected if expected else 1.0,
+            "ann_ms_per_query": 1000 * ann_seconds / max(len(queries), 1),
+            "exact_ms_per_query": 1000 * exact_seconds / max(len(queries), 1),
+            "live_nodes": len(self),
+            "tombstones": self.tombstones,
+        }
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path: str):
+        """Persist the graph as an ``.npz`` file (no pickled objects)."""
+        count = len(self._labels)
+        levels = np.array([len(node_links) - 1 for node_links in self._links], dtype=np.int32)
+        offsets = [0]
+        targets: List[int] = []
+        for node_links in self._links:
+            for layer_links in node_links:
+                targets.extend(layer_links)
+                offsets.append(len(targets))
+
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            params=np.array([self.dim, self.M, self.ef_construction, self.ef_search,
+                             self._entry_point, self._max_level], dtype=np.int64),
+            max_tombstone_ratio=np.array(self.max_tombstone_ratio),
+            vectors=self._vectors[:count],
+            labels=np.array(self._labels, dtype=str),
+            deleted=np.array(sorted(self._deleted), dtype=np.int64),
+            levels=levels,
+            offsets=np.array(offsets, dtype=np.int64),
+            targets=np.array(targets, dtype=np.int32),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HNSWIndex":
+        """Load a graph written by :meth:`save`."""
+        with np.load(path, allow_pickle=False) as data:
+            dim, M, ef_construction, ef_search, entry_point, max_level = data["params"].tolist()
+            index = cls(dim, M, ef_construction, ef_search, float(data["max_tombstone_ratio"]))
+            index._vectors = data["vectors"].astype(np.float32)
+            index._labels = data["labels"].tolist()
+            index._deleted = set(data["deleted"].tolist())
+            levels, offsets, targets = data["levels"], data["offsets"].tolist(), data["targets"].tolist()
+
+        index._links = []
+        position = 0
+        for level in levels.tolist():
+            node_links = []
+            for _ in range(level + 1):
+                node_links.append(targets[offsets[position]:offsets[position + 1]])
+                position += 1
+            index._links.append(node_links)
+        index._node_of = {label: node for node, label in enumerate(index._labels)
+                          if node not in index._deleted}
+        index._entry_point, index._max_level = entry_point, max_level
+        return index
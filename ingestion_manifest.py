@@ -0,0 +1,112 @@
+"""
+Knowledge Base Ingestion Manifest
+Records the size, modification time and content hash of every ingested file
+so re-syncing a folder only touches files that were added, changed or
+deleted since the previous run.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class SyncPlan:
+    """What a sync has to do, by absolute file path."""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # Manifest entries to record once the added/changed files are ingested
+    pending: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def to_ingest(self) -> List[str]:
+        return self.added + self.changed
+
+
+class IngestionManifest:
+    """JSON map of ingested file path -> ``{"size", "mtime_ns", "sha256"}``."""
+
+    FILE_NAME = "ingestion_manifest.json"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                logger.warning(f"Ignoring unreadable ingestion manifest {path}; every file will be re-ingested")
+
+    def plan(self, file_paths: List[str], root: str, force: bool = False) -> SyncPlan:
+        """Compare ``file_paths`` found under ``root`` with the manifest.
+
+        Files whose size and mtime match are unchanged without being read;
+        otherwise the content hash decides, so a touched but identical file
+        is skipped too. ``force`` reports every known file as changed.
+        Manifest entries under ``root`` that were not found and no longer
+        exist are reported as removed; files that still exist but were not
+        matched this run (a narrower pattern, a non-recursive glob) are left
+        alone.
+        """
+        plan = SyncPlan()
+        found = set()
+        for path in map(os.path.abspath, file_paths):
+            found.add(path)
+            stat = os.stat(path)
+            entry = self.entries.get(path)
+            if (not force and entry is not None
+                    and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns):
+                plan.unchanged.append(path)
+                continue
+            digest = file_digest(path)
+            state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+            if entry is None:
+                plan.added.append(path)
+                plan.pending[path] = state
+            elif not force and entry["sha256"] == digest:
+                # Touched but identical: remember the new mtime so it is not hashed again
+                plan.unchanged.append(path)
+                self.entries[path] = state
+            else:
+                plan.changed.append(path)
+                plan.pending[path] = state
+
+        prefix = os.path.join(os.path.abspath(root), "")
+        plan.removed = [path for path in self.entries
+                        if path.startswith(prefix) and path not in found and not os.path.isfile(path)]
+        return plan
+
+    def record(self, path: str, state: Dict[str, Any]):
+        self.entries[path] = state
+
+    def forget(self, paths: List[str]):
+        for path in paths:
+            self.entries.pop(path, None)
+
+    def save(self):
+        """Atomically replace the manifest file."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
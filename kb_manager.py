@@ -4,6 +4,7 @@ Knowledge Base Manager - Clean and populate with your documents
 
 import os
 import shutil
+import argparse
 from rag_system import rag_system
 
 def reset_knowledge_base():
@@ -26,19 +27,12 @@ def reset_knowledge_base():
 def add_document_from_file(file_path: str, document_type: str = "user_document"):
     """Add a document from file to knowledge base"""
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-        
         filename = os.path.basename(file_path)
-        success = rag_system.add_document(
-            content=content,
+        # Streamed and chunked by the RAG system, so large files never load whole
+        success = rag_system.add_document_file(
+            file_path,
             source=filename,
-            metadata={
-                "filename": filename,
-                "type": document_type,
-                "size": len(content),
-                "path": file_path
-            }
+            metadata=file_metadata(file_path, document_type)
         )
         
         if success:
@@ -52,6 +46,47 @@ def add_document_from_file(file_path: str, document_type: str = "user_document")
         print(f"❌ Error adding {file_path}: {e}")
         return False
 
+def file_metadata(file_path: str, document_type: str) -> dict:
+    """Metadata stored with every chunk of a file"""
+    filename = os.path.basename(file_path)
+    return {
+        "filename": filename,
+        "type": document_type,
+        "size": os.path.getsize(file_path),
+        "path": file_path
+    }
+
+def document_source(file_path: str, root: str = None) -> str:
+    """Source name of a file: its path relative to ``root``, or its file name"""
+    return os.path.relpath(file_path, root) if root else os.path.basename(file_path)
+
+def add_documents_from_files(file_paths: list, document_type: str = "user_document", root: str = None,
+                             replace_sources: bool = True) -> dict:
+    """Add many files with batched knowledge base writes; returns the ingestion stats
+    
+    Files that cannot be read never reach the writer and count as failed.
+    Chunks stored earlier under the same source are replaced unless
+    ``replace_sources`` is False.
+    """
+    def documents():
+        for file_path in file_paths:
+            try:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    yield f, document_source(file_path, root), file_metadata(file_path, document_type)
+            except OSError as e:
+                print(f"❌ Error adding {file_path}: {e}")
+    
+    sources = [document_source(file_path, root) for file_path in file_paths]
+    stats = rag_system.add_documents(documents(), expected_sources=sources, replace_sources=replace_sources)
+    show_ingestion_stats(stats)
+    return stats
+
+def show_ingestion_stats(stats: dict):
+    """Print the summary of a batched ingestion run"""
+    print(f"✅ Added {stats['documents'] - stats['failed']}/{stats['documents']} files: "
+          f"{stats['chunks']} chunks in {stats['batches']} batches, {stats['seconds']:.1f}s "
+          f"({stats['chunks_per_second']:.0f} chunks/s, {stats['mb_per_second']:.2f} MB/s)")
+
 def show_knowledge_base_status():
     """Show current knowledge base status"""
     status = rag_system.get_status()
@@ -61,8 +96,29 @@ def show_knowledge_base_status():
     print(f"   Location: {status['persist_directory']}")
     print(f"   ChromaDB: {'Available' if status['chromadb_available'] else 'Not Available'}")
 
-if __name__ == "__main__":
+def compact_knowledge_base():
+    """Collapse duplicate chunks left by older, non-deterministic document ids"""
+    stats = rag_system.deduplicate()
+    print(f"✅ Scanned {stats['scanned']} chunks: removed {stats['duplicates']} duplicates, "
+          f"re-keyed {stats['rekeyed']}, {stats['remaining']} remain")
+    return stats
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Knowledge Base Manager")
+    parser.add_argument("command", nargs="?", choices=["reset", "dedup", "status"], default="reset",
+                        help="reset: clear the knowledge base (default); dedup: collapse duplicate chunks; "
+                             "status: show document count")
+    args = parser.parse_args(argv)
     print("🔧 Knowledge Base Manager")
+    
+    if args.command == "dedup":
+        compact_knowledge_base()
+        show_knowledge_base_status()
+        return
+    if args.command == "status":
+        show_knowledge_base_status()
+        return
+    
     print("1. Resetting knowledge base...")
     reset_knowledge_base()
     
@@ -72,3 +128,6 @@ if __name__ == "__main__":
     print("\n💡 Next steps:")
     print("   - Add your documents using the web interface")
     print("   - Or run: python -c 'from kb_manager import add_document_from_file; add_document_from_file(\"your_file.txt\")'")
+
+if __name__ == "__main__":
+    main()
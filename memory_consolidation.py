@@ -0,0 +1,146 @@
+"""
+Memory Consolidation Helpers
+Clustering, summarization and cold-storage archiving used by the memory
+backends to fold many old, low-value entries into a few summary entries.
+"""
+
+import os
+import re
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from memory_store import FileLock, encode_frame, read_frames
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Entry types that are consolidated by default: high volume, low individual value
+DEFAULT_CONSOLIDATE_TYPES = ("task_result", "conversation")
+
+
+def minibatch_kmeans(vectors: np.ndarray, k: int, batch_size: int = 256, iterations: int = 100,
+                     seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical mini-batch k-means (Sculley, 2010) over cosine similarity.
+
+    Returns ``(centroids, labels)`` with unit-length centroids. Each batch moves
+    a centroid towards the mean of its assigned points with a per-centroid
+    learning rate of ``batch_count / total_count``.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    n = len(vectors)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    centroids = vectors[rng.choice(n, k, replace=False)].copy()
+    counts = np.zeros(k, dtype=np.float64)
+    for _ in range(iterations if k < n else 0):
+        batch = vectors[rng.choice(n, min(batch_size, n), replace=False)]
+        labels = np.argmax(batch @ centroids.T, axis=1)
+        batch_counts = np.bincount(labels, minlength=k).astype(np.float64)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, batch)
+        assigned = batch_counts > 0
+        counts[assigned] += batch_counts[assigned]
+        rate = (batch_counts[assigned] / counts[assigned])[:, None]
+        means = sums[assigned] / batch_counts[assigned][:, None]
+        centroids[assigned] = (1.0 - rate) * centroids[assigned] + rate * means
+        lengths = np.linalg.norm(centroids, axis=1, keepdims=True)
+        lengths[lengths == 0] = 1.0
+        centroids /= lengths
+
+    labels = np.argmax(vectors @ centroids.T, axis=1)
+    return centroids, labels
+
+
+def keyword_clusters(keyword_lists: Sequence[Sequence[str]]) -> List[int]:
+    """Group documents by their most widespread keyword.
+
+    Each document joins the cluster of whichever of its keywords occurs in
+    the most documents of the batch (ties broken alphabetically); documents
+    without keywords get label -1.
+    """
+    frequency = Counter(keyword for keywords in keyword_lists for keyword in set(keywords))
+    cluster_ids: Dict[str, int] = {}
+    labels = []
+    for keywords in keyword_lists:
+        if not keywords:
+            labels.append(-1)
+            continue
+        anchor = min(set(keywords), key=lambda keyword: (-frequency[keyword], keyword))
+        labels.append(cluster_ids.setdefault(anchor, len(cluster_ids)))
+    return labels
+
+
+def top_terms(contents: Sequence[str], limit: int = 5) -> List[str]:
+    """Most frequent words of four or more letters across ``contents``."""
+    counts = Counter(word for content in contents for word in re.findall(r'\b[a-z]{4,}\b', content.lower()))
+    return [word for word, _ in counts.most_common(limit)]
+
+
+def extractive_summary(contents: Sequence[str], terms: Optional[Sequence[str]] = None,
+                       max_chars: int = 1000) -> str:
+    """Summary text listing the first line of each distinct member, most central first."""
+    header = f"Summary of {len(contents)} related memories"
+    if terms:
+        header += f" about {', '.join(terms)}"
+    lines, seen, size = [], set(), len(header)
+    for content in contents:
+        first_line = content.strip().split("\n", 1)[0][:200]
+        if not first_line or first_line.lower() in seen:
+            continue
+        if size + len(first_line) + 3 > max_chars:
+            lines.append(f"- ... and {len(contents) - len(seen)} more")
+            break
+        seen.add(first_line.lower())
+        lines.append(f"- {first_line}")
+        size += len(first_line) + 3
+    return header + ":\n" + "\n".join(lines)
+
+
+class MemoryArchive:
+    """Append-only cold storage for consolidated memory entries.
+
+    Each consolidated cluster is written as one ``(summary_id, [entries])``
+    frame, so originals can be restored or inspected per summary without
+    keeping them in the hot index.
+    """
+
+    FILE_NAME = "archive.log"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = FileLock(os.path.join(directory, "archive.lock"))
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.FILE_NAME)
+
+    def append(self, clusters: List[Tuple[str, List[Any]]]):
+        """Archive ``(summary_id, entries)`` pairs with a single write."""
+        if not clusters:
+            return
+        data = b"".join(encode_frame((summary_id, entries)) for summary_id, entries in clusters)
+        with self._lock.hold():
+            with open(self.path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def iter_clusters(self) -> Iterator[Tuple[str, List[Any]]]:
+        if not os.path.exists(self.path):
+            return iter(())
+        return read_frames(self.path)
+
+    def get(self, summary_id: str) -> List[Any]:
+        """Original entries folded into ``summary_id``."""
+        for archived_id, entries in self.iter_clusters():
+            if archived_id == summary_id:
+                return entries
+        return []
@@ -0,0 +1,764 @@
+"""
+In-memory search indexes for the agent memory systems.
+Keeps entry vectors in a contiguous matrix so recall is a single matrix product
+instead of a per-entry Python loop, and keeps term postings so text recall only
+touches the documents that share a term with the query.
+"""
+
+import hashlib
+import heapq
+import logging
+import math
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows scored per block in multi-query search, bounding the (rows x queries) score matrix
+SEARCH_BLOCK_ROWS = 65536
+
+# Metadata key read as an entry's importance for weighted scoring
+IMPORTANCE_KEY = "importance"
+
+# Smallest weight a negative similarity is divided by in weighted scoring
+MIN_SCORE_WEIGHT = 1e-6
+
+# Function words ignored by keyword extraction and near-duplicate confirmation
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
+    'by', 'from', 'up', 'about', 'into', 'through', 'during', 'before', 'after',
+    'above', 'below', 'between', 'among', 'under', 'over', 'is', 'was', 'are', 'were',
+    'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
+    'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'
+})
+
+
+def metadata_importance(metadata: Optional[Dict]) -> float:
+    """Numeric ``importance`` from entry metadata (0.0 when missing or not a number)."""
+    try:
+        return float((metadata or {}).get(IMPORTANCE_KEY, 0.0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RowPartitions:
+    """Per-agent and per-entry-type row id lists plus row-aligned scoring columns.
+
+    Every row is filed under ``(agent, None)``, ``(None, type)`` and
+    ``(agent, type)``. Rows are only ever appended in increasing order, so each
+    partition's row list stays sorted and filtered lookups touch only the rows
+    of that partition. Recency orderings are computed on demand per partition
+    and cached until the partition changes. Timestamps, importance and entry
+    type codes are also kept as NumPy columns for :class:`ScoringOptions`.
+    """
+
+    def __init__(self):
+        self._agents: List[str] = []
+        self._types: List[str] = []
+        self._timestamps = np.zeros(0, dtype=np.float64)
+        self._importance = np.zeros(0, dtype=np.float32)
+        self._type_codes = np.zeros(0, dtype=np.int32)
+        self._type_lookup: Dict[str, int] = {}
+        self._partitions: Dict[Tuple[Optional[str], Optional[str]], List[int]] = {}
+        self._arrays: Dict[Tuple[Optional[str], Optional[str]], np.ndarray] = {}
+        self._recent: Dict[Tuple[Optional[str], Optional[str]], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    @staticmethod
+    def _keys(agent_name: str, entry_type: str) -> Tuple[Tuple[Optional[str], Optional[str]], ...]:
+        return (agent_name, None), (None, entry_type), (agent_name, entry_type)
+
+    @staticmethod
+    def _fill(column: np.ndarray, start: int, count: int, values: Optional[Iterable[float]]):
+        if values is None:
+            column[start:start + count] = 0
+        else:
+            column[start:start + count] = np.fromiter(values, dtype=column.dtype, count=count)
+
+    def add(self, agent_names: List[str], entry_types: List[str],
+            timestamps: Optional[Iterable[float]] = None,
+            importance: Optional[Iterable[float]] = None) -> np.ndarray:
+        """Append rows with their labels, timestamps and importance; returns the new row ids."""
+        start, count = len(self), len(agent_names)
+        if start + count > len(self._timestamps):
+            capacity = max(start + count, 1024, 2 * len(self._timestamps))
+            for name in ("_timestamps", "_importance", "_type_codes"):
+                column = getattr(self, name)
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[:start] = column[:start]
+                setattr(self, name, grown)
+        self._fill(self._timestamps, start, count, timestamps)
+        self._fill(self._importance, start, count, importance)
+
+        touched = set()
+        for row, (agent_name, entry_type) in enumerate(zip(agent_names, entry_types), start):
+            code = self._type_lookup.setdefault(entry_type, len(self._type_lookup))
+            self._type_codes[row] = code
+            for key in self._keys(agent_name, entry_type):
+                self._partitions.setdefault(key, []).append(row)
+                touched.add(key)
+        for key in touched | {(None, None)}:
+            self._arrays.pop(key, None)
+            self._recent.pop(key, None)
+        self._agents.extend(agent_names)
+        self._types.extend(entry_types)
+        return np.arange(start, start + count)
+
+    def rebuild(self, agent_names: List[str], entry_types: List[str],
+                timestamps: Optional[Iterable[float]] = None,
+                importance: Optional[Iterable[float]] = None):
+        """Replace all rows."""
+        self.__init__()
+        self.add(agent_names, entry_types, timestamps, importance)
+
+    def keep(self, mask: np.ndarray):
+        """Drop rows whose mask value is False and renumber the survivors."""
+        mask = np.asarray(mask, dtype=bool)
+        timestamps = self._timestamps[:len(self)][mask]
+        importance = self._importance[:len(self)][mask]
+        agents = [a for a, keep in zip(self._agents, mask) if keep]
+        types = [t for t, keep in zip(self._types, mask) if keep]
+        self.rebuild(agents, types, timestamps, importance)
+
+    def update_row(self, row: int, timestamp: float, importance: Optional[float] = None):
+        """Update a row's timestamp (and importance), invalidating its partitions' recency order."""
+        self._timestamps[row] = timestamp
+        if importance is not None:
+            self._importance[row] = importance
+        for key in self._keys(self._agents[row], self._types[row]) + ((None, None),):
+            self._recent.pop(key, None)
+
+    def _column(self, column: np.ndarray, rows) -> np.ndarray:
+        return column[:len(self)] if rows is None else column[rows]
+
+    def timestamps(self, rows=None) -> np.ndarray:
+        """Timestamps of ``rows`` (a row-id array, slice, or None for all rows)."""
+        return self._column(self._timestamps, rows)
+
+    def importance(self, rows=None) -> np.ndarray:
+        return self._column(self._importance, rows)
+
+    def type_weights(self, weights: Dict[str, float], rows=None, default: float = 1.0) -> np.ndarray:
+        """Per-row value of ``weights[entry_type]`` via a lookup table over type codes."""
+        table = np.full(len(self._type_lookup), default, dtype=np.float32)
+        for entry_type, weight in weights.items():
+            code = self._type_lookup.get(entry_type)
+            if code is not None:
+                table[code] = weight
+        return table[self._column(self._type_codes, rows)]
+
+    def size(self, agent_name: Optional[str] = None, entry_type: Optional[str] = None) -> int:
+        """Number of rows in a partition."""
+        if not agent_name and not entry_type:
+            return len(self)
+        return len(self._partitions.get((agent_name or None, entry_type or None), ()))
+
+    def counts(self, by_agent: bool = True) -> Dict[str, int]:
+        """Row counts per agent (or per entry type)."""
+        return {key[0] if by_agent else key[1]: len(rows)
+                for key, rows in self._partitions.items()
+                if rows and (key[1] is None if by_agent else key[0] is None)}
+
+    def rows(self, agent_name: Optional[str] = None,
+             entry_type: Optional[str] = None) -> Optional[np.ndarray]:
+        """Sorted row ids of a partition, or None when unfiltered."""
+        if not agent_name and not entry_type:
+            return None
+        key = (agent_name or None, entry_type or None)
+        rows = self._arrays.get(key)
+        if rows is None:
+            rows = np.array(self._partitions.get(key, ()), dtype=np.int64)
+            self._arrays[key] = rows
+        return rows
+
+    def mask(self, agent_name: Optional[str] = None,
+             entry_type: Optional[str] = None) -> Optional[np.ndarray]:
+        """Boolean row mask for a partition, or None when unfiltered."""
+        rows = self.rows(agent_name, entry_type)
+        if rows is None:
+            return None
+        mask = np.zeros(len(self), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def recent_rows(self, agent_name: Optional[str] = None, entry_type: Optional[str] = None,
+                    limit: Optional[int] = None) -> np.ndarray:
+        """Row ids of a partition, newest first; ties keep insertion order."""
+        key = (agent_name or None, entry_type or None)
+        recent = self._recent.get(key)
+        if recent is None:
+            rows = self.rows(agent_name, entry_type)
+            if rows is None:
+                rows = np.arange(len(self))
+            recent = rows[np.argsort(-self._timestamps[rows], kind="stable")]
+            self._recent[key] = recent
+        return recent if limit is None else recent[:limit]
+
+
+@dataclass
+class ScoringOptions:
+    """Score adjustments applied as column operations before top-k selection.
+
+    ``weight = 0.5 ** (age / half_life) * (1 + importance_weight * importance)
+    * type_boosts.get(entry_type, 1)``; a non-negative similarity is
+    multiplied by its weight and a negative one divided by it, so a larger
+    weight always ranks a row higher (a fresher or boosted row that is
+    dissimilar moves toward zero instead of further down).
+
+    ``half_life`` is in seconds; ``now`` defaults to the time of the query.
+    Entries with zero similarity stay at zero.
+    """
+    half_life: Optional[float] = None
+    importance_weight: float = 0.0
+    type_boosts: Dict[str, float] = field(default_factory=dict)
+    now: Optional[float] = None
+
+    def weights(self, partitions: RowPartitions, rows=None) -> Optional[np.ndarray]:
+        """Per-row score multipliers for ``rows``, or None when nothing is adjusted."""
+        weights = None
+        if self.half_life:
+            now = time.time() if self.now is None else self.now
+            age = np.maximum(now - partitions.timestamps(rows), 0.0)
+            weights = np.exp2(-age / self.half_life).astype(np.float32)
+        if self.importance_weight:
+            factor = 1.0 + self.importance_weight * partitions.importance(rows)
+            weights = factor if weights is None else weights * factor
+        if self.type_boosts:
+            factor = partitions.type_weights(self.type_boosts, rows)
+            weights = factor if weights is None else weights * factor
+        return weights
+
+    def apply(self, scores: np.ndarray, partitions: RowPartitions, rows=None) -> np.ndarray:
+        """Scale ``(n,)`` or ``(n, m)`` scores of ``rows`` by their weights."""
+        weights = self.weights(partitions, rows)
+        if weights is None:
+            return scores
+        if scores.ndim == 2:
+            weights = weights[:, None]
+        # Weights can underflow to zero (very old rows) or be set to zero (a type boost of 0)
+        return np.where(scores >= 0, scores * weights, scores / np.maximum(weights, MIN_SCORE_WEIGHT))
+
+
+@dataclass(frozen=True, slots=True)
+class MemorySearchResult:
+    """Immutable search hit that never carries the entry's embedding.
+
+    ``metadata`` is a read-only view of the stored entry's metadata rather
+    than a copy. Fields left out by a projection are None.
+    """
+    id: str
+    score: float
+    content: Optional[str] = None
+    metadata: Optional[Mapping[str, Any]] = None
+    agent_name: Optional[str] = None
+    entry_type: Optional[str] = None
+    timestamp: Optional[float] = None
+    hit_count: Optional[int] = None
+
+    # Projectable payload fields; ``id`` and ``score`` are always included
+    FIELDS = ("content", "metadata", "agent_name", "entry_type", "timestamp", "hit_count")
+
+    @property
+    def relevance_score(self) -> float:
+        return self.score
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict of the projected fields (metadata copied shallowly)."""
+        values = {"id": self.id, "score": self.score}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                values[name] = dict(value) if name == "metadata" else value
+        return values
+
+    @classmethod
+    def projection(cls, fields: Optional[Sequence[str]] = None) -> Tuple[str, ...]:
+        """Validated tuple of payload fields to fill (all of them when ``fields`` is None)."""
+        if fields is None:
+            return cls.FIELDS
+        unknown = [name for name in fields if name not in cls.FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown result fields {unknown}; expected a subset of {cls.FIELDS}")
+        return tuple(fields)
+
+    @classmethod
+    def from_entry(cls, entry: Any, score: float, fields: Tuple[str, ...] = FIELDS) -> "MemorySearchResult":
+        """Result for a memory entry, filling only the (validated) ``fields``."""
+        values = {name: getattr(entry, name) for name in fields}
+        if "metadata" in values:
+            values["metadata"] = MappingProxyType(values["metadata"])
+        return cls(entry.id, float(score), **values)
+
+
+class DenseVectorIndex:
+    """Row-aligned float32 embedding matrix with precomputed inverse norms.
+
+    Row ``i`` of the index always corresponds to ``entries[i]`` of the owning
+    memory, so search results can be mapped back with plain list indexing.
+    Rows are split into a read-only *base* (typically a memory-mapped snapshot
+    shared between processes through the page cache) and a growable in-RAM
+    *tail* for rows added since. Vectors are kept as stored and cosine scores
+    are obtained by scaling dot products with the cached inverse norms.
+    Agent and entry type labels live in :class:`RowPartitions`, so a filtered
+    search only gathers and scores the rows of the matching partition.
+    """
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 1024):
+        self.dim = dim
+        self._initial_capacity = initial_capacity
+        self._base = np.zeros((0, dim or 0), dtype=np.float32)
+        self._tail = np.zeros((0, dim or 0), dtype=np.float32)
+        self._tail_size = 0
+        self._inv_norms = np.zeros(0, dtype=np.float32)
+        self.partitions = RowPartitions()
+
+    def __len__(self) -> int:
+        return len(self._base) + self._tail_size
+
+    @property
+    def base_size(self) -> int:
+        """Number of rows served from the read-only base matrix."""
+        return len(self._base)
+
+    @staticmethod
+    def inverse_norms(norms: np.ndarray) -> np.ndarray:
+        """Inverse L2 norms, mapping zero vectors to zero."""
+        norms = np.asarray(norms, dtype=np.float32)
+        inv = np.zeros_like(norms)
+        np.divide(1.0, norms, out=inv, where=norms > 0)
+        return inv
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows, leaving zero vectors untouched."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _grow(self, array: np.ndarray, size: int, capacity: int) -> np.ndarray:
+        grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:size] = array[:size]
+        return grown
+
+    def _reserve(self, needed: int):
+        """Grow the in-RAM arrays geometrically so appends stay amortized O(1)."""
+        total = len(self)
+        if needed > len(self._inv_norms):
+            capacity = max(needed, self._initial_capacity, len(self._inv_norms) * 2)
+            self._inv_norms = self._grow(self._inv_norms, total, capacity)
+        tail_needed = needed - len(self._base)
+        if tail_needed > len(self._tail):
+            capacity = max(tail_needed, self._initial_capacity, len(self._tail) * 2)
+            self._tail = self._grow(self._tail, self._tail_size, capacity)
+
+    def add(self, vector: List[float], agent_name: str, entry_type: str,
+            timestamp: Optional[float] = None, importance: Optional[float] = None) -> int:
+        """Append a single vector and return its row number."""
+        timestamps = None if timestamp is None else [timestamp]
+        importances = None if importance is None else [importance]
+        return int(self.add_batch([vector], [agent_name], [entry_type], timestamps, importances)[0])
+
+    def add_batch(self, vectors, agent_names: List[str], entry_types: List[str],
+                  timestamps: Optional[Iterable[float]] = None,
+                  importance: Optional[Iterable[float]] = None) -> np.ndarray:
+        """Append many vectors to the in-RAM tail and return their row numbers."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._base = np.zeros((0, self.dim), dtype=np.float32)
+            self._tail = np.zeros((0, self.dim), dtype=np.float32)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+        count = vectors.shape[0]
+        start = len(self)
+        self._reserve(start + count)
+        self._tail[self._tail_size:self._tail_size + count] = vectors
+        self._inv_norms[start:start + count] = self.inverse_norms(np.linalg.norm(vectors, axis=1))
+        self.partitions.add(agent_names, entry_types, timestamps, importance)
+        self._tail_size += count
+        return np.arange(start, start + count)
+
+    def rebuild(self, vectors, agent_names: List[str], entry_types: List[str],
+                norms: Optional[np.ndarray] = None, timestamps: Optional[Iterable[float]] = None,
+                importance: Optional[Iterable[float]] = None):
+        """Replace the index contents with the given rows.
+
+        When ``vectors`` is a float32 matrix and its ``norms`` are supplied it is
+        adopted as the read-only base without copying, so a memory-mapped
+        snapshot stays shared in the page cache.
+        """
+        self.__init__(self.dim, self._initial_capacity)
+        if not len(agent_names):
+            return
+        if norms is None or not isinstance(vectors, np.ndarray) or vectors.dtype != np.float32:
+            self.add_batch(vectors, agent_names, entry_types, timestamps, importance)
+            return
+
+        self.dim = vectors.shape[1]
+        self._tail = np.zeros((0, self.dim), dtype=np.float32)
+        capacity = max(len(vectors), self._initial_capacity)
+        self._inv_norms = np.zeros(capacity, dtype=np.float32)
+        self._base = vectors
+        self._inv_norms[:len(vectors)] = self.inverse_norms(norms)
+        self.partitions.rebuild(agent_names, entry_types, timestamps, importance)
+
+    def keep(self, mask: np.ndarray):
+        """Drop every row whose mask value is False, preserving row order.
+
+        Removing base rows copies the surviving base rows into the in-RAM tail.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        total = len(self)
+        base_size = len(self._base)
+        kept = int(mask.sum())
+        inv_norms = self._inv_norms[:total][mask]
+
+        if mask[:base_size].all():
+            self._tail[:kept - base_size] = self._tail[:self._tail_size][mask[base_size:]]
+            self._tail_size = kept - base_size
+        else:
+            tail = np.zeros((max(kept, self._initial_capacity), self.dim), dtype=np.float32)
+            base_kept = int(mask[:base_size].sum())
+            tail[:base_kept] = self._base[mask[:base_size]]
+            tail[base_kept:kept] = self._tail[:self._tail_size][mask[base_size:]]
+            self._base = np.zeros((0, self.dim), dtype=np.float32)
+            self._tail, self._tail_size = tail, kept
+
+        self._inv_norms[:kept] = inv_norms
+        self.partitions.keep(mask)
+
+    def filter_mask(self, agent_name: Optional[str] = None,
+                    entry_type: Optional[str] = None) -> Optional[np.ndarray]:
+        """Boolean row mask for the given filters, or None when unfiltered."""
+        return self.partitions.mask(agent_name, entry_type)
+
+    def scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine scores of ``rows`` (all rows when None) against normalized queries.
+
+        ``rows`` is a sorted row-id array or a contiguous ``slice``. ``queries``
+        is a single ``(dim,)`` vector or a ``(dim, m)`` matrix of query columns;
+        the result is ``(n,)`` or ``(n, m)`` respectively.
+        """
+        base_size = len(self._base)
+        if rows is None:
+            parts = [self._base @ queries, self._tail[:self._tail_size] @ queries]
+            inv_norms = self._inv_norms[:len(self)]
+        elif isinstance(rows, slice):
+            start, stop = rows.start, rows.stop
+            parts = [self._base[start:stop] @ queries,
+                     self._tail[max(start - base_size, 0):max(stop - base_size, 0)] @ queries]
+            inv_norms = self._inv_norms[start:stop]
+        else:
+            split = int(np.searchsorted(rows, base_size))
+            parts = [self._base[rows[:split]] @ queries,
+                     self._tail[rows[split:] - base_size] @ queries]
+            inv_norms = self._inv_norms[rows]
+        scores = np.concatenate(parts)
+        if scores.ndim == 2:
+            inv_norms = inv_norms[:, None]
+        return scores * inv_norms
+
+    @staticmethod
+    def top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Indices of the ``top_k`` highest scores, best first."""
+        if top_k <= 0 or scores.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        if top_k < scores.size:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(scores.size)
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def search(self, query: List[float], top_k: int = 5, agent_name: Optional[str] = None,
+               entry_type: Optional[str] = None,
+               scoring: Optional[ScoringOptions] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(rows, scores)`` for the best matching rows.
+
+        Scores are cosine similarities, adjusted by ``scoring`` when given.
+        """
+        if len(self) == 0 or self.dim is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query_vec = self.normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+        rows = self.partitions.rows(agent_name, entry_type)
+        scores = self.scores(query_vec, rows)
+        if scoring is not None:
+            scores = scoring.apply(scores, self.partitions, rows)
+
+        best = self.top_k(scores, top_k)
+        if rows is not None:
+            return rows[best], scores[best]
+        return best, scores[best]
+
+    def search_many(self, queries, top_k: int = 5, agent_name: Optional[str] = None,
+                    entry_type: Optional[str] = None,
+                    scoring: Optional[ScoringOptions] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Search several queries at once, one ``(rows, scores)`` pair per query.
+
+        Candidate rows are resolved once and scored against all queries with a
+        matrix-matrix product per block of ``SEARCH_BLOCK_ROWS`` rows, keeping a
+        running top-k per query column.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        count = len(queries)
+        if len(self) == 0 or self.dim is None or count == 0 or top_k <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in range(count)]
+
+        query_matrix = np.ascontiguousarray(self.normalize(queries).T)
+        rows = self.partitions.rows(agent_name, entry_type)
+        total = len(self) if rows is None else len(rows)
+        best_rows = np.zeros((0, count), dtype=np.int64)
+        best_scores = np.zeros((0, count), dtype=np.float32)
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, total)
+            if rows is None:
+                block, block_rows = slice(start, stop), np.arange(start, stop)
+            else:
+                block = block_rows = rows[start:stop]
+            scores = self.scores(query_matrix, block)
+            if scoring is not None:
+                scores = scoring.apply(scores, self.partitions, block)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(block_rows[:, None], scores.shape)])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=0)[:top_k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=0)
+                best_scores = np.take_along_axis(best_scores, keep, axis=0)
+
+        order = np.argsort(-best_scores, axis=0, kind="stable")
+        best_rows = np.take_along_axis(best_rows, order, axis=0)
+        best_scores = np.take_along_axis(best_scores, order, axis=0)
+        return [(best_rows[:, j], best_scores[:, j]) for j in range(count)]
+
+
+class InvertedIndex:
+    """Incrementally maintained term index for text similarity search.
+
+    Scores reproduce the blend used by ``TextSimilarityMemory``: cosine
+    similarity of raw term frequencies plus Jaccard similarity of the extracted
+    keyword sets. Document norms and keyword set sizes are computed once on
+    insert, so a query only walks the posting lists of its own terms.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._keyword_postings: Dict[str, Set[str]] = {}
+        self._norms: Dict[str, float] = {}
+        self._keyword_counts: Dict[str, int] = {}
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._doc_keywords: Dict[str, Tuple[str, ...]] = {}
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: str, words: Iterable[str], keywords: Iterable[str]):
+        """Index a document from its token list and keyword list."""
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+
+        counts = Counter(words)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        keyword_set = set(keywords)
+        for keyword in keyword_set:
+            self._keyword_postings.setdefault(keyword, set()).add(doc_id)
+
+        self._norms[doc_id] = math.sqrt(sum(tf * tf for tf in counts.values()))
+        self._keyword_counts[doc_id] = len(keyword_set)
+        self._doc_terms[doc_id] = tuple(counts)
+        self._doc_keywords[doc_id] = tuple(keyword_set)
+        self._order[doc_id] = self._next_order
+        self._next_order += 1
+
+    def remove(self, doc_id: str):
+        """Remove a document and prune any posting lists it leaves empty."""
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        for keyword in self._doc_keywords.pop(doc_id, ()):
+            postings = self._keyword_postings.get(keyword)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._keyword_postings[keyword]
+        self._norms.pop(doc_id, None)
+        self._keyword_counts.pop(doc_id, None)
+        self._order.pop(doc_id, None)
+
+    def score(self, words: Iterable[str], keywords: Iterable[str],
+              tfidf_weight: float = 0.7, keyword_weight: float = 0.3) -> Dict[str, float]:
+        """Blended similarity for every document sharing a term with the query."""
+        return self.score_many([(words, keywords)], tfidf_weight, keyword_weight)[0]
+
+    def score_many(self, queries: List[Tuple[Iterable[str], Iterable[str]]],
+                   tfidf_weight: float = 0.7, keyword_weight: float = 0.3) -> List[Dict[str, float]]:
+        """Blended similarities for several ``(words, keywords)`` queries.
+
+        Each posting list is walked once no matter how many queries share its term.
+        """
+        query_counts = [Counter(words) for words, _ in queries]
+        query_norms = [math.sqrt(sum(tf * tf for tf in counts.values())) for counts in query_counts]
+        query_keywords = [set(keywords) for _, keywords in queries]
+
+        term_users: Dict[str, List[Tuple[int, int]]] = {}
+        for i, counts in enumerate(query_counts):
+            if query_norms[i]:
+                for term, query_tf in counts.items():
+                    term_users.setdefault(term, []).append((i, query_tf))
+        keyword_users: Dict[str, List[int]] = {}
+        for i, keywords in enumerate(query_keywords):
+            for keyword in keywords:
+                keyword_users.setdefault(keyword, []).append(i)
+
+        dots: List[Dict[str, float]] = [{} for _ in queries]
+        for term, users in term_users.items():
+            for doc_id, doc_tf in self._postings.get(term, {}).items():
+                for i, query_tf in users:
+                    dots[i][doc_id] = dots[i].get(doc_id, 0.0) + query_tf * doc_tf
+        overlaps: List[Dict[str, int]] = [{} for _ in queries]
+        for keyword, users in keyword_users.items():
+            for doc_id in self._keyword_postings.get(keyword, ()):
+                for i in users:
+                    overlaps[i][doc_id] = overlaps[i].get(doc_id, 0) + 1
+
+        results = []
+        for i in range(len(queries)):
+            scores: Dict[str, float] = {}
+            for doc_id, dot in dots[i].items():
+                norm = self._norms[doc_id]
+                if norm:
+                    scores[doc_id] = tfidf_weight * dot / (query_norms[i] * norm)
+            for doc_id, overlap in overlaps[i].items():
+                union = len(query_keywords[i]) + self._keyword_counts[doc_id] - overlap
+                if union:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + keyword_weight * overlap / union
+            results.append(scores)
+        return results
+
+    def top_k(self, scores: Dict[str, float], top_k: int) -> List[Tuple[str, float]]:
+        """Best ``top_k`` (doc_id, score) pairs; ties keep insertion order."""
+        best = heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], self._order[item[0]]))
+        return [(doc_id, score) for doc_id, score in best]
+
+
+class SimHashIndex:
+    """64-bit SimHash fingerprints with banded lookup for near-duplicate detection.
+
+    Fingerprints are built from word unigrams and bigrams. The 64 bits are
+    split into ``max_distance + 1`` bands, so by the pigeonhole principle any
+    fingerprint within ``max_distance`` bits of a query shares at least one
+    band with it exactly; only documents in those buckets are compared.
+    Lookups are confined to a caller-supplied scope such as
+    ``(agent_name, entry_type)``.
+    """
+
+    BITS = 64
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self._band_bits = [self.BITS // (max_distance + 1) + (1 if i < self.BITS % (max_distance + 1) else 0)
+                           for i in range(max_distance + 1)]
+        self._fingerprints: Dict[str, Tuple[int, Tuple]] = {}
+        self._buckets: Dict[Tuple, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    @staticmethod
+    def tokens(text: str) -> List[str]:
+        """Lowercase word tokens; texts with equal tokens differ only in case, punctuation or spacing."""
+        return re.findall(r'\b\w+\b', text.lower())
+
+    @classmethod
+    def same_wording(cls, text: str, other: str, min_overlap: float = 0.9) -> bool:
+        """True when two texts differ at most in case, punctuation, spacing and a few stop words.
+
+        A close fingerprint only nominates a candidate: texts that differ in
+        any other word (a name, a number) state different facts.
+        """
+        tokens, other_tokens = cls.tokens(text), cls.tokens(other)
+        if tokens == other_tokens:
+            return True
+        if [t for t in tokens if t not in STOP_WORDS] != [t for t in other_tokens if t not in STOP_WORDS]:
+            return False
+        counts, other_counts = Counter(tokens), Counter(other_tokens)
+        return sum((counts & other_counts).values()) >= min_overlap * sum((counts | other_counts).values())
+
+    @classmethod
+    def fingerprint(cls, text: str) -> int:
+        """SimHash of the text's word unigrams and bigrams."""
+        tokens = cls.tokens(text)
+        features = Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+        if not features:
+            return 0
+        hashes = np.array([int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little")
+                           for f in features], dtype=np.uint64)
+        bits = (hashes[:, None] >> np.arange(cls.BITS, dtype=np.uint64)) & np.uint64(1)
+        weights = np.fromiter(features.values(), dtype=np.float64, count=len(features))
+        totals = weights @ np.where(bits == 1, 1.0, -1.0)
+        return sum(1 << int(bit) for bit in np.flatnonzero(totals > 0))
+
+    def _bands(self, fingerprint: int, scope: Tuple) -> List[Tuple]:
+        bands, shift = [], 0
+        for band, width in enumerate(self._band_bits):
+            bands.append((scope, band, (fingerprint >> shift) & ((1 << width) - 1)))
+            shift += width
+        return bands
+
+    def add(self, doc_id: str, fingerprint: int, scope: Tuple = ()):
+        if doc_id in self._fingerprints:
+            self.remove(doc_id)
+        self._fingerprints[doc_id] = (fingerprint, scope)
+        for key in self._bands(fingerprint, scope):
+            self._buckets.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: str):
+        fingerprint, scope = self._fingerprints.pop(doc_id, (None, None))
+        if fingerprint is None:
+            return
+        for key in self._bands(fingerprint, scope):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def find(self, fingerprint: int, scope: Tuple = (),
+             accept: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """Closest document within ``max_distance`` bits in the same scope, if any.
+
+        ``accept`` filters the candidates, e.g. to confirm the wording matches.
+        """
+        best, best_distance = None, self.max_distance + 1
+        for key in self._bands(fingerprint, scope):
+            for doc_id in self._buckets.get(key, ()):
+                if accept is not None and not accept(doc_id):
+                    continue
+                distance = bin(self._fingerprints[doc_id][0] ^ fingerprint).count("1")
+                if distance < best_distance or (best is not None and distance == best_distance
+                                                and doc_id < best):
+                    best, best_distance = doc_id, distance
+        return best
@@ -0,0 +1,325 @@
+"""
+Quantized Embedding Storage for Agent Memory
+Int8 scalar quantization and product quantization (PQ) codecs, plus a
+quantized drop-in for DenseVectorIndex that scores compressed codes with
+asymmetric distance computation (ADC) and optionally reranks the best
+candidates against the full-precision vectors.
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from memory_index import DenseVectorIndex, RowPartitions, ScoringOptions
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows scored per block, bounding the float32 temporaries created while decoding codes
+SCORE_BLOCK_ROWS = 16384
+
+
+class ScalarQuantizer:
+    """Per-dimension affine int8 (uint8) quantization, 4x smaller than float32."""
+
+    kind = "int8"
+
+    def __init__(self):
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.offset is not None
+
+    def code_size(self, dim: int) -> int:
+        return dim
+
+    def train(self, vectors: np.ndarray):
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        scale = (high - low) / 255.0
+        scale[scale == 0] = 1.0
+        self.offset, self.scale = low.astype(np.float32), scale.astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((vectors - self.offset) / self.scale), 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.offset + codes.astype(np.float32) * self.scale
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """ADC dot products of coded rows with a ``(dim,)`` or ``(dim, m)`` query."""
+        weights = self.scale.reshape((-1,) + (1,) * (queries.ndim - 1)) * queries
+        return codes.astype(np.float32) @ weights + self.offset @ queries
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"offset": self.offset, "scale": self.scale}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.offset, self.scale = state["offset"], state["scale"]
+
+
+class ProductQuantizer:
+    """Product quantization: ``subspaces`` byte codes per vector from per-subspace k-means."""
+
+    kind = "pq"
+
+    def __init__(self, subspaces: int = 96, centroids: int = 256, iterations: int = 15,
+                 seed: int = 0):
+        self.subspaces = subspaces
+        self.centroids = centroids
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None  # (subspaces, centroids, sub_dim)
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def code_size(self, dim: int) -> int:
+        return self.codebooks.shape[0] if self.trained else self.subspaces
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """View ``(n, dim)`` vectors as ``(subspaces, n, sub_dim)``."""
+        m = self.codebooks.shape[0]
+        return vectors.reshape(len(vectors), m, -1).transpose(1, 0, 2)
+
+    @staticmethod
+    def _assign(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        distances = (centers ** 2).sum(axis=1)[None, :] - 2.0 * points @ centers.T
+        return distances.argmin(axis=1)
+
+    def train(self, vectors: np.ndarray):
+        n, dim = vectors.shape
+        m = min(self.subspaces, dim)
+        while dim % m:
+            m -= 1
+        k = min(self.centroids, n)
+        rng = np.random.default_rng(self.seed)
+        parts = vectors.reshape(n, m, -1).transpose(1, 0, 2)
+
+        codebooks = np.zeros((m, k, dim // m), dtype=np.float32)
+        for j in range(m):
+            points = parts[j]
+            centers = points[rng.choice(n, size=k, replace=False)].copy()
+            for _ in range(self.iterations):
+                assignment = self._assign(points, centers)
+                counts = np.bincount(assignment, minlength=k)
+                sums = np.stack([np.bincount(assignment, weights=points[:, d], minlength=k)
+                                 for d in range(points.shape[1])], axis=1)
+                empty = counts == 0
+                centers[~empty] = sums[~empty] / counts[~empty, None]
+                if empty.any():
+                    centers[empty] = points[rng.choice(n, size=int(empty.sum()))]
+            codebooks[j] = centers
+        self.codebooks = codebooks
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((parts.shape[1], parts.shape[0]), dtype=np.uint8)
+        for j, points in enumerate(parts):
+            codes[:, j] = self._assign(points, self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        m = self.codebooks.shape[0]
+        return self.codebooks[np.arange(m), codes].reshape(len(codes), -1)
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """ADC dot products via per-subspace lookup tables."""
+        m, _, sub_dim = self.codebooks.shape
+        single = queries.ndim == 1
+        q = queries.reshape(m, sub_dim, -1)
+        tables = np.einsum("mkd,mdq->mkq", self.codebooks, q)  # (m, centroids, n_queries)
+        scores = tables[np.arange(m), codes].sum(axis=1)       # (rows, n_queries)
+        return scores[:, 0] if single else scores
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.codebooks = state["codebooks"]
+
+
+QUANTIZERS = {
+    ScalarQuantizer.kind: ScalarQuantizer,
+    ProductQuantizer.kind: ProductQuantizer,
+}
+
+
+def make_quantizer(kind: str, **params) -> Any:
+    """Create a quantizer by name (``"int8"`` or ``"pq"``)."""
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization mode '{kind}'; expected one of {sorted(QUANTIZERS)}")
+    return QUANTIZERS[kind](**params)
+
+
+def save_quantizer(quantizer: Any, path: str):
+    np.savez(path, kind=np.array(quantizer.kind), **quantizer.state())
+
+
+def load_quantizer_state(quantizer: Any, path: str):
+    with np.load(path, allow_pickle=False) as data:
+        if str(data["kind"]) != quantizer.kind:
+            raise ValueError(f"{path} holds a '{data['kind']}' codebook, expected '{quantizer.kind}'")
+        quantizer.load_state({key: data[key] for key in data.files if key != "kind"})
+
+
+class QuantizedVectorIndex(DenseVectorIndex):
+    """DenseVectorIndex replacement that keeps only quantized codes in RAM.
+
+    Rows are buffered as normalized float32 until ``train_size`` rows exist,
+    then the quantizer is trained and every row is encoded. Searches score the
+    codes with ADC; when ``rerank`` is greater than one and ``exact_vectors``
+    is available, the best ``top_k * rerank`` candidates are rescored exactly.
+    """
+
+    def __init__(self, quantizer: Any, dim: Optional[int] = None, train_size: int = 1024,
+                 rerank: int = 4, exact_vectors: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                 initial_capacity: int = 1024):
+        super().__init__(dim, initial_capacity)
+        self.quantizer = quantizer
+        self.train_size = train_size
+        self.rerank = rerank
+        self.exact_vectors = exact_vectors
+        self._size = 0
+        self._codes = np.zeros((0, 0), dtype=np.uint8)
+        self._pending = np.zeros((0, dim or 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def base_size(self) -> int:
+        return 0
+
+    def _reserve(self, needed: int):
+        capacity = len(self._codes) if self.quantizer.trained else len(self._pending)
+        if needed > capacity:
+            capacity = max(needed, self._initial_capacity, capacity * 2)
+        if self.quantizer.trained:
+            code_size = self.quantizer.code_size(self.dim)
+            if self._codes.shape[1] != code_size:
+                # First rows encoded with a codebook that was loaded rather than trained here
+                self._codes = np.zeros((capacity, code_size), dtype=np.uint8)
+            elif len(self._codes) < capacity:
+                self._codes = self._grow(self._codes, self._size, capacity)
+        elif len(self._pending) < capacity:
+            self._pending = self._grow(self._pending, self._size, capacity)
+
+    def _train(self):
+        sample = self._pending[:self._size]
+        self.quantizer.train(sample)
+        self._codes = np.zeros((len(self._pending), self.quantizer.code_size(self.dim)), dtype=np.uint8)
+        self._codes[:self._size] = self.quantizer.encode(sample)
+        self._pending = np.zeros((0, self.dim), dtype=np.float32)
+        logger.info(f"Trained {self.quantizer.kind} quantizer on {len(sample)} vectors")
+
+    def add_batch(self, vectors, agent_names, entry_types, timestamps=None, importance=None) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._pending = np.zeros((0, self.dim), dtype=np.float32)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+        start, count = self._size, len(vectors)
+        self._reserve(start + count)
+        self.partitions.add(agent_names, entry_types, timestamps, importance)
+        for offset in range(0, count, SCORE_BLOCK_ROWS):
+            block = self.normalize(vectors[offset:offset + SCORE_BLOCK_ROWS])
+            rows = slice(start + offset, start + offset + len(block))
+            if self.quantizer.trained:
+                self._codes[rows] = self.quantizer.encode(block)
+            else:
+                self._pending[rows] = block
+        self._size += count
+        if not self.quantizer.trained and self._size >= self.train_size:
+            self._train()
+        return np.arange(start, start + count)
+
+    def rebuild(self, vectors, agent_names, entry_types, norms: Optional[np.ndarray] = None,
+                timestamps=None, importance=None):
+        """Replace the contents, encoding ``vectors`` block by block (they may be memory-mapped)."""
+        self._size = 0
+        self.partitions = RowPartitions()
+        if len(agent_names):
+            self.add_batch(vectors, agent_names, entry_types, timestamps, importance)
+
+    def keep(self, mask: np.ndarray):
+        mask = np.asarray(mask, dtype=bool)
+        kept = int(mask.sum())
+        storage = self._codes if self.quantizer.trained else self._pending
+        storage[:kept] = storage[:self._size][mask]
+        self.partitions.keep(mask)
+        self._size = kept
+
+    def scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate cosine scores (ADC once trained, exact while still buffering)."""
+        if not self.quantizer.trained:
+            pending = self._pending[:self._size]
+            return (pending if rows is None else pending[rows]) @ queries
+
+        codes = self._codes[:self._size] if rows is None else self._codes[rows]
+        blocks = [self.quantizer.score(codes[i:i + SCORE_BLOCK_ROWS], queries)
+                  for i in range(0, len(codes), SCORE_BLOCK_ROWS)]
+        if not blocks:
+            return np.zeros((0,) + queries.shape[1:], dtype=np.float32)
+        return np.concatenate(blocks)
+
+    def search(self, query, top_k: int = 5, agent_name: Optional[str] = None,
+               entry_type: Optional[str] = None,
+               scoring: Optional[ScoringOptions] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if self._size == 0 or self.dim is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query_vec = self.normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+        partition = self.partitions.rows(agent_name, entry_type)
+        rows = np.arange(self._size) if partition is None else partition
+        scores = self.scores(query_vec, partition)
+        if scoring is not None:
+            scores = scoring.apply(scores, self.partitions, partition)
+
+        rerank = self.quantizer.trained and self.rerank > 1 and self.exact_vectors is not None
+        best = self.top_k(scores, top_k * self.rerank if rerank else top_k)
+        candidates, candidate_scores = rows[best], scores[best]
+        if rerank and len(candidates):
+            candidate_scores = self.normalize(self.exact_vectors(candidates)) @ query_vec
+            if scoring is not None:
+                candidate_scores = scoring.apply(candidate_scores, self.partitions, candidates)
+            order = self.top_k(candidate_scores, top_k)
+            candidates, candidate_scores = candidates[order], candidate_scores[order]
+        return candidates, candidate_scores
+
+    def search_many(self, queries, top_k: int = 5, agent_name: Optional[str] = None,
+                    entry_type: Optional[str] = None,
+                    scoring: Optional[ScoringOptions] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Batched ADC search, followed by a per-query exact rerank of the shortlists."""
+        rerank = self.quantizer.trained and self.rerank > 1 and self.exact_vectors is not None
+        shortlists = super().search_many(queries, top_k * self.rerank if rerank else top_k,
+                                         agent_name, entry_type, scoring)
+        if not rerank:
+            return shortlists
+        query_vecs = self.normalize(np.asarray(queries, dtype=np.float32).reshape(len(shortlists), -1))
+        results = []
+        for query_vec, (candidates, _) in zip(query_vecs, shortlists):
+            if not len(candidates):
+                results.append((candidates, np.zeros(0, dtype=np.float32)))
+                continue
+            candidate_scores = self.normalize(self.exact_vectors(candidates)) @ query_vec
+            if scoring is not None:
+                candidate_scores = scoring.apply(candidate_scores, self.partitions, candidates)
+            order = self.top_k(candidate_scores, top_k)
+            results.append((candidates[order], candidate_scores[order]))
+        return results
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Bytes held for vector storage versus an equivalent float32 matrix."""
+        per_row = self._codes.shape[1] if self.quantizer.trained else 4 * (self.dim or 0)
+        return {
+            "vector_bytes": per_row * self._size,
+            "float32_bytes": 4 * (self.dim or 0) * self._size,
+        }
@@ -0,0 +1,687 @@
+"""
+Log-Structured Persistence for Agent Memory
+Appends new memory entries to segment files instead of re-pickling the whole
+memory on every insert, and periodically compacts sealed segments into an
+immutable snapshot in a background thread.
+"""
+
+import os
+import glob
+import time
+import atexit
+import weakref
+import dataclasses
+import pickle
+import struct
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Each frame is a little-endian (payload length, crc32) header followed by a pickled record
+FRAME_HEADER = struct.Struct("<II")
+
+
+def encode_frame(record: Any) -> bytes:
+    """Serialize a record into a length-prefixed, checksummed frame."""
+    payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(path: str) -> Iterator[Any]:
+    """Yield records from a frame file, stopping at the first torn or corrupt frame."""
+    for record, _ in read_frames_from(path):
+        yield record
+
+
+def read_frames_from(path: str, offset: int = 0, skip: Optional[Dict[int, int]] = None,
+                     quiet: bool = False) -> Iterator[Tuple[Any, int]]:
+    """Yield ``(record, end_offset)`` pairs starting at byte ``offset``.
+
+    ``skip`` maps frame start offsets to end offsets of byte ranges to jump
+    over without decoding. ``quiet`` suppresses the torn-frame warning, for
+    tailing a file another process may be writing to.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            if skip and offset in skip:
+                offset = skip[offset]
+                f.seek(offset)
+            header = f.read(FRAME_HEADER.size)
+            if not header:
+                return
+            if len(header) < FRAME_HEADER.size:
+                if not quiet:
+                    logger.warning(f"Ignoring truncated frame header at end of {path}")
+                return
+            length, checksum = FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                if not quiet:
+                    logger.warning(f"Ignoring torn frame at end of {path}")
+                return
+            offset += FRAME_HEADER.size + length
+            yield pickle.loads(payload), offset
+
+
+def frame_boundary(path: str, offset: int = 0) -> int:
+    """Offset just past the last intact frame in a run of frames starting at ``offset``."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return offset
+            length, checksum = FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return offset
+            offset += FRAME_HEADER.size + length
+
+
+class FileLock:
+    """Advisory inter-process lock on a lock file, also serializing threads.
+
+    Re-entrant within a thread: only the outermost acquire takes the
+    ``flock``. Without ``fcntl`` (Windows) only the thread lock is used.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self, shared: bool = False, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth == 0 and FCNTL_AVAILABLE:
+            try:
+                self._file = open(self.path, 'a+b')
+                flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+                fcntl.flock(self._file.fileno(), flags if blocking else flags | fcntl.LOCK_NB)
+            except OSError:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                if blocking:
+                    raise
+                return False
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    @contextmanager
+    def hold(self, shared: bool = False):
+        self.acquire(shared)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class LazyInstance:
+    """Proxy that builds its target with ``factory`` on first attribute access.
+
+    Module-level memory singletons use it so that importing a module creates
+    no directories, lock files or flusher threads.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_lazy_factory", factory)
+        object.__setattr__(self, "_lazy_instance", None)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+
+    def _lazy_get(self) -> Any:
+        if self._lazy_instance is None:
+            with self._lazy_lock:
+                if self._lazy_instance is None:
+                    object.__setattr__(self, "_lazy_instance", self._lazy_factory())
+        return self._lazy_instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._lazy_get(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._lazy_get(), name, value)
+
+
+def _flush_at_exit(store_ref: "weakref.ref"):
+    store = store_ref()
+    if store is not None:
+        store.flush()
+
+
+class MemoryLogStore:
+    """Append-only segment log of memory entry mutations.
+
+    Records are ``("add", entry)`` and ``("delete", [entry_id, ...])`` tuples.
+    New records always go to the active segment; once it exceeds
+    ``segment_max_bytes`` it is sealed and a fresh one is started. When enough
+    sealed segments pile up, the current live entries are written to
+    ``snapshot.log`` in a background thread and the covered segments are
+    deleted. Recovery loads the snapshot and replays the remaining segments.
+
+    When ``vector_field`` is set, that attribute is stripped from snapshot
+    records and stored as a float32 ``.npy`` matrix (plus a norms file) next
+    to the snapshot. On load the matrix is memory-mapped and every snapshot
+    entry gets a zero-copy row view, so processes sharing a memory directory
+    share the vectors through the page cache instead of unpickling them.
+
+    With ``write_behind`` enabled, appends only enqueue the mutation and
+    return. Pending records are coalesced per entry id (the latest mutation
+    wins) and written by a background thread once ``flush_max_records`` are
+    queued or the oldest has waited ``flush_interval`` seconds, which bounds
+    how much can be lost on a crash. :meth:`flush` writes them immediately,
+    and :meth:`load` flushes before replaying, so a reload (for instance after
+    another process compacted a shared log) never hides queued mutations.
+
+    With ``shared`` enabled, several processes may use the same directory.
+    Writers append to the newest segment while holding an exclusive
+    ``flock`` on ``store.lock``, so there is a single writer at a time and
+    frames never interleave; a torn frame left by a writer that crashed is
+    truncated before the next append. Readers never take that lock: :meth:`refresh`
+    tails the segments from a per-process cursor and returns the records
+    other processes appended since, skipping this process's own writes.
+    Compaction replays the log from disk (another process may hold entries
+    this one has not seen yet) and only swaps files under the lock.
+    """
+
+    SNAPSHOT_NAME = "snapshot.log"
+    LOCK_NAME = "store.lock"
+    COMPACT_LOCK_NAME = "compact.lock"
+
+    def __init__(self, directory: str, snapshot_source: Callable[[], List[Any]],
+                 segment_max_bytes: int = 8 * 1024 * 1024, compact_after_segments: int = 4,
+                 fsync: bool = False, vector_field: Optional[str] = None, write_behind: bool = False,
+                 flush_interval: float = 1.0, flush_max_records: int = 1024, shared: bool = False):
+        self.directory = directory
+        self.snapshot_source = snapshot_source
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_after_segments = compact_after_segments
+        self.fsync = fsync
+        self.vector_field = vector_field
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_max_records = flush_max_records
+        self.shared = shared
+        self.write_count = 0
+
+        # Populated by load(): memory-mapped vectors (and their norms) for the
+        # leading live entries that still match snapshot rows one-to-one
+        self.mapped_vectors: Optional[np.ndarray] = None
+        self.mapped_norms: Optional[np.ndarray] = None
+
+        self._lock = threading.RLock()
+        self._active = None
+        self._active_seq = 0
+        self._active_bytes = 0
+        self._compaction_thread: Optional[threading.Thread] = None
+
+        # Write-behind queue; guarded separately so enqueueing never waits on disk I/O
+        self._pending: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict()
+        self._pending_since: Optional[float] = None
+        self._pending_cond = threading.Condition(threading.Lock())
+        self._flush_lock = threading.RLock()
+        self._flusher: Optional[threading.Thread] = None
+        self._closing = False
+        if write_behind:
+            atexit.register(_flush_at_exit, weakref.ref(self))
+
+        # Shared mode: next (segment, offset) to read, and byte ranges this process wrote
+        self._file_lock = FileLock(os.path.join(directory, self.LOCK_NAME))
+        self._compact_lock = FileLock(os.path.join(directory, self.COMPACT_LOCK_NAME))
+        self._cursor: Tuple[int, int] = (1, 0)
+        self._own_writes: Dict[int, Dict[int, int]] = {}
+        # (segment, offset) of a frame boundary in the tail already checked for torn frames
+        self._tail_checked: Tuple[int, int] = (0, 0)
+
+        os.makedirs(directory, exist_ok=True)
+        segments = self._list_segments()
+        self._next_seq = max([self._snapshot_through()] + [seq for seq, _ in segments]) + 1
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, self.SNAPSHOT_NAME)
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"segment-{seq:08d}.log")
+
+    def _list_segments(self) -> List[Tuple[int, str]]:
+        segments = []
+        for path in glob.glob(os.path.join(self.directory, "segment-*.log")):
+            name = os.path.basename(path)
+            try:
+                segments.append((int(name[len("segment-"):-len(".log")]), path))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _snapshot_through(self) -> int:
+        """Highest segment sequence already folded into the snapshot."""
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        for record in read_frames(self.snapshot_path):
+            if record[0] == "snapshot":
+                return record[1]
+            break
+        return 0
+
+    def is_empty(self) -> bool:
+        """True when neither a snapshot nor any segment exists yet."""
+        return not os.path.exists(self.snapshot_path) and not self._list_segments()
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _apply(live: Dict[str, Any], record: Tuple[str, Any]):
+        op, payload = record
+        if op == "add":
+            live[payload.id] = payload
+        elif op == "delete":
+            for entry_id in payload:
+                live.pop(entry_id, None)
+
+    def load(self) -> List[Any]:
+        """Rebuild the live entry list from the snapshot plus newer segments.
+
+        Queued write-behind mutations are flushed first: the replay below
+        would otherwise drop them, and once written they would count as own
+        writes that :meth:`refresh` skips.
+        """
+        self.flush()
+        # A shared lock keeps a concurrent compaction from swapping files mid-read
+        with self._lock, (self._file_lock.hold(shared=True) if self.shared else nullcontext()):
+            entries, snapshot_entries, vectors, norms, cursor = self._replay()
+            self._cursor = cursor
+            self._own_writes = {}
+
+            self.mapped_vectors = self.mapped_norms = None
+            if vectors is not None:
+                prefix = 0
+                for entry, snapshot_entry in zip(entries, snapshot_entries):
+                    if entry is not snapshot_entry:
+                        break
+                    prefix += 1
+                self.mapped_vectors, self.mapped_norms = vectors[:prefix], norms[:prefix]
+            return entries
+
+    def _replay(self, through_segment: Optional[int] = None):
+        """Read the snapshot and segments (up to ``through_segment``) into live entries.
+
+        Returns ``(entries, snapshot_entries, vectors, norms, cursor)`` where
+        ``cursor`` is the (segment, offset) just past the last record read.
+        """
+        live: Dict[str, Any] = {}
+        through = 0
+        vectors = norms = None
+        snapshot_entries: List[Any] = []
+        if os.path.exists(self.snapshot_path):
+            for record in read_frames(self.snapshot_path):
+                if record[0] == "snapshot":
+                    through = record[1]
+                    vectors_name = record[2] if len(record) > 2 else None
+                    if vectors_name:
+                        vectors = np.load(os.path.join(self.directory, vectors_name), mmap_mode='r')
+                        norms = np.load(self._norms_path(vectors_name))
+                    continue
+                if vectors is not None:
+                    setattr(record[1], self.vector_field, vectors[len(snapshot_entries)])
+                snapshot_entries.append(record[1])
+                self._apply(live, record)
+        cursor = (through + 1, 0)
+        for seq, path in self._list_segments():
+            if seq <= through or (through_segment is not None and seq > through_segment):
+                continue
+            offset = 0
+            for record, offset in read_frames_from(path, quiet=self.shared):
+                self._apply(live, record)
+            cursor = (seq, offset)
+        return list(live.values()), snapshot_entries, vectors, norms, cursor
+
+    def refresh(self) -> Optional[List[Tuple[str, Any]]]:
+        """Records other processes appended since the last load or refresh.
+
+        Only meaningful in shared mode (otherwise always empty). Returns None
+        when a compaction removed segments this process had not finished
+        reading; the caller must then :meth:`load` again. Never waits for the
+        writer lock: a frame that is still being written is picked up next time.
+        """
+        if not self.shared:
+            return []
+        with self._lock:
+            seq, offset = self._cursor
+            records: List[Tuple[str, Any]] = []
+            try:
+                while True:
+                    path = self._segment_path(seq)
+                    if not os.path.exists(path):
+                        if self._snapshot_through() >= seq:
+                            return None
+                        break
+                    offset = self._read_segment(seq, offset, records)
+                    if not os.path.exists(self._segment_path(seq + 1)):
+                        break
+                    # The next segment exists, so this one is sealed: drain it and move on
+                    self._read_segment(seq, offset, records)
+                    self._own_writes.pop(seq, None)
+                    seq, offset = seq + 1, 0
+            except FileNotFoundError:
+                return None
+            self._cursor = (seq, offset)
+            return records
+
+    def _read_segment(self, seq: int, offset: int, records: List[Tuple[str, Any]]) -> int:
+        path = self._segment_path(seq)
+        if os.path.getsize(path) <= offset:
+            return offset
+        own = self._own_writes.get(seq)
+        for record, offset in read_frames_from(path, offset, skip=own, quiet=True):
+            records.append(record)
+        if own:
+            # Own writes at the very end are not followed by a frame, so skip them here
+            while offset in own:
+                offset = own.pop(offset)
+        return offset
+
+    # ------------------------------------------------------------------
+    # Appends
+    # ------------------------------------------------------------------
+
+    def append_add(self, entries: List[Any]):
+        """Log newly added (or replaced) entries."""
+        if self.write_behind:
+            self._enqueue([(entry.id, ("add", entry)) for entry in entries])
+        else:
+            self._append([("add", entry) for entry in entries])
+
+    def append_delete(self, entry_ids: List[str]):
+        """Log removal of entries by id."""
+        if not entry_ids:
+            return
+        if self.write_behind:
+            self._enqueue([(entry_id, ("delete", entry_id)) for entry_id in entry_ids])
+        else:
+            self._append([("delete", list(entry_ids))])
+
+    @property
+    def pending(self) -> int:
+        """Number of coalesced mutations not yet written."""
+        return len(self._pending)
+
+    def _enqueue(self, items: List[Tuple[str, Tuple[str, Any]]]):
+        with self._pending_cond:
+            for entry_id, record in items:
+                self._pending.pop(entry_id, None)
+                self._pending[entry_id] = record
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            if self._flusher is None or not self._flusher.is_alive():
+                self._closing = False
+                self._flusher = threading.Thread(target=self._run_flusher,
+                                                 name="memory-log-flusher", daemon=True)
+                self._flusher.start()
+            elif len(self._pending) >= self.flush_max_records:
+                self._pending_cond.notify()
+
+    def _run_flusher(self):
+        while True:
+            with self._pending_cond:
+                while not self._closing:
+                    if self._pending:
+                        due = self._pending_since + self.flush_interval - time.monotonic()
+                        if due <= 0 or len(self._pending) >= self.flush_max_records:
+                            break
+                        self._pending_cond.wait(due)
+                    else:
+                        self._pending_cond.wait()
+                if self._closing:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush memory log: {e}")
+
+    def flush(self):
+        """Write every queued mutation to the log now."""
+        with self._flush_lock:
+            with self._pending_cond:
+                if not self._pending:
+                    return
+                records = [record for record in self._pending.values() if record[0] == "add"]
+                deleted = [record[1] for record in self._pending.values() if record[0] == "delete"]
+                self._pending = OrderedDict()
+                self._pending_since = None
+            # Each id appears once, so adds and deletes can be written as two groups
+            if deleted:
+                records.append(("delete", deleted))
+            self._append(records)
+
+    def _open_segment(self):
+        self._active_seq = self._next_seq
+        self._next_seq += 1
+        self._active = open(self._segment_path(self._active_seq), 'ab')
+        self._active_bytes = 0
+
+    def _seal_segment(self) -> int:
+        """Close the active segment and return the highest sealed sequence."""
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+            return self._active_seq
+        return self._next_seq - 1
+
+    def _append(self, records: List[Tuple[str, Any]]):
+        data = b"".join(encode_frame(record) for record in records)
+        if self.shared:
+            self._append_shared(data)
+            return
+        with self._lock:
+            if self._active is None:
+                self._open_segment()
+            self._active.write(data)
+            self._active.flush()
+            if self.fsync:
+                os.fsync(self._active.fileno())
+            self._active_bytes += len(data)
+            self.write_count += 1
+
+            if self._active_bytes >= self.segment_max_bytes:
+                self._seal_segment()
+                sealed = [seq for seq, _ in self._list_segments() if seq > self._snapshot_through()]
+                if len(sealed) >= self.compact_after_segments:
+                    self.compact()
+
+    def _tail_segment(self) -> int:
+        """Sequence of the newest segment, which is the only one written to in shared mode."""
+        segments = self._list_segments()
+        return segments[-1][0] if segments else self._snapshot_through() + 1
+
+    def _repair_tail(self, seq: int):
+        """Truncate a torn frame a crashed writer left at the end of tail segment ``seq``.
+
+        Readers and compaction stop at the first torn frame, so appending
+        after one would make every later record invisible. Called with the
+        file lock held, when no other writer can be in the middle of a frame.
+        """
+        path = self._segment_path(seq)
+        if not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        checked_seq, checked = self._tail_checked
+        end = frame_boundary(path, checked if checked_seq == seq and checked <= size else 0)
+        if end < size:
+            logger.warning(f"Truncating {size - end} bytes of torn frame at end of {path}")
+            os.truncate(path, end)
+
+    def _append_shared(self, data: bytes):
+        with self._lock, self._file_lock.hold():
+            seq = self._tail_segment()
+            self._repair_tail(seq)
+            with open(self._segment_path(seq), 'ab') as f:
+                start = f.seek(0, os.SEEK_END)
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._own_writes.setdefault(seq, {})[start] = start + len(data)
+            self._tail_checked = (seq, start + len(data))
+            self.write_count += 1
+
+            if start + len(data) >= self.segment_max_bytes:
+                # Seal by starting the next segment; later writers append there
+                open(self._segment_path(seq + 1), 'ab').close()
+                if seq - self._snapshot_through() >= self.compact_after_segments:
+                    self.compact()
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def compact(self, wait: bool = False):
+        """Fold every sealed segment into a new snapshot.
+
+        The active segment is sealed and the live entries are captured under the
+        store lock, so the snapshot is consistent with the log; the write itself
+        happens in a background thread unless ``wait`` is set.
+        """
+        self.flush()
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                if not wait:
+                    return
+                self._compaction_thread.join()
+            if self.shared:
+                target, args = self._compact_shared, ()
+            else:
+                target, args = self._write_snapshot, (list(self.snapshot_source()), self._seal_segment())
+            self._compaction_thread = threading.Thread(
+                target=target, args=args, name="memory-log-compaction", daemon=True
+            )
+            self._compaction_thread.start()
+        if wait:
+            self._compaction_thread.join()
+
+    def _compact_shared(self):
+        """Snapshot everything through the current tail segment, rebuilt from disk."""
+        if not self._compact_lock.acquire(blocking=False):
+            return  # another process is already compacting
+        try:
+            # Same order as _append_shared (store lock, then file lock), or the two deadlock
+            with self._lock, self._file_lock.hold():
+                through = self._tail_segment()
+                tail_path = self._segment_path(through)
+                if os.path.exists(tail_path) and os.path.getsize(tail_path) > 0:
+                    open(self._segment_path(through + 1), 'ab').close()
+                else:
+                    through -= 1  # the tail is already a fresh, empty segment
+                if through <= self._snapshot_through():
+                    return
+                self._skip_sealed(through)
+            # Sealed segments are immutable and only this compactor deletes them
+            entries = self._replay(through)[0]
+            self._write_snapshot(entries, through)
+        finally:
+            self._compact_lock.release()
+
+    def _skip_sealed(self, seq: int):
+        """Move a fully caught-up cursor past sealed segment ``seq`` so compacting it needs no reload.
+
+        Called with the store lock held.
+        """
+        cursor_seq, offset = self._cursor
+        if cursor_seq != seq:
+            return
+        own = self._own_writes.get(seq, {})
+        while offset in own:
+            offset = own[offset]
+        if offset == os.path.getsize(self._segment_path(seq)):
+            self._own_writes.pop(seq, None)
+            self._cursor = (seq + 1, 0)
+
+    def _norms_path(self, vectors_name: str) -> str:
+        return os.path.join(self.directory, vectors_name[:-len(".npy")] + ".norms.npy")
+
+    def _write_vectors(self, entries: List[Any], through: int) -> Optional[str]:
+        """Write the vector column of ``entries`` as a float32 matrix file."""
+        if not self.vector_field or not entries:
+            return None
+        vectors_name = f"vectors-{through:08d}.npy"
+        path = os.path.join(self.directory, vectors_name)
+        dim = len(getattr(entries[0], self.vector_field))
+        vectors = np.lib.format.open_memmap(path + ".tmp", mode='w+', dtype=np.float32,
+                                            shape=(len(entries), dim))
+        for row, entry in enumerate(entries):
+            vectors[row] = getattr(entry, self.vector_field)
+        norms = np.linalg.norm(vectors, axis=1).astype(np.float32)
+        vectors.flush()
+        del vectors
+        with open(self._norms_path(vectors_name) + ".tmp", 'wb') as f:
+            np.save(f, norms)
+        os.replace(self._norms_path(vectors_name) + ".tmp", self._norms_path(vectors_name))
+        os.replace(path + ".tmp", path)
+        return vectors_name
+
+    def _write_snapshot(self, entries: List[Any], through: int):
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            vectors_name = self._write_vectors(entries, through)
+            with open(tmp_path, 'wb') as f:
+                f.write(encode_frame(("snapshot", through, vectors_name)))
+                for entry in entries:
+                    if vectors_name:
+                        entry = dataclasses.replace(entry, **{self.vector_field: None})
+                    f.write(encode_frame(("add", entry)))
+                f.flush()
+                os.fsync(f.fileno())
+            with self._file_lock.hold() if self.shared else nullcontext():
+                os.replace(tmp_path, self.snapshot_path)
+
+                for seq, path in self._list_segments():
+                    if seq <= through:
+                        os.remove(path)
+                # Old vector files may still be mapped by other processes; unlinking is safe on POSIX
+                for path in glob.glob(os.path.join(self.directory, "vectors-*.npy")):
+                    if vectors_name is None or not os.path.basename(path).startswith(vectors_name[:-len(".npy")]):
+                        os.remove(path)
+            logger.debug(f"Compacted {len(entries)} memory entries through segment {through}")
+        except Exception as e:
+            logger.error(f"Failed to compact memory log: {e}")
+
+    def close(self):
+        """Flush queued mutations, wait for any running compaction and close the active segment."""
+        with self._pending_cond:
+            self._closing = True
+            self._pending_cond.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            self._seal_segment()
@@ -0,0 +1,155 @@
+"""
+Columnar Import/Export for Agent Memory
+Writes memory entries as a directory holding an ``.npz`` of numeric columns
+(embeddings, timestamps, hit counts, agent/type codes), a JSON-lines table of
+ids, contents and metadata, and a small manifest. Both sides stream in
+fixed-size batches, so millions of entries move with bounded extra RAM and no
+pickled Python objects are involved.
+"""
+
+import os
+import json
+import logging
+import zipfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = "agent-memory-columnar"
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+COLUMNS_NAME = "columns.npz"
+TABLE_NAME = "entries.jsonl"
+
+
+def _write_column(archive: zipfile.ZipFile, name: str, dtype, shape: Tuple[int, ...],
+                  chunks: Iterable[np.ndarray]):
+    """Stream one ``.npy`` member into an (uncompressed) npz archive chunk by chunk."""
+    dtype = np.dtype(dtype)
+    with archive.open(name + ".npy", "w", force_zip64=True) as f:
+        np.lib.format.write_array_header_2_0(f, {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": shape,
+        })
+        for chunk in chunks:
+            f.write(np.ascontiguousarray(chunk, dtype=dtype).tobytes())
+
+
+def _read_column(archive: zipfile.ZipFile, name: str, batch_rows: int) -> Iterator[np.ndarray]:
+    """Yield ``batch_rows``-row slices of one ``.npy`` member without loading all of it."""
+    with archive.open(name + ".npy") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if fortran_order:
+            raise ValueError(f"Column {name} is stored in Fortran order")
+        row_shape = shape[1:]
+        row_bytes = dtype.itemsize * int(np.prod(row_shape, dtype=np.int64))
+        remaining = shape[0]
+        while remaining > 0:
+            rows = min(batch_rows, remaining)
+            data = f.read(rows * row_bytes)
+            if len(data) < rows * row_bytes:
+                raise ValueError(f"Column {name} is truncated")
+            yield np.frombuffer(data, dtype=dtype).reshape((rows,) + row_shape)
+            remaining -= rows
+
+
+def export_entries(path: str, entries: List[Any], backend: str, vector_field: Optional[str] = None,
+                   table_fields: Tuple[str, ...] = ("id", "content", "metadata"),
+                   batch_rows: int = 65536) -> int:
+    """Write ``entries`` to the columnar export directory ``path`` and return the count."""
+    os.makedirs(path, exist_ok=True)
+    count = len(entries)
+    agents: Dict[str, int] = {}
+    types: Dict[str, int] = {}
+    agent_codes = np.fromiter((agents.setdefault(e.agent_name, len(agents)) for e in entries),
+                              dtype=np.int32, count=count)
+    type_codes = np.fromiter((types.setdefault(e.entry_type, len(types)) for e in entries),
+                             dtype=np.int32, count=count)
+
+    def batches(column: Callable[[List[Any]], np.ndarray]) -> Iterator[np.ndarray]:
+        for start in range(0, count, batch_rows):
+            yield column(entries[start:start + batch_rows])
+
+    dim = 0
+    if vector_field and entries:
+        dim = len(getattr(entries[0], vector_field))
+
+    tmp_columns = os.path.join(path, COLUMNS_NAME + ".tmp")
+    with zipfile.ZipFile(tmp_columns, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        if vector_field:
+            _write_column(archive, "embeddings", np.float32, (count, dim), batches(
+                lambda chunk: np.array([getattr(e, vector_field) for e in chunk], dtype=np.float32).reshape(-1, dim)
+            ))
+        _write_column(archive, "timestamps", np.float64, (count,),
+                      batches(lambda chunk: np.array([e.timestamp for e in chunk], dtype=np.float64)))
+        _write_column(archive, "hit_counts", np.int32, (count,),
+                      batches(lambda chunk: np.array([e.hit_count for e in chunk], dtype=np.int32)))
+        _write_column(archive, "agent_codes", np.int32, (count,), [agent_codes])
+        _write_column(archive, "type_codes", np.int32, (count,), [type_codes])
+
+    tmp_table = os.path.join(path, TABLE_NAME + ".tmp")
+    with open(tmp_table, "w", encoding="utf-8") as f:
+        for start in range(0, count, batch_rows):
+            f.writelines(json.dumps({name: getattr(e, name) for name in table_fields}) + "\n"
+                         for e in entries[start:start + batch_rows])
+
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "backend": backend,
+        "count": count,
+        "dim": dim if vector_field else None,
+        "agents": list(agents),
+        "entry_types": list(types),
+    }
+    os.replace(tmp_columns, os.path.join(path, COLUMNS_NAME))
+    os.replace(tmp_table, os.path.join(path, TABLE_NAME))
+    with open(os.path.join(path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Exported {count} memory entries to {path}")
+    return count
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_NAME or manifest.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(f"{path} is not a supported memory export")
+    return manifest
+
+
+def iter_import(path: str, batch_rows: int = 10000,
+                with_embeddings: bool = False) -> Iterator[Tuple[List[Dict[str, Any]], Optional[np.ndarray]]]:
+    """Yield ``(rows, embeddings)`` batches from an export directory.
+
+    Each row dict has the table fields plus ``timestamp``, ``hit_count``,
+    ``agent_name`` and ``entry_type``. ``embeddings`` is a read-only
+    ``(len(rows), dim)`` float32 batch, or None unless ``with_embeddings``.
+    """
+    manifest = read_manifest(path)
+    if with_embeddings and manifest["dim"] is None:
+        raise ValueError(f"{path} was exported without embeddings")
+    agents, types = manifest["agents"], manifest["entry_types"]
+
+    with zipfile.ZipFile(os.path.join(path, COLUMNS_NAME)) as archive, \
+            open(os.path.join(path, TABLE_NAME), "r", encoding="utf-8") as table:
+        columns = [_read_column(archive, name, batch_rows)
+                   for name in ("timestamps", "hit_counts", "agent_codes", "type_codes")]
+        vectors = _read_column(archive, "embeddings", batch_rows) if with_embeddings else None
+        for timestamps, hit_counts, agent_codes, type_codes in zip(*columns):
+            rows = []
+            for timestamp, hit_count, agent_code, type_code in zip(
+                    timestamps.tolist(), hit_counts.tolist(), agent_codes.tolist(), type_codes.tolist()):
+                row = json.loads(table.readline())
+                row.update(timestamp=timestamp, hit_count=hit_count,
+                           agent_name=agents[agent_code], entry_type=types[type_code])
+                rows.append(row)
+            yield rows, (next(vectors) if vectors is not None else None)
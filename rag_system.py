@@ -2,12 +2,17 @@
 RAG (Retrieval-Augmented Generation) System Integration
 """
 
+import io
 import os
-import json
+import time
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Set, TextIO, Tuple, Union
 from dataclasses import dataclass
 
+from config import Config
+from text_chunking import TextChunk, chunk_stream
+
 try:
     import chromadb
     from chromadb.config import Settings
@@ -25,14 +30,109 @@ class RAGResult:
     source: str
     score: float
     metadata: Dict[str, Any]
+    start_offset: Optional[int] = None  # character offsets of the passage in its source
+    end_offset: Optional[int] = None
+
+# A document to ingest: (content, source) or (content, source, metadata); content may be a text stream
+DocumentInput = Union[Tuple[Union[str, TextIO], str], Tuple[Union[str, TextIO], str, Optional[Dict[str, Any]]]]
+
+def chunk_id(source: str, text: str) -> str:
+    """Stable content-addressed id: BLAKE2b-128 of the source and the chunk text"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(source.encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+class _ChunkBatcher:
+    """Accumulates chunks from many documents and upserts them with one call per batch
+    
+    With ``replace_sources`` a batch first deletes the stored chunks of
+    sources it is the first to write, so a re-ingested document does not
+    keep chunks of its previous text (edited text gets new ids).
+    """
+    
+    def __init__(self, collection, max_chunks: int, max_bytes: int, replace_sources: bool = False):
+        self.collection = collection
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self.replace_sources = replace_sources
+        self.replaced: Set[str] = set()
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.ids: List[str] = []
+        self.batch_ids: Set[str] = set()
+        self.sources: Set[str] = set()
+        self.size = 0
+        self.failed_sources: Set[str] = set()
+        self.stats = {"batches": 0, "chunks": 0, "bytes": 0, "seconds": 0.0}
+    
+    def add(self, chunk: TextChunk, source: str, metadata: Optional[Dict[str, Any]]):
+        size = len(chunk.text.encode('utf-8'))
+        if self.documents and (len(self.documents) >= self.max_chunks or self.size + size > self.max_bytes):
+            self.flush()
+        doc_id = chunk_id(source, chunk.text)
+        if doc_id in self.batch_ids:
+            # Repeated passage of the same source; one upsert call must not carry an id twice
+            return
+        self.documents.append(chunk.text)
+        self.metadatas.append({**(metadata or {}), "source": source, "chunk_index": chunk.index,
+                               "start_offset": chunk.start, "end_offset": chunk.end})
+        self.ids.append(doc_id)
+        self.batch_ids.add(doc_id)
+        self.sources.add(source)
+        self.size += size
+    
+    def flush(self):
+        if not self.documents:
+            return
+        started = time.perf_counter()
+        try:
+            if self.replace_sources:
+                stale, step = sorted(self.sources - self.replaced), RAGSystem.DELETE_BATCH_PATHS
+                for start in range(0, len(stale), step):
+                    self.collection.delete(where={"source": {"$in": stale[start:start + step]}})
+                self.replaced.update(stale)
+            # ChromaDB's default embedding function embeds the whole batch; re-adding a chunk is a no-op
+            self.collection.upsert(documents=self.documents, metadatas=self.metadatas, ids=self.ids)
+            elapsed = time.perf_counter() - started
+            self.stats["batches"] += 1
+            self.stats["chunks"] += len(self.documents)
+            self.stats["bytes"] += self.size
+            self.stats["seconds"] += elapsed
+            logger.info(f"📦 Batch {self.stats['batches']}: {len(self.documents)} chunks, "
+                        f"{self.size / 1024:.0f} KB in {elapsed:.2f}s "
+                        f"({len(self.documents) / max(elapsed, 1e-9):.0f} chunks/s)")
+        except Exception as e:
+            logger.error(f"❌ Failed to add batch of {len(self.documents)} chunks: {e}")
+            self.failed_sources.update(self.sources)
+        finally:
+            self.documents, self.metadatas, self.ids = [], [], []
+            self.batch_ids = set()
+            self.sources = set()
+            self.size = 0
 
 class RAGSystem:
     """Enhanced RAG system with ChromaDB integration"""
     
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    # Limits of a single collection.upsert call; ChromaDB's own max batch size also applies
+    BATCH_MAX_CHUNKS = 1024
+    BATCH_MAX_BYTES = 8 * 1024 * 1024
+    # File paths per collection.delete call
+    DELETE_BATCH_PATHS = 500
+    
+    def __init__(self, persist_directory: str = "./chroma_db", chunk_size: Optional[int] = None,
+                 chunk_overlap: Optional[int] = None):
         self.persist_directory = persist_directory
+        if chunk_size is None or chunk_overlap is None:
+            config = Config()
+            chunk_size = chunk_size if chunk_size is not None else config.CHUNK_SIZE
+            chunk_overlap = chunk_overlap if chunk_overlap is not None else config.CHUNK_OVERLAP
+        self.chunk_size = chunk_size  # tokens per chunk
+        self.chunk_overlap = chunk_overlap  # tokens repeated between neighbouring chunks
         self.client = None
         self.collection = None
+        self.max_batch_size = None
         self.initialized = False
         
     def initialize(self):
@@ -51,6 +151,8 @@ class RAGSystem:
                 name="knowledge_base",
                 metadata={"description": "RAG knowledge base for agent enhancement"}
             )
+            if hasattr(self.client, "get_max_batch_size"):
+                self.max_batch_size = self.client.get_max_batch_size()
             
             self.initialized = True
             logger.info(f"✅ RAG system initialized with {self.get_document_count()} documents")
@@ -60,30 +162,252 @@ class RAGSystem:
             logger.error(f"❌ RAG initialization failed: {e}")
             return False
     
-    def add_document(self, content: str, source: str, metadata: Dict[str, Any] = None) -> bool:
-        """Add document to knowledge base"""
+    def add_document(self, content: Union[str, TextIO], source: str, metadata: Dict[str, Any] = None) -> bool:
+        """Add document to knowledge base as overlapping chunks of ``chunk_size`` tokens.
+        
+        ``content`` may be a string or an open text stream, which is read
+        incrementally. Every chunk carries its source, chunk index and
+        character offsets in its metadata.
+        """
+        return self.add_documents([(content, source, metadata)])["failed"] == 0
+    
+    def add_documents(self, documents: Iterable[DocumentInput], batch_max_chunks: Optional[int] = None,
+                      batch_max_bytes: Optional[int] = None,
+                      expected_sources: Optional[List[str]] = None,
+                      replace_sources: bool = True) -> Dict[str, Any]:
+        """Chunk many documents and upsert them with one collection call per batch.
+        
+        Chunks from consecutive documents share batches, which close at
+        ``batch_max_chunks`` chunks or ``batch_max_bytes`` bytes of text.
+        Documents are consumed lazily, so ``documents`` may be a generator
+        over open files. Returns document, chunk and batch counts with timing
+        and throughput; per-batch timings are logged.
+        
+        Chunks already stored under a document's source are replaced. Pass
+        ``replace_sources=False`` when the caller removed them itself, as
+        the manifest-driven folder sync does by absolute path.
+        """
+        if expected_sources is None and isinstance(documents, (list, tuple)):
+            expected_sources = [document[1] for document in documents]
+        
+        def chunked():
+            for document in documents:
+                content, source = document[0], document[1]
+                metadata = document[2] if len(document) > 2 else None
+                stream = io.StringIO(content) if isinstance(content, str) else content
+                yield source, metadata, chunk_stream(stream, self.chunk_size, self.chunk_overlap)
+        
+        return self.add_chunked_documents(chunked(), batch_max_chunks, batch_max_bytes, expected_sources,
+                                          replace_sources)
+    
+    def add_chunked_documents(self, documents: Iterable[Tuple[str, Optional[Dict[str, Any]], Iterable[TextChunk]]],
+                              batch_max_chunks: Optional[int] = None,
+                              batch_max_bytes: Optional[int] = None,
+                              expected_sources: Optional[List[str]] = None,
+                              replace_sources: bool = True) -> Dict[str, Any]:
+        """Insert already chunked ``(source, metadata, chunks)`` documents in batches.
+        
+        This is the single writer behind :meth:`add_documents`; parallel
+        ingestion chunks files in worker processes and feeds the results here.
+        Only sources listed in ``written_sources`` are known to be stored.
+        Every other document counts as failed, including any of
+        ``expected_sources`` that ``documents`` never yielded because it
+        raised part way through. ``replace_sources`` is as for
+        :meth:`add_documents`.
+        """
+        stats = {"documents": 0, "failed": 0, "failed_sources": [], "written_sources": [], "chunks": 0,
+                 "batches": 0, "seconds": 0.0, "write_seconds": 0.0, "chunks_per_second": 0.0,
+                 "mb_per_second": 0.0}
+        sources: List[str] = []
+        interrupted = None
+        batcher = None
+        started = time.perf_counter()
         try:
             if not self.initialized:
                 self.initialize()
             
             if not CHROMADB_AVAILABLE or not self.collection:
-                logger.warning("ChromaDB not available - document not added")
+                logger.warning("ChromaDB not available - documents not added")
+                sources = [source for source, _, _ in documents]
+            else:
+                max_chunks = batch_max_chunks or self.BATCH_MAX_CHUNKS
+                if self.max_batch_size:
+                    max_chunks = min(max_chunks, self.max_batch_size)
+                batcher = _ChunkBatcher(self.collection, max_chunks, batch_max_bytes or self.BATCH_MAX_BYTES,
+                                        replace_sources)
+                
+                for source, metadata, chunks in documents:
+                    sources.append(source)
+                    interrupted = source
+                    try:
+                        for chunk in chunks:
+                            batcher.add(chunk, source, metadata)
+                    except Exception as e:
+                        logger.error(f"❌ Failed to read document {source}: {e}")
+                        batcher.failed_sources.add(source)
+                    interrupted = None
+                batcher.flush()
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to add documents: {e}")
+            if batcher is not None:
+                # Chunks of complete documents still go through; a document cut off mid-way does not count
+                batcher.flush()
+                if interrupted is not None:
+                    batcher.failed_sources.add(interrupted)
+        
+        written = set(sources) - batcher.failed_sources if batcher is not None else set()
+        if expected_sources is not None:
+            seen = set(sources)
+            sources += [source for source in expected_sources if source not in seen]
+        failed_sources = sorted({source for source in sources if source not in written})
+        batch_stats = batcher.stats if batcher is not None else {"chunks": 0, "batches": 0, "bytes": 0, "seconds": 0.0}
+        elapsed = time.perf_counter() - started
+        stats.update(
+            documents=len(sources),
+            failed=sum(1 for source in sources if source not in written),
+            failed_sources=failed_sources,
+            written_sources=sorted(written),
+            chunks=batch_stats["chunks"],
+            batches=batch_stats["batches"],
+            seconds=elapsed,
+            write_seconds=batch_stats["seconds"],
+            chunks_per_second=batch_stats["chunks"] / max(elapsed, 1e-9),
+            mb_per_second=batch_stats["bytes"] / (1024 * 1024) / max(elapsed, 1e-9)
+        )
+        
+        if batcher is not None:
+            logger.info(f"✅ Added {stats['documents'] - stats['failed']}/{stats['documents']} documents "
+                        f"({stats['chunks']} chunks in {stats['batches']} batches, {elapsed:.2f}s, "
+                        f"{stats['chunks_per_second']:.0f} chunks/s)")
+        return stats
+    
+    def remove_documents(self, paths: List[str]) -> bool:
+        """Delete every chunk whose metadata ``path`` is one of ``paths``"""
+        try:
+            if not self.initialized:
+                self.initialize()
+            
+            if not CHROMADB_AVAILABLE or not self.collection:
+                logger.warning("ChromaDB not available - documents not removed")
                 return False
             
-            # Generate embedding using ChromaDB's default embedding function
-            doc_id = f"{source}_{abs(hash(content))}"
+            for start in range(0, len(paths), self.DELETE_BATCH_PATHS):
+                batch = paths[start:start + self.DELETE_BATCH_PATHS]
+                self.collection.delete(where={"path": {"$in": batch}})
             
-            self.collection.add(
-                documents=[content],
-                metadatas=[metadata or {"source": source}],
-                ids=[doc_id]
-            )
+            if paths:
+                logger.info(f"🗑️ Removed chunks of {len(paths)} documents")
+            return True
             
-            logger.info(f"✅ Added document: {source}")
+        except Exception as e:
+            logger.error(f"❌ Failed to remove documents: {e}")
+            return False
+    
+    def remove_legacy_documents(self, paths: List[str]) -> bool:
+        """Delete chunks of ``paths`` written before chunks carried their absolute ``path``
+        
+        Older versions stored a file under its name (``source``/``filename``)
+        with ``path`` as given on the command line, or no path at all. Rows
+        with one of the file names are removed when they have no ``path`` or a
+        relative one that resolves to one of ``paths``.
+        """
+        try:
+            if not self.initialized:
+                self.initialize()
+            
+            if not CHROMADB_AVAILABLE or not self.collection:
+                logger.warning("ChromaDB not available - documents not removed")
+                return False
+            
+            paths_by_name: Dict[str, Set[str]] = {}
+            for path in paths:
+                paths_by_name.setdefault(os.path.basename(path), set()).add(os.path.abspath(path))
+            names = list(paths_by_name)
+            stale: Set[str] = set()
+            for key in ("filename", "source"):
+                for start in range(0, len(names), self.DELETE_BATCH_PATHS):
+                    rows = self.collection.get(where={key: {"$in": names[start:start + self.DELETE_BATCH_PATHS]}},
+                                               include=["metadatas"])
+                    for doc_id, metadata in zip(rows["ids"], rows["metadatas"]):
+                        metadata = metadata or {}
+                        path = metadata.get("path")
+                        if path is None or (not os.path.isabs(path)
+                                             and os.path.abspath(path) in paths_by_name[metadata[key]]):
+                            stale.add(doc_id)
+            
+            stale_ids = list(stale)
+            for start in range(0, len(stale_ids), self.DELETE_BATCH_PATHS):
+                self.collection.delete(ids=stale_ids[start:start + self.DELETE_BATCH_PATHS])
+            if stale_ids:
+                logger.info(f"🗑️ Removed {len(stale_ids)} legacy chunks of {len(paths)} documents")
             return True
             
         except Exception as e:
-            logger.error(f"❌ Failed to add document {source}: {e}")
+            logger.error(f"❌ Failed to remove legacy documents: {e}")
+            return False
+    
+    def deduplicate(self, page_size: int = 1000) -> Dict[str, int]:
+        """Collapse duplicate chunks in the collection onto their content-addressed ids
+        
+        Rows are grouped by :func:`chunk_id` of their source and text. Each
+        group keeps a single row under its canonical id; rows stored under
+        legacy ids are moved there together with their stored embedding, so
+        nothing is re-embedded. Safe to re-run after an interruption.
+        """
+        stats = {"scanned": 0, "duplicates": 0, "rekeyed": 0, "remaining": 0}
+        try:
+            if not self.initialized:
+                self.initialize()
+            
+            if not CHROMADB_AVAILABLE or not self.collection:
+                logger.warning("ChromaDB not available - nothing to deduplicate")
+                return stats
+            
+            # Read-only scan first: paging by offset is only stable while nothing changes
+            groups: Dict[str, List[str]] = {}
+            while True:
+                page = self.collection.get(include=["documents", "metadatas"], limit=page_size,
+                                           offset=stats["scanned"])
+                if not page["ids"]:
+                    break
+                for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                    metadata = metadata or {}
+                    source = metadata.get("source") or metadata.get("filename") or ""
+                    groups.setdefault(chunk_id(source, document or ""), []).append(doc_id)
+                stats["scanned"] += len(page["ids"])
+            
+            rekey = {ids[0]: canonical for canonical, ids in groups.items() if canonical not in ids}
+            stale = [doc_id for canonical, ids in groups.items() for doc_id in ids if doc_id != canonical]
+            
+            old_ids = list(rekey)
+            for start in range(0, len(old_ids), page_size):
+                rows = self.collection.get(ids=old_ids[start:start + page_size],
+                                           include=["documents", "metadatas", "embeddings"])
+                self.collection.upsert(ids=[rekey[doc_id] for doc_id in rows["ids"]],
+                                       documents=rows["documents"],
+                                       metadatas=rows["metadatas"],
+                                       embeddings=rows["embeddings"])
+            for start in range(0, len(stale), page_size):
+                self.collection.delete(ids=stale[start:start + page_size])
+            
+            stats.update(duplicates=len(stale) - len(rekey), rekeyed=len(rekey), remaining=len(groups))
+            logger.info(f"🧹 Deduplicated knowledge base: {stats['scanned']} chunks scanned, "
+                        f"{stats['duplicates']} duplicates removed, {stats['rekeyed']} re-keyed")
+            return stats
+            
+        except Exception as e:
+            logger.error(f"❌ Deduplication failed: {e}")
+            return stats
+    
+    def add_document_file(self, file_path: str, source: Optional[str] = None,
+                          metadata: Dict[str, Any] = None) -> bool:
+        """Stream a text file into the knowledge base without reading it into memory"""
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return self.add_document(f, source or os.path.basename(file_path), metadata)
+        except OSError as e:
+            logger.error(f"❌ Failed to read document {file_path}: {e}")
             return False
     
     def search(self, query: str, top_k: int = 5) -> List[RAGResult]:
@@ -109,7 +433,9 @@ class RAGSystem:
                         content=doc,
                         source=metadata.get('source', 'Unknown'),
                         score=1.0 - distance,  # Convert distance to similarity score
-                        metadata=metadata
+                        metadata=metadata,
+                        start_offset=metadata.get('start_offset'),
+                        end_offset=metadata.get('end_offset')
                     ))
             
             logger.info(f"🔍 RAG search found {len(rag_results)} results for: {query[:50]}...")
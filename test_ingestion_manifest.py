@@ -0,0 +1,60 @@
+import os
+
+from ingestion_manifest import IngestionManifest
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+class TestIngestionManifest:
+    def test_plan_tracks_added_changed_removed_and_touched_files(self, tmp_path):
+        docs = tmp_path / "docs"
+        a = write(docs / "a.txt", "alpha")
+        b = write(docs / "b.txt", "beta")
+        c = write(docs / "sub" / "c.txt", "gamma")
+        manifest = IngestionManifest(str(tmp_path / "kb" / IngestionManifest.FILE_NAME))
+
+        plan = manifest.plan([a, b, c], str(docs))
+        assert sorted(plan.added) == sorted([a, b, c]) and not plan.changed
+        for path in plan.to_ingest:
+            manifest.record(path, plan.pending[path])
+        manifest.save()
+
+        write(docs / "a.txt", "alpha, edited")
+        os.utime(b, ns=(1, 1))
+        os.remove(c)
+        reopened = IngestionManifest(manifest.path)
+        plan = reopened.plan([a, b], str(docs))
+        assert plan.changed == [a]
+        assert plan.unchanged == [b]
+        assert plan.removed == [c]
+        assert reopened.entries[b]["mtime_ns"] == 1
+
+        assert reopened.plan([a, b], str(docs), force=True).changed == [a, b]
+
+    def test_removal_is_scoped_to_the_synced_folder(self, tmp_path):
+        manifest = IngestionManifest(str(tmp_path / IngestionManifest.FILE_NAME))
+        inside = write(tmp_path / "docs" / "a.txt", "a")
+        sibling = write(tmp_path / "docs2" / "b.txt", "b")
+        for path in (inside, sibling):
+            manifest.record(path, {"size": 1, "mtime_ns": 0, "sha256": ""})
+
+        os.remove(inside)
+        os.remove(sibling)
+        assert manifest.plan([], str(tmp_path / "docs")).removed == [inside]
+
+    def test_files_outside_the_current_patterns_are_not_removed(self, tmp_path):
+        docs = tmp_path / "docs"
+        top = write(docs / "a.md", "a")
+        nested = write(docs / "sub" / "b.md", "b")
+        manifest = IngestionManifest(str(tmp_path / IngestionManifest.FILE_NAME))
+        for path in (top, nested):
+            manifest.record(path, {"size": 1, "mtime_ns": 0, "sha256": ""})
+
+        # A later non-recursive "*.md" sync only finds the top-level file
+        assert manifest.plan([top], str(docs)).removed == []
+        os.remove(nested)
+        assert manifest.plan([top], str(docs)).removed == [nested]
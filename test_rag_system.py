@@ -0,0 +1,167 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import rag_system
+from rag_system import RAGSystem, chunk_id
+from text_chunking import TextChunk
+
+
+class FakeCollection:
+    """In-memory stand-in for a ChromaDB collection, supporting the calls RAGSystem makes."""
+
+    def __init__(self):
+        self.rows = {}
+        self.upserts = []
+
+    def _matches(self, metadata, where):
+        if where is None:
+            return True
+        (key, condition), = where.items()
+        return metadata.get(key) in condition["$in"]
+
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        assert len(set(ids)) == len(ids)
+        self.upserts.append(list(ids))
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.rows[doc_id] = (document, metadata)
+
+    def get(self, ids=None, where=None, include=(), limit=None, offset=0):
+        selected = [doc_id for doc_id in (self.rows if ids is None else ids)
+                    if doc_id in self.rows and self._matches(self.rows[doc_id][1], where)]
+        selected = selected[offset:None if limit is None else offset + limit]
+        return {"ids": selected,
+                "documents": [self.rows[doc_id][0] for doc_id in selected],
+                "metadatas": [self.rows[doc_id][1] for doc_id in selected],
+                "embeddings": [[0.0] for _ in selected]}
+
+    def delete(self, ids=None, where=None):
+        for doc_id in self.get(ids=ids, where=where)["ids"]:
+            del self.rows[doc_id]
+
+    def count(self):
+        return len(self.rows)
+
+
+@pytest.fixture
+def rag(monkeypatch):
+    monkeypatch.setattr(rag_system, "CHROMADB_AVAILABLE", True)
+    system = RAGSystem(chunk_size=32, chunk_overlap=4)
+    system.collection = FakeCollection()
+    system.initialized = True
+    return system
+
+
+def test_chunk_ids_are_stable_across_processes():
+    script = "from rag_system import chunk_id; print(chunk_id('guide.md', 'Install the package.'))"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == chunk_id("guide.md", "Install the package.")
+    assert chunk_id("guide.md", "Install the package.") != chunk_id("other.md", "Install the package.")
+
+
+def test_legacy_rows_of_a_file_are_removed(rag, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows = rag.collection.rows
+    rows["relative"] = ("old", {"filename": "a.txt", "path": os.path.join("docs", "a.txt")})
+    rows["no-path"] = ("old", {"source": "a.txt"})
+    rows["other-file"] = ("old", {"filename": "a.txt", "path": os.path.join("elsewhere", "a.txt")})
+    rows["current"] = ("new", {"filename": "a.txt", "path": str(tmp_path / "docs" / "a.txt")})
+
+    assert rag.remove_legacy_documents([str(tmp_path / "docs" / "a.txt")])
+    assert sorted(rows) == ["current", "other-file"]
+
+
+def chunks(count, size=10, start=0):
+    return [TextChunk("x" * (size - 4) + f"{i:04d}", i, 0, size) for i in range(start, start + count)]
+
+
+class FailingCollection(FakeCollection):
+    def __init__(self, fail_on_call):
+        super().__init__()
+        self.fail_on_call = fail_on_call
+        self.calls = 0
+
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("collection unavailable")
+        super().upsert(ids, documents, metadatas, embeddings)
+
+
+class TestBatchedIngestion:
+    def test_batches_close_at_chunk_and_byte_limits(self, rag):
+        documents = [("a", None, chunks(5)), ("b", None, chunks(4, start=5))]
+        stats = rag.add_chunked_documents(documents, batch_max_chunks=4, batch_max_bytes=1000)
+        assert [len(ids) for ids in rag.collection.upserts] == [4, 4, 1]
+        assert stats["batches"] == 3 and stats["chunks"] == 9
+
+        rag.collection = FakeCollection()
+        stats = rag.add_chunked_documents([("c", None, chunks(5, size=10))], batch_max_chunks=100,
+                                          batch_max_bytes=25)
+        assert [len(ids) for ids in rag.collection.upserts] == [2, 2, 1]
+        assert stats["failed"] == 0 and stats["written_sources"] == ["c"]
+
+    def test_final_partial_batch_is_flushed(self, rag):
+        stats = rag.add_documents([("First sentence. " * 30, "a"), ("Short note.", "b")])
+        assert stats["batches"] == 1 and stats["documents"] == 2 and stats["failed"] == 0
+        assert {metadata["source"] for _, metadata in rag.collection.rows.values()} == {"a", "b"}
+        assert rag.collection.count() == stats["chunks"]
+
+    def test_failed_write_fails_only_the_sources_in_that_batch(self, rag):
+        rag.collection = FailingCollection(fail_on_call=2)
+        documents = [("a", None, chunks(3)), ("b", None, chunks(3, start=3)), ("c", None, chunks(2, start=6))]
+        stats = rag.add_chunked_documents(documents, batch_max_chunks=3)
+        assert stats["failed"] == 1 and stats["failed_sources"] == ["b"]
+        assert stats["written_sources"] == ["a", "c"]
+
+    def test_iterator_failure_fails_every_unwritten_source(self, rag):
+        def documents():
+            yield "a", None, chunks(2)
+            yield "b", None, iter(chunks(2, start=2))
+            raise RuntimeError("worker pool broke")
+
+        stats = rag.add_chunked_documents(documents(), batch_max_chunks=100, expected_sources=["a", "b", "c"])
+        assert stats["written_sources"] == ["a", "b"] and rag.collection.count() == 4
+        assert stats["documents"] == 3 and stats["failed"] == 1 and stats["failed_sources"] == ["c"]
+
+        rag.collection = FailingCollection(fail_on_call=1)
+        assert rag.add_document("Some text.", "d") is False
+
+
+class TestContentAddressedIds:
+    def test_reingesting_a_document_is_an_upsert_no_op(self, rag):
+        text = "Install the package. Configure the service. Run the checks. " * 10
+        assert rag.add_document(text, "guide.md")
+        rows = dict(rag.collection.rows)
+        assert rag.add_document(text, "guide.md")
+        assert rag.collection.rows == rows
+
+    def test_reingesting_an_edited_document_replaces_its_chunks(self, rag):
+        rag.collection.rows["other"] = ("Unrelated.", {"source": "notes.md"})
+        assert rag.add_document("Install the package. Run the checks. " * 10, "guide.md")
+        assert rag.add_document("Install the package. Run the tests. " * 10, "guide.md")
+        documents = [document for document, metadata in rag.collection.rows.values()
+                     if metadata["source"] == "guide.md"]
+        assert documents and all("checks" not in document for document in documents)
+        assert "other" in rag.collection.rows
+
+        stats = rag.add_documents([("Install the package.", "guide.md")], replace_sources=False)
+        assert stats["failed"] == 0 and chunk_id("guide.md", "Install the package.") in rag.collection.rows
+        assert len(rag.collection.rows) == len(documents) + 2
+
+    def test_deduplicate_rekeys_legacy_ids_and_drops_duplicates(self, rag):
+        rows = rag.collection.rows
+        rows["guide.md_0_1700000000"] = ("Install the package.", {"source": "guide.md"})
+        rows["guide.md_0_1700000500"] = ("Install the package.", {"source": "guide.md"})
+        rows[chunk_id("guide.md", "Run the checks.")] = ("Run the checks.", {"source": "guide.md"})
+        rows["guide.md_1_1700000500"] = ("Run the checks.", {"source": "guide.md"})
+        rows["notes_0"] = ("Install the package.", {"filename": "notes.txt"})
+
+        stats = rag.deduplicate(page_size=2)
+        assert stats == {"scanned": 5, "duplicates": 2, "rekeyed": 2, "remaining": 3}
+        assert sorted(rows) == sorted([chunk_id("guide.md", "Install the package."),
+                                       chunk_id("guide.md", "Run the checks."),
+                                       chunk_id("notes.txt", "Install the package.")])
+        assert rag.deduplicate() == {"scanned": 3, "duplicates": 0, "rekeyed": 0, "remaining": 3}
@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+from text_chunking import CHARS_PER_TOKEN, chunk_stream, chunk_text
+
+
+def make_document(sentences=400):
+    words = ["retrieval", "index", "chunk", "vector", "query", "passage"]
+    return "".join(
+        " ".join(words[(i + j) % len(words)] for j in range(5 + i % 7)) + (".\n\n" if i % 9 == 8 else ". ")
+        for i in range(sentences)
+    )
+
+
+class TestChunkStream:
+    def test_offsets_point_into_the_source(self):
+        text = make_document()
+        chunks = list(chunk_stream(io.StringIO(text), chunk_size=32, overlap=4, read_size=500))
+        assert len(chunks) > 10
+        assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+        for chunk in chunks:
+            assert text[chunk.start:chunk.end] == chunk.text
+            assert len(chunk.text) <= 32 * CHARS_PER_TOKEN
+
+    def test_chunks_end_on_sentences_and_overlap(self):
+        chunks = list(chunk_text(make_document(), chunk_size=32, overlap=4))
+        assert all(chunk.text.endswith(".") for chunk in chunks)
+        assert all(nxt.start < prev.end for prev, nxt in zip(chunks, chunks[1:]))
+
+    def test_read_size_does_not_change_chunks(self):
+        text = make_document(100)
+        small = list(chunk_stream(io.StringIO(text), chunk_size=32, overlap=4, read_size=7))
+        assert small == list(chunk_text(text, chunk_size=32, overlap=4))
+
+    def test_rejects_overlap_of_half_a_chunk(self):
+        with pytest.raises(ValueError):
+            list(chunk_text("text", chunk_size=10, overlap=5))
@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import rag_system
+import upload_docs
+from ingestion_manifest import IngestionManifest
+from test_rag_system import FakeCollection
+
+
+class CountingPool(ProcessPoolExecutor):
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        CountingPool.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+def crash_worker(*args):
+    os._exit(1)
+
+
+@pytest.fixture
+def kb(monkeypatch, tmp_path):
+    monkeypatch.setattr(rag_system, "CHROMADB_AVAILABLE", True)
+    system = upload_docs.rag_system
+    monkeypatch.setattr(system, "collection", FakeCollection())
+    monkeypatch.setattr(system, "initialized", True)
+    monkeypatch.setattr(system, "persist_directory", str(tmp_path / "kb"))
+    return system
+
+
+@pytest.fixture
+def docs(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    paths = []
+    for i in range(8):
+        path = folder / f"note{i}.txt"
+        path.write_text(f"Note number {i}. " * 20)
+        paths.append(str(path))
+    return folder, paths
+
+
+class TestParallelUpload:
+    def test_files_in_flight_never_exceed_queue_size(self, docs, monkeypatch):
+        folder, paths = docs
+        monkeypatch.setattr(upload_docs, "ProcessPoolExecutor", CountingPool)
+        CountingPool.submitted = 0
+        consumed = 0
+        for source, _, chunks in upload_docs._chunked_in_pool(paths, 2, 3, "user_document", str(folder)):
+            consumed += 1
+            assert CountingPool.submitted - consumed <= 3
+            assert chunks and source.startswith("note")
+        assert consumed == len(paths) and CountingPool.submitted == len(paths)
+
+    def test_unreadable_files_count_as_failed(self, kb, docs, tmp_path):
+        folder, paths = docs
+        missing = str(folder / "gone.txt")
+        stats = upload_docs.upload_files_parallel(paths + [missing], workers=2, root=str(folder))
+        assert stats["documents"] == 9 and stats["failed"] == 1
+        assert stats["failed_sources"] == ["gone.txt"]
+        assert len(stats["written_sources"]) == 8
+
+    def test_broken_pool_is_reported_as_failure(self, kb, docs, monkeypatch):
+        folder, paths = docs
+        monkeypatch.setattr(upload_docs, "_read_and_chunk", crash_worker)
+        assert upload_docs.upload_folder(str(folder), ["*.txt"], workers=2) is False
+
+        manifest = IngestionManifest(os.path.join(kb.persist_directory, IngestionManifest.FILE_NAME))
+        assert manifest.entries == {}
+        assert kb.collection.count() == 0
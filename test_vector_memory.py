@@ -0,0 +1,895 @@
+import asyncio
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import memory_index
+
+from conversation_store import ConversationStore, extractive_turn_summary
+from embedding_cache import EmbeddingCache
+from hnsw_index import HNSWIndex
+from memory_index import DenseVectorIndex, MemorySearchResult, RowPartitions, ScoringOptions, SimHashIndex
+from memory_quantization import QuantizedVectorIndex, make_quantizer
+from memory_store import MemoryLogStore, encode_frame
+from vector_memory import ConversationTurn, EmbeddingBatcher, MemoryEntry as VectorMemoryEntry, VectorMemory
+from vector_memory_text import TextSimilarityMemory
+
+
+def fake_embedding(text, dim=8):
+    """Deterministic bag-of-words embedding so tests never hit the network."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        vec[sum(map(ord, word)) % dim] += 1.0
+    return vec.tolist()
+
+
+@pytest.fixture
+def embed_calls(monkeypatch):
+    calls = []
+
+    async def _fetch_embeddings(self, texts):
+        calls.append(list(texts))
+        return [fake_embedding(text) for text in texts]
+    monkeypatch.setattr(VectorMemory, "_fetch_embeddings", _fetch_embeddings)
+    return calls
+
+
+@pytest.fixture
+def memory(tmp_path, embed_calls):
+    return VectorMemory(memory_dir=str(tmp_path / "memory"))
+
+
+class TestDenseVectorIndex:
+    def test_search_matches_bruteforce(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(200, 16)).astype(np.float32)
+        index = DenseVectorIndex()
+        index.add_batch(vectors, ["a"] * 200, ["knowledge"] * 200)
+
+        query = rng.normal(size=16)
+        rows, scores = index.search(query, top_k=5)
+
+        expected = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)) @ (query / np.linalg.norm(query))
+        assert list(rows) == list(np.argsort(-expected)[:5])
+        assert np.allclose(scores, np.sort(expected)[::-1][:5], atol=1e-5)
+
+    def test_filters_and_keep(self):
+        index = DenseVectorIndex()
+        index.add_batch(np.eye(4), ["a", "b", "a", "b"], ["x", "x", "y", "y"])
+        rows, _ = index.search([1, 1, 1, 1], top_k=10, agent_name="a", entry_type="y")
+        assert list(rows) == [2]
+
+        index.keep(np.array([False, True, True, True]))
+        rows, scores = index.search([0, 1, 0, 0], top_k=1)
+        assert list(rows) == [0]
+        assert scores[0] == pytest.approx(1.0)
+
+    def test_search_many_matches_single_queries(self, monkeypatch):
+        monkeypatch.setattr(memory_index, "SEARCH_BLOCK_ROWS", 64)
+        rng = np.random.default_rng(1)
+        index = DenseVectorIndex()
+        index.add_batch(rng.normal(size=(300, 16)), [["a", "b", "c"][i % 3] for i in range(300)], ["k"] * 300)
+        queries = rng.normal(size=(7, 16))
+        for agent_name in (None, "b"):
+            batched = index.search_many(queries, top_k=5, agent_name=agent_name)
+            for query, (rows, scores) in zip(queries, batched):
+                expected_rows, expected_scores = index.search(query, top_k=5, agent_name=agent_name)
+                assert list(rows) == list(expected_rows)
+                assert np.allclose(scores, expected_scores, atol=1e-5)
+
+    def test_scoring_options_adjust_before_top_k(self):
+        index = DenseVectorIndex()
+        index.add_batch(np.ones((4, 3)), ["a"] * 4, ["note", "note", "note", "task_result"],
+                        timestamps=[1000.0, 900.0, 1000.0, 1000.0], importance=[0.0, 0.0, 1.0, 0.0])
+        scoring = ScoringOptions(half_life=100.0, importance_weight=0.5, type_boosts={"task_result": 2.0}, now=1000.0)
+
+        rows, scores = index.search([1, 1, 1], top_k=4, scoring=scoring)
+        assert list(rows) == [3, 2, 0, 1]
+        assert scores == pytest.approx([2.0, 1.5, 1.0, 0.5])
+        batched_rows, batched_scores = index.search_many([[1, 1, 1]], top_k=4, scoring=scoring)[0]
+        assert list(batched_rows) == list(rows)
+        assert batched_scores == pytest.approx(scores)
+
+    def test_weights_never_invert_negative_similarities(self):
+        index = DenseVectorIndex()
+        index.add_batch([[-1, 0], [-1, 0], [-1, 0], [1, 0]], ["a"] * 4, ["note", "task_result", "note", "note"],
+                        timestamps=[900.0, 900.0, 1000.0, 900.0])
+        scoring = ScoringOptions(half_life=100.0, type_boosts={"task_result": 4.0}, now=1000.0)
+
+        # Boosted and fresher dissimilar rows move toward zero instead of further down
+        rows, scores = index.search([1, 0], top_k=4, scoring=scoring)
+        assert list(rows) == [3, 1, 2, 0]
+        assert scores == pytest.approx([0.5, -0.5, -1.0, -2.0])
+        batched_rows, batched_scores = index.search_many([[1, 0]], top_k=4, scoring=scoring)[0]
+        assert list(batched_rows) == list(rows) and batched_scores == pytest.approx(scores)
+
+    def test_partitions_track_rows_and_recency(self):
+        partitions = RowPartitions()
+        partitions.add(["a", "b", "a", "a"], ["x", "x", "y", "x"], [3.0, 1.0, 5.0, 3.0])
+        assert list(partitions.rows("a")) == [0, 2, 3]
+        assert list(partitions.rows("a", "x")) == [0, 3]
+        assert list(partitions.rows(entry_type="x")) == [0, 1, 3]
+        assert partitions.rows() is None
+        assert list(partitions.recent_rows("a")) == [2, 0, 3]
+        assert list(partitions.recent_rows(limit=2)) == [2, 0]
+
+        partitions.keep(np.array([False, True, True, True]))
+        assert list(partitions.rows("a")) == [1, 2]
+        assert list(partitions.recent_rows("a", "x")) == [2]
+        assert partitions.counts() == {"a": 2, "b": 1}
+
+
+class TestSimHashIndex:
+    def test_finds_near_duplicates_within_scope(self):
+        index = SimHashIndex(max_distance=3)
+        text = "Task result: deployed the billing service to production after running the migration"
+        index.add("a", SimHashIndex.fingerprint(text), ("coder", "task_result"))
+        index.add("b", SimHashIndex.fingerprint("Quarterly revenue forecast"), ("coder", "task_result"))
+
+        assert index.find(SimHashIndex.fingerprint(text.upper() + "!"), ("coder", "task_result")) == "a"
+        assert index.find(SimHashIndex.fingerprint(text), ("reviewer", "task_result")) is None
+        assert index.find(SimHashIndex.fingerprint("Refactor the database layer"), ("coder", "task_result")) is None
+        index.remove("a")
+        assert index.find(SimHashIndex.fingerprint(text), ("coder", "task_result")) is None
+
+
+class TestEmbeddingCache:
+    def test_disk_tier_evicts_least_recently_used(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path), memory_items=1, max_disk_mb=1)
+        dim = 1024 * 1024 // 4 // 3  # room for two slots
+        cache.put_many("m", ["a", "b"], [np.full(dim, 1.0), np.full(dim, 2.0)])
+        assert cache.get_many("m", ["a"])[0][0] == 1.0  # touch "a" so "b" is oldest
+        cache.put_many("m", ["c"], [np.full(dim, 3.0)])
+
+        reopened = EmbeddingCache(str(tmp_path), memory_items=1, max_disk_mb=1)
+        a, b, c = reopened.get_many("m", ["a", "b", "c"])
+        assert a[0] == 1.0 and b is None and c[0] == 3.0
+        assert reopened.get_many("other-model", ["a"]) == [None]
+
+    def test_caches_sharing_a_directory_never_return_another_keys_vector(self, tmp_path):
+        dim = 1024 * 1024 // 4 // 3
+        first = EmbeddingCache(str(tmp_path), memory_items=0, max_disk_mb=1)
+        first.put_many("m", ["a"], [np.full(dim, 1.0)])
+        second = EmbeddingCache(str(tmp_path), memory_items=0, max_disk_mb=1)
+        second.put_many("m", ["b"], [np.full(dim, 2.0)])
+        assert first.get_many("m", ["a"])[0][0] == 1.0
+        assert second.get_many("m", ["a", "b"])[1][0] == 2.0  # "b" got its own slot
+
+        # The file is full, so "c" reuses the slot of "a" that the first cache still points at
+        second.put_many("m", ["c"], [np.full(dim, 3.0)])
+        assert first.get_many("m", ["a"]) == [None]
+        assert second.get_many("m", ["b", "c"])[1][0] == 3.0
+
+
+class TestHNSWIndex:
+    @pytest.fixture
+    def index(self):
+        rng = np.random.default_rng(1)
+        index = HNSWIndex(dim=16, M=8, ef_construction=64, seed=3)
+        for i, vector in enumerate(rng.normal(size=(400, 16))):
+            index.add(f"n{i}", vector)
+        return index
+
+    def test_recall_against_exact(self, index):
+        queries = np.random.default_rng(2).normal(size=(20, 16))
+        report = index.recall_report(queries, top_k=5)
+        assert report["recall@5"] >= 0.9
+
+    def test_tombstones_and_persistence(self, index, tmp_path):
+        for i in range(0, 400, 2):
+            index.remove(f"n{i}")
+        query = np.random.default_rng(4).normal(size=16)
+        labels, _ = index.search(query, top_k=10)
+        assert all(int(label[1:]) % 2 for label in labels)
+
+        labels, _ = index.search(query, top_k=3, accept=lambda label: label.endswith("1"))
+        assert labels and all(label.endswith("1") for label in labels)
+
+        index.save(str(tmp_path / "hnsw.npz"))
+        loaded = HNSWIndex.load(str(tmp_path / "hnsw.npz"))
+        assert loaded.search(query, top_k=10)[0] == index.search(query, top_k=10)[0]
+        assert loaded.compact() and loaded.tombstones == 0 and len(loaded) == 200
+
+
+class TestQuantization:
+    @pytest.mark.parametrize("kind, params", [("int8", {}), ("pq", {"subspaces": 4, "centroids": 16})])
+    def test_adc_scores_match_decoded_vectors(self, kind, params):
+        rng = np.random.default_rng(5)
+        vectors = rng.normal(size=(300, 16)).astype(np.float32)
+        quantizer = make_quantizer(kind, **params)
+        quantizer.train(vectors)
+        codes = quantizer.encode(vectors)
+        queries = rng.normal(size=(16, 3)).astype(np.float32)
+        assert np.allclose(quantizer.score(codes, queries), quantizer.decode(codes) @ queries, atol=1e-3)
+
+    def test_search_many_matches_search(self):
+        rng = np.random.default_rng(4)
+        vectors = rng.normal(size=(400, 32)).astype(np.float32)
+        index = QuantizedVectorIndex(make_quantizer("int8"), train_size=100, rerank=3,
+                                     exact_vectors=lambda rows: vectors[rows])
+        index.add_batch(vectors, ["a", "b"] * 200, ["k"] * 400)
+        queries = rng.normal(size=(5, 32))
+        for query, (rows, _) in zip(queries, index.search_many(queries, top_k=4, agent_name="a")):
+            assert list(rows) == list(index.search(query, top_k=4, agent_name="a")[0])
+
+    def test_rerank_recovers_exact_order(self):
+        rng = np.random.default_rng(6)
+        vectors = rng.normal(size=(500, 32)).astype(np.float32)
+        index = QuantizedVectorIndex(make_quantizer("pq", subspaces=4, centroids=16), train_size=200,
+                                     rerank=50, exact_vectors=lambda rows: vectors[rows])
+        index.add_batch(vectors, ["a"] * 500, ["k"] * 500)
+        assert index.memory_bytes()["vector_bytes"] == 500 * 4
+
+        exact = DenseVectorIndex()
+        exact.add_batch(vectors, ["a"] * 500, ["k"] * 500)
+        query = rng.normal(size=32)
+        assert list(index.search(query, 5)[0]) == list(exact.search(query, 5)[0])
+
+
+class TestMemoryLogStore:
+    def make_entries(self, count, start=0):
+        return [VectorMemoryEntry(id=f"e{i}", content=f"note {i}", embedding=[float(i)], metadata={},
+                                  timestamp=float(i), agent_name="a", entry_type="knowledge")
+                for i in range(start, start + count)]
+
+    def test_replay_after_compaction_and_torn_tail(self, tmp_path):
+        live = []
+        store = MemoryLogStore(str(tmp_path), snapshot_source=lambda: live,
+                               segment_max_bytes=256, compact_after_segments=2)
+        for entry in self.make_entries(20):
+            live.append(entry)
+            store.append_add([entry])
+        live[:] = [e for e in live if e.id != "e3"]
+        store.append_delete(["e3"])
+        store.close()
+        assert os.path.exists(store.snapshot_path)
+
+        # Simulate a crash in the middle of writing a frame
+        with open(store._list_segments()[-1][1], "ab") as f:
+            f.write(b"\x10\x00\x00\x00garbage")
+
+        reopened = MemoryLogStore(str(tmp_path), snapshot_source=lambda: [])
+        assert [e.id for e in reopened.load()] == [e.id for e in live]
+
+    def test_write_behind_coalesces_mutations(self, tmp_path):
+        entries = {}
+        store = MemoryLogStore(str(tmp_path), snapshot_source=lambda: list(entries.values()),
+                               write_behind=True, flush_interval=60, flush_max_records=1000)
+        for i in range(100):
+            entry = VectorMemoryEntry(f"id{i % 10}", f"v{i}", [0.0], {}, 0.0, "a", "k")
+            entries[entry.id] = entry
+            store.append_add([entry])
+        store.append_delete(["id0"])
+        assert store.write_count == 0 and store.pending == 10
+
+        store.flush()
+        assert store.write_count == 1
+        loaded = {e.id: e.content for e in MemoryLogStore(str(tmp_path), lambda: []).load()}
+        assert len(loaded) == 9 and loaded["id9"] == "v99"
+
+        store.flush_max_records = 5
+        store.append_add([VectorMemoryEntry(f"new{i}", "x", [0.0], {}, 0.0, "a", "k") for i in range(5)])
+        store.close()
+        assert store.write_count == 2 and store.pending == 0
+
+    def test_shared_stores_tail_each_others_writes(self, tmp_path):
+        stores = [MemoryLogStore(str(tmp_path), snapshot_source=lambda: [], shared=True,
+                                 segment_max_bytes=512, compact_after_segments=100)
+                  for _ in range(2)]
+        first, second = stores
+        for store in stores:
+            store.load()
+        first.append_add(self.make_entries(3))
+        assert first.refresh() == []
+        assert [record[1].id for record in second.refresh()] == ["e0", "e1", "e2"]
+
+        # A frame that is still being written is invisible until it completes
+        second.append_delete(["e1"])
+        frame = encode_frame(("add", self.make_entries(1, start=9)[0]))
+        with open(second._segment_path(second._tail_segment()), "ab") as f:
+            f.write(frame[:10])
+            f.flush()
+            assert first.refresh() == [("delete", ["e1"])]
+            f.write(frame[10:])
+        assert [record[1].id for record in first.refresh()] == ["e9"]
+        assert [record[1].id for record in second.refresh()] == ["e9"]
+
+        # The compactor was caught up and keeps tailing; the other store must reload
+        second.compact(wait=True)
+        assert first.refresh() is None
+        assert [e.id for e in first.load()] == ["e0", "e2", "e9"]
+        first.append_add(self.make_entries(20, start=3))
+        assert len(second.refresh()) == 20
+
+    def test_shared_write_behind_survives_foreign_compaction(self, tmp_path):
+        writer = MemoryLogStore(str(tmp_path), snapshot_source=lambda: [], shared=True,
+                                write_behind=True, flush_interval=0.05)
+        compactor = MemoryLogStore(str(tmp_path), snapshot_source=lambda: [], shared=True)
+        writer.load()
+        compactor.load()
+
+        writer.append_add(self.make_entries(3))
+        deadline = time.monotonic() + 5
+        while writer.write_count == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert writer.write_count == 1 and writer.pending == 0
+        assert [record[1].id for record in compactor.refresh()] == ["e0", "e1", "e2"]
+        assert writer.refresh() == []
+
+        writer.flush_interval = 60
+        writer.append_add(self.make_entries(1, start=3))
+        compactor.compact(wait=True)
+        assert writer.refresh() is None
+        assert [e.id for e in writer.load()] == ["e0", "e1", "e2", "e3"]
+        assert writer.pending == 0
+        assert [record[1].id for record in compactor.refresh()] == ["e3"]
+        writer.close()
+
+    def test_shared_appends_do_not_deadlock_with_compaction(self, tmp_path):
+        store = MemoryLogStore(str(tmp_path), snapshot_source=lambda: [], shared=True,
+                               segment_max_bytes=256, compact_after_segments=1)
+        store.load()
+
+        def append(start):
+            for entry in self.make_entries(50, start=start):
+                store.append_add([entry])
+
+        threads = [threading.Thread(target=append, args=(i * 100,), daemon=True) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=20)
+        assert not any(thread.is_alive() for thread in threads)
+        store.close()
+        assert len(MemoryLogStore(str(tmp_path), lambda: [], shared=True).load()) == 150
+
+    def test_shared_append_truncates_torn_tail(self, tmp_path):
+        crashed = MemoryLogStore(str(tmp_path), snapshot_source=lambda: [], shared=True)
+        crashed.load()
+        crashed.append_add(self.make_entries(2))
+        # The writer dies halfway through its next frame
+        frame = encode_frame(("add", self.make_entries(1, start=2)[0]))
+        with open(crashed._segment_path(crashed._tail_segment()), "ab") as f:
+            f.write(frame[:len(frame) // 2])
+
+        survivor = MemoryLogStore(str(tmp_path), snapshot_source=lambda: [], shared=True)
+        survivor.load()
+        survivor.append_add(self.make_entries(2, start=5))
+        assert [record[1].id for record in crashed.refresh()] == ["e5", "e6"]
+        reopened = MemoryLogStore(str(tmp_path), snapshot_source=lambda: [], shared=True)
+        assert [e.id for e in reopened.load()] == ["e0", "e1", "e5", "e6"]
+
+    def test_legacy_pickle_is_migrated(self, tmp_path):
+        memory_dir = tmp_path / "legacy"
+        memory_dir.mkdir()
+        with open(memory_dir / "vector_memory.pkl", "wb") as f:
+            pickle.dump(self.make_entries(3), f)
+
+        memory = VectorMemory(memory_dir=str(memory_dir))
+        assert [e.id for e in memory.entries] == ["e0", "e1", "e2"]
+        assert not memory._store.is_empty()
+
+
+class TestConversationStore:
+    def test_ring_buffer_and_lazy_reload(self, tmp_path):
+        store = ConversationStore(str(tmp_path), ConversationTurn, history_window=3)
+        for i in range(5):
+            store.append("chat/1", ConversationTurn("user", f"turn {i}", timestamp=100.0 + i))
+        assert [t.content for t in store.history("chat/1", last_n=2)] == ["turn 3", "turn 4"]
+        assert [t.content for t in store.history("chat/1", last_n=4)] == [f"turn {i}" for i in range(1, 5)]
+
+        reopened = ConversationStore(str(tmp_path), ConversationTurn, history_window=3)
+        assert "chat/1" in reopened and not reopened._recent
+        assert len(reopened.history("chat/1")) == 5
+        assert reopened.count("chat/1") == 5
+
+    def test_sessions_appended_by_another_process_are_visible(self, tmp_path):
+        writer = ConversationStore(str(tmp_path), ConversationTurn)
+        reader = ConversationStore(str(tmp_path), ConversationTurn)
+        writer.append("s1", ConversationTurn("user", "hello", 1.0))
+        assert [t.content for t in reader.history("s1")] == ["hello"]
+        writer.append("s1", ConversationTurn("assistant", "hi", 2.0))
+        assert [t.content for t in reader.history("s1", last_n=1)] == ["hi"]
+        assert reader.count("s1") == 2
+
+    def test_window_respects_token_budget_and_rolling_summary(self, tmp_path):
+        store = ConversationStore(str(tmp_path), ConversationTurn, history_window=2)
+        for i in range(10):
+            store.append("s1", ConversationTurn("user", "x" * 40, timestamp=100.0 + i))
+        summary, turns = store.window("s1", max_tokens=50)
+        assert summary is None and [t.timestamp for t in turns] == [107.0, 108.0, 109.0]
+        assert ConversationStore(str(tmp_path), ConversationTurn).history("s1")[0].tokens == 14
+
+        summary = store.summarize("s1", extractive_turn_summary, keep_tokens=30)
+        assert summary["through"] == 107.0
+        summary, turns = store.window("s1", max_tokens=1000)
+        assert summary["content"].count("\n") == 7
+        assert [t.timestamp for t in turns] == [108.0, 109.0]
+
+    def test_expiry_rewrites_only_stale_sessions(self, tmp_path):
+        store = ConversationStore(str(tmp_path), ConversationTurn)
+        store.append_many("old", [ConversationTurn("user", "stale", timestamp=1.0)])
+        store.append_many("mixed", [ConversationTurn("user", "stale", timestamp=1.0),
+                                    ConversationTurn("user", "fresh", timestamp=1e12)])
+        store.expire(cutoff_time=10.0, wait=True)
+
+        reopened = ConversationStore(str(tmp_path), ConversationTurn)
+        assert reopened.session_ids() == ["mixed"]
+        assert [t.content for t in reopened.history("mixed")] == ["fresh"]
+
+    def test_changes_skip_bad_lines_and_wait_for_partial_ones(self, tmp_path):
+        store = ConversationStore(str(tmp_path), ConversationTurn)
+        store.append("s1", ConversationTurn("user", "first", timestamp=1.0))
+        with open(store._path("s1"), "a", encoding="utf-8") as f:
+            f.write('{"role": "user", "content": "cut off\n{"role": "user", "content": "sec')
+        marks = {}
+        assert [[t.content for t in turns] for _, _, turns in store.changes(marks)] == [["first"]]
+
+        with open(store._path("s1"), "a", encoding="utf-8") as f:
+            f.write('ond", "timestamp": 2.0}\n')
+        assert [(reset, [t.content for t in turns]) for _, reset, turns in store.changes(marks)] == [
+            (False, ["second"])]
+        assert store.changes(marks) == []
+
+    def test_legacy_conversations_are_migrated(self, tmp_path, embed_calls):
+        directory = tmp_path / "memory"
+        directory.mkdir()
+        (directory / "conversations.json").write_text(
+            '{"s1": [{"role": "user", "content": "hi", "timestamp": 1.0, "agent_name": null}]}'
+        )
+        memory = VectorMemory(memory_dir=str(directory))
+        memory.add_conversation_turn("s1", "assistant", "hello")
+        reloaded = VectorMemory(memory_dir=str(directory))
+        assert [t.content for t in reloaded.get_conversation_history("s1")] == ["hi", "hello"]
+
+
+class TestEmbeddingBatcher:
+    def test_event_loops_in_different_threads_batch_independently(self):
+        batches = []
+
+        async def embed_batch(texts):
+            batches.append(list(texts))
+            return [[float(len(text))] for text in texts]
+
+        batcher = EmbeddingBatcher(embed_batch, window=0.2)
+        barrier = threading.Barrier(2)
+        results = {}
+
+        def worker(name, texts):
+            async def run():
+                barrier.wait()
+                return await asyncio.wait_for(asyncio.gather(*(batcher.submit(text) for text in texts)), 5)
+            results[name] = asyncio.run(run())
+
+        threads = [threading.Thread(target=worker, args=("a", ["x", "xx"])),
+                   threading.Thread(target=worker, args=("b", ["xxx"]))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        assert results == {"a": [[1.0], [2.0]], "b": [[3.0]]}
+        assert sorted(batches) == [["x", "xx"], ["xxx"]]
+
+
+class TestVectorMemory:
+    def test_search_returns_best_match(self, memory):
+        asyncio.run(memory.add_memory("python code review", "coder"))
+        asyncio.run(memory.add_memory("quarterly sales forecast", "analyst"))
+
+        results = asyncio.run(memory.search_memory("python code review", top_k=1))
+        assert results[0].content == "python code review"
+
+        results = asyncio.run(memory.search_memory("python code review", agent_name="analyst"))
+        assert [r.agent_name for r in results] == ["analyst"]
+
+    def test_search_returns_projected_records_without_side_effects(self, memory):
+        asyncio.run(memory.add_memory("rotate the api keys", "ops", metadata={"ticket": 7}))
+        result = asyncio.run(memory.search_memory("rotate keys"))[0]
+        assert isinstance(result, MemorySearchResult)
+        assert not hasattr(result, "embedding") and not hasattr(result, "__dict__")
+        assert result.to_dict()["metadata"] == {"ticket": 7}
+        assert memory.entries[0].relevance_score is None
+        with pytest.raises(TypeError):
+            result.metadata["ticket"] = 8
+
+        projected = asyncio.run(memory.search_memory_many(["rotate keys"], fields=("content",)))[0][0]
+        assert projected.to_dict() == {"id": result.id, "score": result.score, "content": "rotate the api keys"}
+        with pytest.raises(ValueError):
+            asyncio.run(memory.search_memory("rotate keys", fields=("embedding",)))
+
+    def test_export_import_roundtrip_in_batches(self, memory, tmp_path, embed_calls):
+        contents = [f"runbook {word} procedure" for word in ("alpha", "bravo", "charlie", "delta", "echo")]
+        asyncio.run(memory.add_memories_bulk(contents, "ops", metadata=[{"n": i} for i in range(5)]))
+        export_dir = str(tmp_path / "export")
+        assert memory.export_memory(export_dir) == 5
+        with np.load(os.path.join(export_dir, "columns.npz")) as columns:
+            assert columns["embeddings"].shape == (5, 8)
+
+        calls_before = len(embed_calls)
+        target = VectorMemory(memory_dir=str(tmp_path / "target"))
+        assert target.import_memory(export_dir, batch_size=2) == {"imported": 5, "skipped": 0}
+        assert target.import_memory(export_dir) == {"imported": 0, "skipped": 5}
+        assert len(embed_calls) == calls_before
+        assert [e.id for e in target.entries] == [e.id for e in memory.entries]
+        assert target.entries[3].metadata == {"n": 3}
+        np.testing.assert_array_equal(target.entries[4].embedding, memory.entries[4].embedding)
+
+        text = TextSimilarityMemory(memory_dir=str(tmp_path / "text"))
+        assert text.import_memory(export_dir)["imported"] == 5
+        assert asyncio.run(text.search_memory("charlie runbook", top_k=1))[0].content == contents[2]
+
+    def test_conversation_search_across_sessions(self, memory, embed_calls):
+        memory.add_conversation_turn("s1", "user", "how do I rotate api keys")
+        memory.add_conversation_turn("s1", "assistant", "open the security settings page")
+        memory.add_conversation_turn("s2", "user", "quarterly sales forecast please")
+        results = asyncio.run(memory.search_conversations("rotate api keys", top_k=1))
+        assert [(r.session_id, r.role, r.content) for r in results] == [("s1", "user", "how do I rotate api keys")]
+
+        embed_calls.clear()
+        memory.add_conversation_turn("s2", "assistant", "rotate api keys monthly")
+        results = asyncio.run(memory.search_conversations("rotate api keys", session_id="s2", role="assistant"))
+        assert [r.content for r in results] == ["rotate api keys monthly"]
+        assert embed_calls == [["rotate api keys monthly"]]
+
+        memory.conversations.expire(cutoff_time=time.time() + 1, wait=True)
+        assert asyncio.run(memory.search_conversations("rotate api keys")) == []
+
+    def test_reload_after_foreign_compaction_keeps_queued_writes(self, tmp_path, embed_calls):
+        worker_a, worker_b = [VectorMemory(memory_dir=str(tmp_path / "shared"), flush_interval=60)
+                              for _ in range(2)]
+        first_id = asyncio.run(worker_a.add_memory("on-call rotation is posted on mondays", "ops"))
+        worker_a.flush()
+        worker_b.refresh()
+        queued_id = asyncio.run(worker_a.add_memory("deploy runbook lives in the wiki", "ops"))
+        assert worker_a._store.pending == 1
+
+        # B compacts the log while A's second entry is still queued, so A must reload
+        worker_b.save_memory()
+        worker_a.refresh()
+        assert {e.id for e in worker_a.entries} == {first_id, queued_id}
+        worker_b.refresh()
+        assert {e.id for e in worker_b.entries} == {first_id, queued_id}
+
+    def test_conversation_index_retries_failed_turns_and_reuses_cached_vectors(self, tmp_path, embed_calls,
+                                                                              monkeypatch):
+        memory = VectorMemory(memory_dir=str(tmp_path / "memory"))
+        memory.add_conversation_turn("s1", "user", "how do I rotate api keys")
+        embed = VectorMemory._fetch_embeddings
+
+        async def failing_fetch(self, texts):
+            if "how do I rotate api keys" in texts:
+                raise RuntimeError("provider unavailable")
+            return await embed(self, texts)
+        monkeypatch.setattr(VectorMemory, "_fetch_embeddings", failing_fetch)
+        assert asyncio.run(memory.search_conversations("rotate api keys")) == []
+        assert len(memory._turn_refs) == 0 and "s1" not in memory._turn_marks
+
+        monkeypatch.setattr(VectorMemory, "_fetch_embeddings", embed)
+        results = asyncio.run(memory.search_conversations("rotate api keys"))
+        assert [r.content for r in results] == ["how do I rotate api keys"]
+        memory.flush()
+
+        embed_calls.clear()
+        restarted = VectorMemory(memory_dir=str(tmp_path / "memory"))
+        results = asyncio.run(restarted.search_conversations("rotate api keys"))
+        assert [r.content for r in results] == ["how do I rotate api keys"]
+        assert embed_calls == []
+
+    def test_bulk_add_batches_embeddings(self, tmp_path, embed_calls):
+        memory = VectorMemory(memory_dir=str(tmp_path / "bulk"), embedding_batch_size=4)
+        contents = [f"document number {i}" for i in range(10)]
+        ids = asyncio.run(memory.add_memories_bulk(contents, "loader", metadata=[{"n": i} for i in range(10)]))
+
+        assert [len(call) for call in embed_calls] == [4, 4, 2]
+        assert len(set(ids)) == 10
+        assert [e.metadata["n"] for e in memory.entries] == list(range(10))
+        memory.flush()
+        reloaded = VectorMemory(memory_dir=str(tmp_path / "bulk"))
+        assert [e.content for e in reloaded.entries] == contents
+
+    def test_concurrent_adds_share_one_embedding_call(self, memory, embed_calls):
+        async def add_many():
+            return await asyncio.gather(*(memory.add_memory(f"note {i}", "coder") for i in range(5)))
+
+        asyncio.run(add_many())
+        assert [len(call) for call in embed_calls] == [5]
+        assert len(memory.entries) == 5
+
+    def test_recall_many_embeds_once_and_keeps_scores_per_query(self, memory, embed_calls):
+        asyncio.run(memory.add_memories_bulk(["alpha beta", "gamma delta", "alpha gamma"], "coder"))
+        embed_calls.clear()
+        queries = ["beta alpha", "delta gamma"]
+        results = asyncio.run(memory.search_memory_many(queries, top_k=2))
+
+        assert embed_calls == [queries]
+        for query, matches in zip(queries, results):
+            single = asyncio.run(memory.search_memory(query, top_k=2))
+            assert [m.id for m in matches] == [m.id for m in single]
+            assert [m.relevance_score for m in matches] == pytest.approx([m.relevance_score for m in single])
+
+    def test_duplicates_merge_into_existing_entry(self, memory, embed_calls):
+        first = asyncio.run(memory.add_memory("Build finished: 12 tests passed", "coder"))
+        ids = asyncio.run(memory.add_memories_bulk(
+            ["build finished 12 tests passed", "Lint clean", "Lint clean."], "coder"))
+        other_agent = asyncio.run(memory.add_memory("Build finished: 12 tests passed", "reviewer"))
+
+        assert ids[0] == first and ids[1] == ids[2] and other_agent != first
+        assert len(memory.entries) == 3
+        assert [e.hit_count for e in memory.entries] == [2, 2, 1]
+        assert embed_calls == [["Build finished: 12 tests passed"], ["Lint clean"]]
+        assert memory.get_agent_memories("coder")[0].id == ids[1]
+
+        memory.flush()
+        reloaded = VectorMemory(memory_dir=memory.memory_dir)
+        assert [e.hit_count for e in reloaded.entries] == [2, 2, 1]
+        asyncio.run(reloaded.add_memory("Lint clean", "coder"))
+        assert len(reloaded.entries) == 3
+
+    def test_near_duplicates_that_change_a_fact_are_kept_apart(self, memory, embed_calls):
+        facts = " ".join(f"Service {i} runs in region eu-west with {i + 2} replicas." for i in range(12))
+        original = facts + " The migration budget is 5 million."
+        edited = facts + " The migration budget is 7 million."
+        assert bin(SimHashIndex.fingerprint(original) ^ SimHashIndex.fingerprint(edited)).count("1") <= 3
+        first = asyncio.run(memory.add_memory(original, "planner"))
+        second = asyncio.run(memory.add_memory(edited, "planner"))
+        assert second != first
+        assert [e.content for e in memory.entries] == [original, edited]
+
+        # Stop-word rewordings still merge, and the stored wording is kept
+        reworded = original.replace("The migration budget is", "Migration budget")
+        assert asyncio.run(memory.add_memories_bulk([reworded, edited.upper()], "planner")) == [first, second]
+        assert [e.content for e in memory.entries] == [original, edited]
+        assert [e.hit_count for e in memory.entries] == [2, 2]
+        assert embed_calls == [[original], [edited]]
+
+    def test_embedding_cache_avoids_repeat_calls(self, tmp_path, embed_calls):
+        memory = VectorMemory(memory_dir=str(tmp_path / "cached"), embedding_cache_disk_mb=1)
+        asyncio.run(memory.add_memory("repeated snippet", "coder"))
+        asyncio.run(memory.search_memory("repeated snippet"))
+        asyncio.run(memory.search_memory("repeated snippet"))
+        assert embed_calls == [["repeated snippet"]]
+        assert memory.get_memory_stats()["embedding_cache"]["hits"] == 2
+
+        # A fresh process only has the disk tier to go on
+        memory._embedding_cache.flush()
+        reopened = VectorMemory(memory_dir=str(tmp_path / "cached"), embedding_cache_disk_mb=1)
+        asyncio.run(reopened.search_memory("repeated snippet"))
+        assert len(embed_calls) == 1
+        assert reopened.get_memory_stats()["embedding_cache"]["disk_hits"] == 1
+
+    def test_snapshot_embeddings_are_memory_mapped(self, memory, tmp_path):
+        asyncio.run(memory.add_memories_bulk([f"mapped note {i}" for i in range(6)], "coder"))
+        memory.save_memory()
+        asyncio.run(memory.add_memory("unmapped note", "coder"))
+        memory.flush()
+
+        reloaded = VectorMemory(memory_dir=str(tmp_path / "memory"))
+        assert reloaded._index.base_size == 6
+        assert isinstance(reloaded.entries[0].embedding, np.memmap)
+        assert not isinstance(reloaded.entries[6].embedding, np.memmap)
+        assert reloaded.entries[6].embedding.dtype == np.float32
+        results = asyncio.run(reloaded.search_memory("unmapped note", top_k=1))
+        assert results[0].content == "unmapped note"
+        results = asyncio.run(reloaded.search_memory("mapped note 3", top_k=1))
+        assert results[0].content == "mapped note 3"
+
+        # Removing a mapped row moves the survivors into RAM
+        reloaded.entries[0].timestamp = 0
+        reloaded.cleanup_old_memories(max_age_days=1)
+        assert reloaded._index.base_size == 0
+        results = asyncio.run(reloaded.search_memory("mapped note 3", top_k=1))
+        assert results[0].content == "mapped note 3"
+
+    def test_ann_search_and_reconcile_on_reload(self, tmp_path, embed_calls):
+        memory_dir = str(tmp_path / "ann")
+        memory = VectorMemory(memory_dir=memory_dir, use_ann=True, ann_min_entries=0)
+        asyncio.run(memory.add_memories_bulk(["alpha beta", "gamma delta", "epsilon zeta"], "coder"))
+        asyncio.run(memory.add_memory("alpha beta gamma", "reviewer"))
+        memory.save_memory()
+        asyncio.run(memory.add_memory("late entry", "coder"))
+        memory.flush()
+
+        reloaded = VectorMemory(memory_dir=memory_dir, use_ann=True, ann_min_entries=0)
+        assert len(reloaded._ann) == 5
+        results = asyncio.run(reloaded.search_memory("late entry", top_k=1))
+        assert results[0].content == "late entry"
+        results = asyncio.run(reloaded.search_memory("alpha beta", agent_name="reviewer"))
+        assert [r.agent_name for r in results] == ["reviewer"]
+        assert reloaded.get_ann_recall_report(top_k=2)["recall@2"] > 0
+
+    def test_quantization_is_fixed_per_directory(self, tmp_path, embed_calls):
+        memory_dir = str(tmp_path / "quantized")
+        memory = VectorMemory(memory_dir=memory_dir, quantization="int8",
+                              quantization_params={"train_size": 4})
+        asyncio.run(memory.add_memories_bulk([f"topic {i} notes" for i in range(8)], "coder"))
+        report = memory.get_quantization_report(top_k=1)
+        assert report["recall@1"] == 1.0
+        assert all(e.embedding.dtype == np.float32 for e in memory.entries)
+        assert report["entry_vector_mb"] * 1024 * 1024 == 8 * 8 * 4
+        memory.save_memory()
+
+        reloaded = VectorMemory(memory_dir=memory_dir)
+        assert reloaded.get_quantization_report(top_k=1)["entry_vector_mb"] == 0
+        assert reloaded.quantization == "int8"
+        assert isinstance(reloaded._index, QuantizedVectorIndex)
+        results = asyncio.run(reloaded.search_memory("topic 3 notes", top_k=1))
+        assert results[0].content == "topic 3 notes"
+
+    def test_index_survives_reload_and_cleanup(self, memory, tmp_path):
+        asyncio.run(memory.add_memory("old note", "coder"))
+        asyncio.run(memory.add_memory("fresh note", "coder"))
+        memory.entries[0].timestamp = 0
+        memory.cleanup_old_memories(max_age_days=1)
+        memory.flush()
+
+        reloaded = VectorMemory(memory_dir=str(tmp_path / "memory"))
+        results = asyncio.run(reloaded.search_memory("old note"))
+        assert [r.content for r in results] == ["fresh note"]
+
+    def test_consolidation_archives_clusters_into_summaries(self, memory, tmp_path):
+        topics = ["deploy pipeline failed", "billing invoice overdue"]
+        words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot"]
+        contents = [f"{topics[i % 2]} for {words[i // 2]} cluster" for i in range(12)]
+        asyncio.run(memory.add_memories_bulk(contents, "ops", entry_type="task_result"))
+        asyncio.run(memory.add_memory("deploy pipeline runbook", "ops"))
+        for row, entry in enumerate(memory.entries[:12]):
+            entry.timestamp = 100.0 + row
+            memory._index.partitions.update_row(row, entry.timestamp)
+
+        stats = memory.consolidate_memories(max_age_days=1, cluster_size=6)
+        summaries = [e for e in memory.entries if e.metadata.get("consolidated")]
+        assert stats["clusters"] == len(summaries) >= 1
+        assert stats["archived"] == sum(s.metadata["source_count"] for s in summaries)
+        assert len(memory.entries) == 13 - stats["archived"] + len(summaries)
+        assert memory.get_agent_memories("ops", "knowledge")[0].content == "deploy pipeline runbook"
+        for summary in summaries:
+            assert summary.entry_type == "task_result"
+            assert summary.timestamp < 200
+            archived = memory.get_archived_memories(summary.id)
+            assert [e.id for e in archived] == summary.metadata["source_ids"]
+        memory.flush()
+
+        reloaded = VectorMemory(memory_dir=str(tmp_path / "memory"))
+        assert sorted(e.id for e in reloaded.entries) == sorted(e.id for e in memory.entries)
+        results = asyncio.run(reloaded.search_memory("billing invoice overdue", entry_type="task_result", top_k=1))
+        assert results[0].metadata["consolidated"]
+
+
+class TestTextSimilarityMemory:
+    DOCS = [
+        "The deployment pipeline failed during the database migration step",
+        "Customer churn analysis shows retention improving in the enterprise segment",
+        "Refactor the database layer to use connection pooling",
+        "Quarterly revenue forecast for the enterprise segment",
+        "Pipeline latency regression traced to a slow migration",
+    ]
+
+    @pytest.fixture
+    def text_memory(self, tmp_path):
+        memory = TextSimilarityMemory(memory_dir=str(tmp_path / "text"))
+        for i, doc in enumerate(self.DOCS):
+            asyncio.run(memory.add_memory(doc, "ops" if i % 2 else "dev"))
+        return memory
+
+    def bruteforce(self, memory, query, top_k):
+        keywords = memory._extract_keywords(query)
+        scored = [
+            (0.7 * memory._calculate_tfidf_similarity(query, e.content)
+             + 0.3 * memory._calculate_similarity(keywords, e.keywords), e.content)
+            for e in memory.entries
+        ]
+        return sorted(scored, key=lambda x: x[0], reverse=True)[:top_k]
+
+    @pytest.mark.parametrize("query", ["database migration", "enterprise segment revenue", "nothing shared"])
+    def test_index_matches_bruteforce_blend(self, text_memory, query):
+        results = asyncio.run(text_memory.search_memory(query, top_k=4))
+        expected = self.bruteforce(text_memory, query, 4)
+        assert [r.content for r in results] == [content for _, content in expected]
+        assert [r.relevance_score for r in results] == pytest.approx([score for score, _ in expected])
+
+    def test_cleanup_removes_postings(self, text_memory):
+        text_memory.entries[0].timestamp = 0
+        text_memory.cleanup_old_memories(max_age_days=1)
+        results = asyncio.run(text_memory.search_memory("deployment", top_k=1))
+        assert results[0].relevance_score == 0.0
+        assert "deployment" not in text_memory._index._postings
+
+    def test_filtered_search_and_agent_memories(self, text_memory):
+        results = asyncio.run(text_memory.search_memory("connection pooling", agent_name="dev", top_k=3))
+        assert [r.content for r in results] == [self.DOCS[2], self.DOCS[0], self.DOCS[4]]
+        assert [r.relevance_score for r in results][1:] == [0.0, 0.0]
+
+        latest = text_memory.get_agent_memories("dev", limit=2)
+        assert [m.content for m in latest] == [self.DOCS[4], self.DOCS[2]]
+
+    def test_duplicates_merge_into_existing_entry(self, text_memory):
+        entry_id = asyncio.run(text_memory.add_memory(self.DOCS[0].lower(), "dev"))
+        assert entry_id == text_memory.entries[0].id
+        assert len(text_memory.entries) == len(self.DOCS)
+        assert text_memory.entries[0].hit_count == 2
+        assert text_memory.get_agent_memories("dev")[0].id == entry_id
+
+    def test_near_duplicates_that_change_a_fact_are_kept_apart(self, tmp_path):
+        memory = TextSimilarityMemory(memory_dir=str(tmp_path / "edits"))
+        facts = " ".join(f"Service {i} runs in region eu-west with {i + 2} replicas." for i in range(12))
+        first = asyncio.run(memory.add_memory(facts + " The owner is Dana.", "planner"))
+        second = asyncio.run(memory.add_memory(facts + " The owner is Priya.", "planner"))
+        assert second != first and [e.hit_count for e in memory.entries] == [1, 1]
+        assert asyncio.run(memory.search_memory("owner Dana", top_k=1))[0].id == first
+        assert asyncio.run(memory.add_memory(facts + " Owner is Dana", "planner")) == first
+        assert memory.entries[0].content.endswith("The owner is Dana.") and memory.entries[0].hit_count == 2
+
+    def test_recall_many_matches_single_queries(self, text_memory):
+        queries = ["database migration", "enterprise segment", "nothing shared"]
+        for agent_name in (None, "ops"):
+            batched = asyncio.run(text_memory.search_memory_many(queries, agent_name=agent_name, top_k=3))
+            for query, matches in zip(queries, batched):
+                single = asyncio.run(text_memory.search_memory(query, agent_name=agent_name, top_k=3))
+                assert [m.id for m in matches] == [m.id for m in single]
+                assert [m.relevance_score for m in matches] == [m.relevance_score for m in single]
+
+    def test_scoring_prefers_important_entries(self, text_memory):
+        asyncio.run(text_memory.add_memory("rollback notes for the migration", "dev", metadata={"importance": 3}))
+        plain = asyncio.run(text_memory.search_memory("database migration", top_k=1))
+        scored = asyncio.run(text_memory.search_memory(
+            "database migration", top_k=1, scoring=ScoringOptions(importance_weight=1.0)))
+        assert plain[0].content != "rollback notes for the migration"
+        assert scored[0].content == "rollback notes for the migration"
+
+    def test_consolidation_groups_by_keyword(self, text_memory):
+        for i in range(4):
+            asyncio.run(text_memory.add_memory(f"invoice {i} reconciled for billing account", "ops",
+                                               entry_type="task_result"))
+        for row, entry in enumerate(text_memory.entries):
+            text_memory._partitions.update_row(row, 0.0)
+
+        stats = text_memory.consolidate_memories(max_age_days=1)
+        assert stats == {"clusters": 1, "archived": 4, "entries": len(self.DOCS) + 1}
+        summary = text_memory.entries[-1]
+        assert "billing" in summary.keywords
+        assert len(text_memory.get_archived_memories(summary.id)) == 4
+        results = asyncio.run(text_memory.search_memory("billing invoice", top_k=1))
+        assert results[0].id == summary.id
+
+    def test_conversation_search_filters_by_session_and_role(self, text_memory, tmp_path):
+        text_memory.add_conversation_turn("s1", "user", "The database migration failed again")
+        text_memory.add_conversation_turn("s2", "assistant", "Retry the database migration with pooling")
+        other = TextSimilarityMemory(memory_dir=str(tmp_path / "text"))
+        other.add_conversation_turn("s3", "user", "Enterprise revenue forecast")
+
+        results = asyncio.run(text_memory.search_conversations("database migration"))
+        assert {r.session_id for r in results} == {"s1", "s2"}
+        results = asyncio.run(text_memory.search_conversations("database migration", role="assistant"))
+        assert [r.session_id for r in results] == ["s2"]
+        results = asyncio.run(text_memory.search_conversations("revenue forecast", session_id="s3"))
+        assert [r.content for r in results] == ["Enterprise revenue forecast"]
+
+    def test_workers_sharing_a_directory_see_each_others_memories(self, text_memory, tmp_path):
+        other = TextSimilarityMemory(memory_dir=str(tmp_path / "text"))
+        assert other.get_memory_stats()["total_entries"] == 0
+        text_memory.flush()
+        assert other.get_memory_stats()["total_entries"] == len(self.DOCS)
+
+        asyncio.run(other.add_memory("kubernetes autoscaling thresholds tuned", "ops"))
+        other.flush()
+        results = asyncio.run(text_memory.search_memory("kubernetes autoscaling", top_k=1))
+        assert results[0].content == "kubernetes autoscaling thresholds tuned"
+
+        text_memory.cleanup_old_memories(max_age_days=0)
+        text_memory.flush()
+        assert other.get_memory_stats()["total_entries"] == 0
+
+
+def test_importing_memory_modules_opens_no_store(tmp_path):
+    script = ("import vector_memory, vector_memory_text, os; print(os.listdir('.'));"
+              "vector_memory_text.add_to_conversation('s1', 'user', 'hello'); print(os.listdir('.'))")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-2:] == ["[]", "['agent_memory']"]
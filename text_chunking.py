@@ -0,0 +1,101 @@
+"""
+Streaming Text Chunking
+Splits documents into overlapping, roughly token-sized passages for the RAG
+knowledge base. Input is read incrementally from a text stream, so memory use
+is bounded by the chunk size and read size rather than the document size.
+"""
+
+import io
+import logging
+from dataclasses import dataclass
+from typing import Iterator, TextIO
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rough characters per token for English text with BPE vocabularies
+CHARS_PER_TOKEN = 4
+READ_SIZE = 64 * 1024
+
+# Break markers in order of preference: paragraph, sentence, line
+PARAGRAPH_BREAKS = ("\n\n",)
+SENTENCE_BREAKS = (". ", "! ", "? ", ".\n", "!\n", "?\n", "\n")
+
+
+@dataclass
+class TextChunk:
+    """One passage of a document with its character offsets in the source."""
+    text: str
+    index: int
+    start: int
+    end: int
+
+
+def _break_point(window: str, min_cut: int) -> int:
+    """Best place to end a chunk within ``window``, never before ``min_cut``."""
+    for markers in (PARAGRAPH_BREAKS, SENTENCE_BREAKS):
+        cut = -1
+        for marker in markers:
+            found = window.rfind(marker, min_cut)
+            if found >= 0:
+                cut = max(cut, found + len(marker))
+        if cut > 0:
+            return cut
+    space = max(window.rfind(" ", min_cut), window.rfind("\t", min_cut))
+    return space + 1 if space >= 0 else len(window)
+
+
+def chunk_stream(stream: TextIO, chunk_size: int = 512, overlap: int = 64,
+                 read_size: int = READ_SIZE) -> Iterator[TextChunk]:
+    """Yield sentence-aware chunks of about ``chunk_size`` tokens from ``stream``.
+
+    Chunks end at the last paragraph, sentence or word boundary in their
+    second half and the next chunk repeats about ``overlap`` tokens of the
+    previous one, starting on a word boundary.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if not 0 <= overlap < chunk_size // 2:
+        raise ValueError("overlap must be non-negative and less than half of chunk_size")
+    max_chars = chunk_size * CHARS_PER_TOKEN
+    overlap_chars = overlap * CHARS_PER_TOKEN
+    min_cut = max_chars // 2
+
+    buffer = ""
+    base = 0  # source offset of buffer[0]
+    index = 0
+
+    def emit(start: int, stop: int):
+        text = buffer[start:stop]
+        stripped = text.strip()
+        if not stripped:
+            return None
+        lead = len(text) - len(text.lstrip())
+        offset = base + start + lead
+        return TextChunk(stripped, index, offset, offset + len(stripped))
+
+    for piece in iter(lambda: stream.read(read_size), ""):
+        buffer += piece
+        pos = 0
+        while len(buffer) - pos > max_chars:
+            window = buffer[pos:pos + max_chars]
+            cut = _break_point(window, min_cut)
+            chunk = emit(pos, pos + cut)
+            if chunk is not None:
+                yield chunk
+                index += 1
+            # Step back by the overlap, then forward to the next word start
+            restart = cut - overlap_chars
+            space = window.find(" ", restart, cut) if overlap_chars else -1
+            pos += space + 1 if space >= 0 else restart
+        buffer = buffer[pos:]
+        base += pos
+
+    chunk = emit(0, len(buffer))
+    if chunk is not None:
+        yield chunk
+
+
+def chunk_text(text: str, chunk_size: int = 512, overlap: int = 64) -> Iterator[TextChunk]:
+    """Chunk an in-memory string; see :func:`chunk_stream`."""
+    return chunk_stream(io.StringIO(text), chunk_size, overlap)
@@ -3,47 +3,155 @@ Document Upload Utility - Easy way to add your documents to the knowledge base
 """
 
 import os
+import sys
 import glob
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
-from kb_manager import add_document_from_file, show_knowledge_base_status, reset_knowledge_base
+from kb_manager import (add_document_from_file, add_documents_from_files, document_source, file_metadata,
+                        show_ingestion_stats, show_knowledge_base_status, reset_knowledge_base)
+from ingestion_manifest import IngestionManifest
+from rag_system import rag_system
+from text_chunking import chunk_stream
 
-def upload_folder(folder_path: str, file_patterns: list = None):
-    """Upload all files from a folder matching patterns"""
-    if file_patterns is None:
-        file_patterns = ["*.txt", "*.md", "*.py", "*.js", "*.html", "*.css", "*.json", "*.yaml", "*.yml"]
+DEFAULT_PATTERNS = ["*.txt", "*.md", "*.py", "*.js", "*.html", "*.css", "*.json", "*.yaml", "*.yml"]
+
+def find_files(folder_path: str, file_patterns: list = None) -> list:
+    """Files in a folder matching any of the glob patterns, each listed once"""
+    folder = Path(folder_path)
+    files = []
+    for pattern in file_patterns or DEFAULT_PATTERNS:
+        files.extend(path for path in glob.glob(str(folder / pattern), recursive=True) if os.path.isfile(path))
+    return list(dict.fromkeys(files))
+
+def upload_folder(folder_path: str, file_patterns: list = None, workers: int = 1, full: bool = False):
+    """Sync all files from a folder matching patterns into the knowledge base
     
+    The ingestion manifest (kept next to the ChromaDB data) lets re-runs skip
+    unchanged files; chunks of changed and deleted files are removed before
+    the changed files are re-ingested. Files new to the manifest also lose
+    rows an older version stored under their file name without an absolute
+    ``path``, so the first sync does not duplicate them. ``full`` re-ingests
+    every file. With ``workers`` > 1 files are read and chunked in a process
+    pool (see :func:`upload_files_parallel`).
+    """
     folder = Path(folder_path)
     if not folder.exists():
         print(f"❌ Folder not found: {folder_path}")
         return False
     
     print(f"📁 Uploading from: {folder_path}")
-    uploaded = 0
+    root = os.path.abspath(folder_path)
+    manifest = IngestionManifest(os.path.join(rag_system.persist_directory, IngestionManifest.FILE_NAME))
+    plan = manifest.plan(find_files(folder_path, file_patterns), root, force=full)
+    print(f"   {len(plan.added)} new, {len(plan.changed)} changed, {len(plan.removed)} deleted, "
+          f"{len(plan.unchanged)} unchanged")
+    
+    # New files are cleared too, in case an interrupted sync added them without recording them
+    outdated = plan.to_ingest + plan.removed
+    if outdated and not rag_system.remove_documents(outdated):
+        print("❌ Could not remove outdated chunks; sync aborted")
+        return False
+    if plan.added and not rag_system.remove_legacy_documents(plan.added):
+        print("❌ Could not remove chunks stored by an older version; sync aborted")
+        return False
+    manifest.forget(plan.removed)
     
-    for pattern in file_patterns:
-        files = glob.glob(str(folder / pattern), recursive=True)
-        for file_path in files:
-            if os.path.isfile(file_path):
-                if add_document_from_file(file_path):
-                    uploaded += 1
+    uploaded = 0
+    if plan.to_ingest:
+        if workers > 1:
+            stats = upload_files_parallel(plan.to_ingest, workers, root=root, replace_sources=False)
+        else:
+            # All files go through one batched ingestion instead of one write per file
+            stats = add_documents_from_files(plan.to_ingest, root=root, replace_sources=False)
+        # Only files confirmed written are recorded; the rest are retried on the next sync
+        written = set(stats["written_sources"])
+        for path in plan.to_ingest:
+            if document_source(path, root) in written:
+                manifest.record(path, plan.pending[path])
+                uploaded += 1
+    manifest.save()
     
     print(f"✅ Uploaded {uploaded} documents")
-    return uploaded > 0
+    return uploaded == len(plan.to_ingest)
+
+def _read_and_chunk(file_path: str, chunk_size: int, chunk_overlap: int, document_type: str, root: str = None):
+    """Pool worker: read, decode and chunk one file"""
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        chunks = list(chunk_stream(f, chunk_size, chunk_overlap))
+    return document_source(file_path, root), file_metadata(file_path, document_type), chunks
+
+def _chunked_in_pool(file_paths: list, workers: int, queue_size: int, document_type: str, root: str):
+    """Yield ``(source, metadata, chunks)`` as pool workers finish files.
+    
+    At most ``queue_size`` files are submitted but not yet consumed, so
+    workers pause when the writer falls behind instead of piling up chunks.
+    Files that fail to read are skipped.
+    """
+    total = len(file_paths)
+    done = chunks = 0
+    remaining = iter(file_paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        while True:
+            for file_path in remaining:
+                future = pool.submit(_read_and_chunk, file_path, rag_system.chunk_size,
+                                     rag_system.chunk_overlap, document_type, root)
+                pending[future] = file_path
+                if len(pending) >= queue_size:
+                    break
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                file_path = pending.pop(future)
+                done += 1
+                try:
+                    source, metadata, file_chunks = future.result()
+                except Exception as e:
+                    print(f"\n❌ Error reading {file_path}: {e}")
+                    continue
+                chunks += len(file_chunks)
+                print(f"\r   📄 {done}/{total} files, {chunks} chunks", end="", flush=True)
+                yield source, metadata, file_chunks
+    print()
+
+def upload_files_parallel(file_paths: list, workers: int = None, queue_size: int = None,
+                          document_type: str = "user_document", root: str = None,
+                          replace_sources: bool = True) -> dict:
+    """Chunk files in a process pool and write them through the single batched RAG writer
+    
+    ``queue_size`` bounds the files in flight (default twice the workers).
+    Unreadable files, and every file not yet written when the pool breaks,
+    count as failed. ``replace_sources`` is as for
+    :func:`kb_manager.add_documents_from_files`.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or 2 * workers
+    print(f"⚙️  Ingesting {len(file_paths)} files with {workers} workers")
+    stats = rag_system.add_chunked_documents(
+        _chunked_in_pool(file_paths, workers, queue_size, document_type, root),
+        expected_sources=[document_source(path, root) for path in file_paths],
+        replace_sources=replace_sources
+    )
+    show_ingestion_stats(stats)
+    return stats
 
 def upload_files(file_paths: list):
     """Upload specific files to knowledge base"""
-    uploaded = 0
+    existing = []
     for file_path in file_paths:
         if os.path.isfile(file_path):
-            if add_document_from_file(file_path):
-                uploaded += 1
+            existing.append(file_path)
         else:
             print(f"❌ File not found: {file_path}")
     
+    stats = add_documents_from_files(existing)
+    uploaded = stats["documents"] - stats["failed"]
     print(f"✅ Uploaded {uploaded} documents")
     return uploaded > 0
 
-def interactive_upload():
+def interactive_upload(workers: int = 1):
     """Interactive document upload"""
     print("🚀 Interactive Document Upload")
     print("=" * 40)
@@ -66,7 +174,7 @@ def interactive_upload():
         elif choice == "2":
             folder_path = input("Enter folder path: ").strip()
             if folder_path:
-                upload_folder(folder_path)
+                upload_folder(folder_path, workers=workers)
         
         elif choice == "3":
             confirm = input("⚠️  This will delete ALL documents. Continue? (yes/no): ").strip().lower()
@@ -83,5 +191,22 @@ def interactive_upload():
         else:
             print("❌ Invalid choice")
 
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Add documents to the knowledge base")
+    parser.add_argument("folder", nargs="?", help="folder to upload; interactive mode when omitted")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="processes reading and chunking files (0 = one per CPU)")
+    parser.add_argument("-p", "--pattern", action="append", dest="patterns",
+                        help="glob pattern to include, repeatable (default: common text formats)")
+    parser.add_argument("--full", action="store_true",
+                        help="re-ingest every file instead of only new and changed ones")
+    args = parser.parse_args(argv)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    
+    if args.folder:
+        return 0 if upload_folder(args.folder, args.patterns, workers=workers, full=args.full) else 1
+    interactive_upload(workers)
+    return 0
+
 if __name__ == "__main__":
-    interactive_upload()
+    sys.exit(main())
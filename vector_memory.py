@@ -6,31 +6,62 @@ Note: Using basic text similarity instead of embeddings for Ollama compatibility
 
 import os
 import json
+import asyncio
 import time
 import pickle
 import hashlib
 import logging
-from typing import Dict, Any, List, Optional, Union, Tuple
-from dataclasses import dataclass, asdict
-from datetime import datetime, timedelta
-import re
-from collections import Counter
-import math
+import threading
+import weakref
+from typing import Dict, Any, List, Optional, Sequence, Set, Union, Tuple
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+from hnsw_index import HNSWIndex
+from memory_index import DenseVectorIndex, ScoringOptions, SimHashIndex, MemorySearchResult, IMPORTANCE_KEY, metadata_importance
+from memory_quantization import (QuantizedVectorIndex, make_quantizer, save_quantizer,
+                                 load_quantizer_state)
+from memory_store import LazyInstance, MemoryLogStore
+from conversation_store import ConversationSearchResult, ConversationStore, extractive_turn_summary
+from memory_transfer import export_entries, iter_import
+from memory_consolidation import (DEFAULT_CONSOLIDATE_TYPES, MemoryArchive, extractive_summary,
+                                  minibatch_kmeans, top_terms)
+
+try:
+    from openai import OpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Initialize OpenAI client if available
+client = None
+if OPENAI_AVAILABLE:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key:
+        client = OpenAI(api_key=api_key)
+    else:
+        logger.warning("OPENAI_API_KEY not found in environment variables")
+
+EMBEDDING_DIMENSION = 1536  # Ada-002 embedding dimension
+
 @dataclass
 class MemoryEntry:
     """A single memory entry with vector embedding."""
     id: str
     content: str
-    embedding: List[float]
+    embedding: Union[List[float], np.ndarray]  # read-only row view when loaded from a snapshot
     metadata: Dict[str, Any]
     timestamp: float
     agent_name: str
     entry_type: str  # conversation, knowledge, task_result, etc.
     relevance_score: Optional[float] = None
+    hit_count: int = 1  # times this (near-)duplicate content was remembered
+    simhash: Optional[int] = None
 
 @dataclass
 class ConversationTurn:
@@ -39,43 +70,240 @@ class ConversationTurn:
     content: str
     timestamp: float
     agent_name: Optional[str] = None
+    tokens: Optional[int] = None  # cached token estimate, filled in when stored
+
+@dataclass
+class _PendingEmbeddings:
+    """Requests one event loop has queued for the next batched embedding call."""
+    requests: List[Tuple[str, asyncio.Future]] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding requests into one provider call.
+    
+    Requests arriving within ``window`` seconds of each other (or until
+    ``max_batch_size`` is reached) share a single batched embedding call.
+    Each event loop batches its own requests, so several threads running
+    their own loops can share one batcher.
+    """
+    
+    def __init__(self, embed_batch, window: float = 0.005, max_batch_size: int = 256):
+        self.embed_batch = embed_batch
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        # Only touched from the owning loop's thread once created; dropped with the loop
+        self._pending: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _PendingEmbeddings]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._tasks = set()
+    
+    async def submit(self, text: str) -> List[float]:
+        """Queue a text and wait for its embedding."""
+        if self.window <= 0:
+            return (await self.embed_batch([text]))[0]
+        
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pending = self._pending.get(loop)
+            if pending is None:
+                pending = self._pending[loop] = _PendingEmbeddings()
+        
+        future = loop.create_future()
+        pending.requests.append((text, future))
+        if len(pending.requests) >= self.max_batch_size:
+            self._flush(loop, pending)
+        elif pending.timer is None:
+            pending.timer = loop.call_later(self.window, self._flush, loop, pending)
+        return await future
+    
+    def _flush(self, loop: asyncio.AbstractEventLoop, pending: _PendingEmbeddings):
+        if pending.timer is not None:
+            pending.timer.cancel()
+            pending.timer = None
+        batch, pending.requests = pending.requests, []
+        if batch:
+            task = loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            embeddings = await self.embed_batch([text for text, _ in batch])
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
 
 class VectorMemory:
     """Vector-based memory system for agents."""
     
-    def __init__(self, memory_dir: str = "agent_memory", embedding_model: str = "text-embedding-ada-002"):
+    def __init__(self, memory_dir: str = "agent_memory", embedding_model: str = "text-embedding-ada-002",
+                 embedding_batch_size: int = 512, embedding_concurrency: int = 4,
+                 batch_window: float = 0.005, embedding_cache_items: int = 10000,
+                 embedding_cache_disk_mb: int = 256, use_ann: bool = False,
+                 ann_min_entries: int = 100000, ann_params: Optional[Dict[str, Any]] = None,
+                 quantization: Optional[str] = None, quantization_params: Optional[Dict[str, Any]] = None,
+                 flush_interval: float = 1.0, flush_max_records: int = 1024,
+                 dedup: bool = True, dedup_max_distance: int = 3, shared: bool = True):
         self.memory_dir = memory_dir
         self.embedding_model = embedding_model
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_concurrency = embedding_concurrency
+        self._embedding_batcher = EmbeddingBatcher(self._embed_batch, batch_window, embedding_batch_size)
         self.entries: List[MemoryEntry] = []
-        self.conversations: Dict[str, List[ConversationTurn]] = {}
-        self.memory_file = os.path.join(memory_dir, "vector_memory.pkl")
-        self.conversations_file = os.path.join(memory_dir, "conversations.json")
+        self._rows_by_id: Dict[str, int] = {}
+        self._lock = threading.RLock()  # guards entries and indexes within this process
+        self.use_ann = use_ann
+        self.ann_min_entries = ann_min_entries
+        self.ann_params = ann_params or {}
+        self._ann: Optional[HNSWIndex] = None
+        self.dedup = dedup
+        self.duplicates_merged = 0
+        self._simhash = SimHashIndex(dedup_max_distance)
+        self.memory_file = os.path.join(memory_dir, "vector_memory.pkl")  # legacy full pickle
+        self.log_dir = os.path.join(memory_dir, "vector_memory_log")
+        self.conversations_file = os.path.join(memory_dir, "conversations.json")  # legacy single file
+        self.conversations_dir = os.path.join(memory_dir, "conversations")
+        self.ann_file = os.path.join(memory_dir, "hnsw_index.npz")
+        self.quantization_file = os.path.join(memory_dir, "quantization.json")
+        self.quantizer_file = os.path.join(memory_dir, "quantizer.npz")
+        self.archive_dir = os.path.join(memory_dir, "archive")
         
         # Create memory directory if it doesn't exist
         os.makedirs(memory_dir, exist_ok=True)
+        self._configure_quantization(quantization, quantization_params)
+        self._index = self._new_index()
+        self._embedding_cache = EmbeddingCache(
+            os.path.join(memory_dir, "embedding_cache"),
+            memory_items=embedding_cache_items,
+            max_disk_mb=embedding_cache_disk_mb
+        )
+        self._store = MemoryLogStore(self.log_dir, snapshot_source=lambda: self.entries,
+                                     vector_field="embedding", write_behind=True,
+                                     flush_interval=flush_interval, flush_max_records=flush_max_records,
+                                     shared=shared)
+        
+        self.conversations = ConversationStore(self.conversations_dir, ConversationTurn)
+        # Conversation turns are embedded lazily into their own index, partitioned by (session, role)
+        self._turn_index = DenseVectorIndex()
+        self._turn_refs: List[Tuple[str, ConversationTurn]] = []
+        self._turn_marks: Dict[str, Tuple[int, Optional[float]]] = {}
+        self.archive = MemoryArchive(self.archive_dir)
         
         # Load existing memory
         self.load_memory()
+        self.load_conversations()
         
         logger.info(f"Vector memory initialized with {len(self.entries)} entries")
     
+    def _configure_quantization(self, mode: Optional[str], params: Optional[Dict[str, Any]]):
+        """Resolve the quantization mode, which is fixed per memory directory once chosen."""
+        settings = {"mode": mode, "params": params or {}}
+        if os.path.exists(self.quantization_file):
+            with open(self.quantization_file, 'r') as f:
+                stored = json.load(f)
+            if mode is not None and stored != settings:
+                logger.warning(f"{self.memory_dir} uses quantization {stored}; ignoring requested {settings}")
+            settings = stored
+        elif mode is not None:
+            with open(self.quantization_file, 'w') as f:
+                json.dump(settings, f, indent=2)
+        
+        self.quantization = settings["mode"]
+        index_params = dict(settings["params"])
+        self._quantizer_train_size = index_params.pop("train_size", 4096)
+        self._quantizer_rerank = index_params.pop("rerank", 4)
+        self._quantizer = None
+        if self.quantization:
+            self._quantizer = make_quantizer(self.quantization, **index_params)
+            if os.path.exists(self.quantizer_file):
+                load_quantizer_state(self._quantizer, self.quantizer_file)
+    
+    def _new_index(self) -> DenseVectorIndex:
+        """Create an empty exact or quantized index for this memory directory."""
+        if self._quantizer is None:
+            return DenseVectorIndex()
+        return QuantizedVectorIndex(
+            self._quantizer,
+            train_size=self._quantizer_train_size,
+            rerank=self._quantizer_rerank,
+            exact_vectors=lambda rows: np.array([self.entries[row].embedding for row in rows], dtype=np.float32)
+        )
+    
     def _generate_id(self, content: str, agent_name: str) -> str:
         """Generate a unique ID for a memory entry."""
         unique_str = f"{content}_{agent_name}_{time.time()}"
         return hashlib.sha256(unique_str.encode()).hexdigest()[:16]
     
+    def _find_duplicate(self, fingerprint: int, agent_name: str, entry_type: str,
+                        content: str) -> Optional[MemoryEntry]:
+        """Existing entry of the same agent and type with a close fingerprint and the same wording."""
+        if not self.dedup:
+            return None
+        entry_id = self._simhash.find(
+            fingerprint, (agent_name, entry_type),
+            accept=lambda doc_id: SimHashIndex.same_wording(content, self.entries[self._rows_by_id[doc_id]].content)
+        )
+        return None if entry_id is None else self.entries[self._rows_by_id[entry_id]]
+    
+    def _merge_duplicate(self, entry: MemoryEntry, metadata: Optional[Dict[str, Any]]):
+        """Fold a repeated insert into an existing entry, keeping its stored content and vector."""
+        entry.hit_count += 1
+        entry.timestamp = time.time()
+        if metadata:
+            entry.metadata.update(metadata)
+        self._index.partitions.update_row(self._rows_by_id[entry.id], entry.timestamp,
+                                          metadata_importance(entry.metadata))
+        self._store.append_add([entry])
+        self.duplicates_merged += 1
+    
+    def _index_fingerprint(self, entry: MemoryEntry):
+        if entry.simhash is None:
+            entry.simhash = SimHashIndex.fingerprint(entry.content)
+        self._simhash.add(entry.id, entry.simhash, (entry.agent_name, entry.entry_type))
+    
+    async def _fetch_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Request embeddings for a batch of texts with one provider call."""
+        if client is None:
+            raise RuntimeError("OpenAI client not configured")
+        # The OpenAI client is blocking, so keep it off the event loop
+        response = await asyncio.to_thread(
+            client.embeddings.create,
+            model=self.embedding_model,
+            input=texts
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+    
+    async def _embed_batch(self, texts: List[str], strict: bool = False) -> List[List[float]]:
+        """Get vector embeddings for a batch of texts, using the cache where possible.
+        
+        A failed provider call yields zero vectors, or raises when ``strict``.
+        """
+        cached = self._embedding_cache.get_many(self.embedding_model, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        fetched: Dict[str, List[float]] = {}
+        if missing:
+            try:
+                vectors = await self._fetch_embeddings(missing)
+                self._embedding_cache.put_many(self.embedding_model, missing, vectors)
+                fetched = dict(zip(missing, vectors))
+            except Exception as e:
+                logger.error(f"Failed to get embedding: {e}")
+                if strict:
+                    raise
+                # Return zero vectors as fallback (never cached)
+                fetched = {text: [0.0] * EMBEDDING_DIMENSION for text in missing}
+        
+        return [vector.tolist() if vector is not None else fetched[text]
+                for text, vector in zip(texts, cached)]
+    
     async def _get_embedding(self, text: str) -> List[float]:
         """Get vector embedding for text."""
-        try:
-            response = client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            logger.error(f"Failed to get embedding: {e}")
-            # Return zero vector as fallback
-            return [0.0] * 1536  # Ada-002 embedding dimension
+        return (await self._embed_batch([text]))[0]
     
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors."""
@@ -97,23 +325,40 @@ class VectorMemory:
     
     async def add_memory(self, content: str, agent_name: str, entry_type: str = "knowledge", 
                         metadata: Optional[Dict[str, Any]] = None) -> str:
-        """Add a new memory entry."""
+        """Add a new memory entry, merging rewordings of an existing entry into it.
+        
+        A close SimHash fingerprint only nominates the existing entry; it is
+        merged only if the texts differ at most in case, punctuation and a
+        few stop words, and it keeps its stored content.
+        """
         try:
-            embedding = await self._get_embedding(content)
-            entry_id = self._generate_id(content, agent_name)
-            
-            entry = MemoryEntry(
-                id=entry_id,
-                content=content,
-                embedding=embedding,
-                metadata=metadata or {},
-                timestamp=time.time(),
-                agent_name=agent_name,
-                entry_type=entry_type
-            )
-            
-            self.entries.append(entry)
-            self.save_memory()
+            self.refresh()
+            fingerprint = SimHashIndex.fingerprint(content)
+            with self._lock:
+                duplicate = self._find_duplicate(fingerprint, agent_name, entry_type, content)
+            if duplicate is None:
+                embedding = await self._embedding_batcher.submit(content)
+            with self._lock:
+                # Another coroutine may have stored the same content while we waited
+                duplicate = self._find_duplicate(fingerprint, agent_name, entry_type, content)
+                if duplicate is not None:
+                    self._merge_duplicate(duplicate, metadata)
+                    logger.debug(f"Merged duplicate memory into {duplicate.id} for agent {agent_name}")
+                    return duplicate.id
+                
+                entry_id = self._generate_id(content, agent_name)
+                
+                entry = MemoryEntry(
+                    id=entry_id,
+                    content=content,
+                    embedding=embedding,
+                    metadata=metadata or {},
+                    timestamp=time.time(),
+                    agent_name=agent_name,
+                    entry_type=entry_type,
+                    simhash=fingerprint
+                )
+                self._insert_entries([entry])
             
             logger.debug(f"Added memory entry {entry_id} for agent {agent_name}")
             return entry_id
@@ -122,36 +367,266 @@ class VectorMemory:
             logger.error(f"Failed to add memory: {e}")
             raise
     
+    async def add_memories_bulk(self, contents: List[str], agent_name: str, entry_type: str = "knowledge",
+                                metadata: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[str]:
+        """Add many memory entries using batched embedding calls and a single log write.
+        
+        Duplicates, of existing entries or earlier items of the same call,
+        are merged instead of embedded; the returned ids then repeat.
+        """
+        try:
+            if not contents:
+                return []
+            metadata = metadata or [None] * len(contents)
+            if len(metadata) != len(contents):
+                raise ValueError("metadata must have one item per content")
+            
+            self.refresh()
+            fingerprints = [SimHashIndex.fingerprint(content) for content in contents]
+            ids: List[Optional[str]] = [None] * len(contents)
+            fresh: List[int] = []
+            first_of: Dict[int, int] = {}
+            batch_index = SimHashIndex(self._simhash.max_distance)
+            with self._lock:
+                for i, fingerprint in enumerate(fingerprints):
+                    duplicate = self._find_duplicate(fingerprint, agent_name, entry_type, contents[i])
+                    if duplicate is not None:
+                        self._merge_duplicate(duplicate, metadata[i])
+                        ids[i] = duplicate.id
+                        continue
+                    if self.dedup:
+                        first = batch_index.find(
+                            fingerprint,
+                            accept=lambda doc_id: SimHashIndex.same_wording(contents[i], contents[int(doc_id)])
+                        )
+                        if first is not None:
+                            first_of[i] = int(first)
+                            continue
+                        batch_index.add(str(i), fingerprint)
+                    fresh.append(i)
+            
+            semaphore = asyncio.Semaphore(self.embedding_concurrency)
+            
+            async def embed(batch: List[str]) -> List[List[float]]:
+                async with semaphore:
+                    return await self._embed_batch(batch)
+            
+            texts = [contents[i] for i in fresh]
+            batches = [texts[i:i + self.embedding_batch_size]
+                       for i in range(0, len(texts), self.embedding_batch_size)]
+            batch_embeddings = await asyncio.gather(*(embed(batch) for batch in batches))
+            embeddings = [embedding for batch in batch_embeddings for embedding in batch]
+            
+            timestamp = time.time()
+            entries = [
+                MemoryEntry(
+                    id=self._generate_id(contents[i], agent_name),
+                    content=contents[i],
+                    embedding=embedding,
+                    metadata=dict(metadata[i] or {}),
+                    timestamp=timestamp,
+                    agent_name=agent_name,
+                    entry_type=entry_type,
+                    simhash=fingerprints[i]
+                )
+                for i, embedding in zip(fresh, embeddings)
+            ]
+            entry_at = dict(zip(fresh, entries))
+            for i, entry in entry_at.items():
+                ids[i] = entry.id
+            for i, first in first_of.items():
+                entry = entry_at[first]
+                entry.hit_count += 1
+                if metadata[i]:
+                    entry.metadata.update(metadata[i])
+                ids[i] = entry.id
+                self.duplicates_merged += 1
+            
+            with self._lock:
+                self._insert_entries(entries)
+            
+            logger.debug(f"Added {len(entries)} memory entries for agent {agent_name} in {len(batches)} batches")
+            return ids
+            
+        except Exception as e:
+            logger.error(f"Failed to add memories: {e}")
+            raise
+    
+    def _insert_entries(self, entries: List[MemoryEntry], log: bool = True):
+        """Append embedded entries to the index, dedup and ANN structures and (``log``) the log."""
+        if not entries:
+            return
+        for entry in entries:
+            # A float32 row is ~8x smaller than a list of Python floats. Quantized indexes still need
+            # it for exact reranking until the next snapshot memory-maps it from disk.
+            if not isinstance(entry.embedding, np.ndarray):
+                entry.embedding = np.asarray(entry.embedding, dtype=np.float32)
+        self.entries.extend(entries)
+        rows = self._index.add_batch([entry.embedding for entry in entries],
+                                     [entry.agent_name for entry in entries],
+                                     [entry.entry_type for entry in entries],
+                                     [entry.timestamp for entry in entries],
+                                     [metadata_importance(entry.metadata) for entry in entries])
+        self._rows_by_id.update(zip((entry.id for entry in entries), rows.tolist()))
+        for entry in entries:
+            self._index_fingerprint(entry)
+        self._ann_add(entries)
+        if log:
+            self._store.append_add(entries)
+    
     async def search_memory(self, query: str, agent_name: Optional[str] = None, 
-                           entry_type: Optional[str] = None, top_k: int = 5) -> List[MemoryEntry]:
-        """Search memory entries by similarity."""
+                           entry_type: Optional[str] = None, top_k: int = 5,
+                           scoring: Optional[ScoringOptions] = None,
+                           fields: Optional[Sequence[str]] = None) -> List[MemorySearchResult]:
+        """Search memory entries by similarity.
+        
+        ``scoring`` applies recency decay, importance and entry type boosts to
+        every candidate inside the index before top-k selection. Scored
+        searches always scan exactly, since the ANN graph ranks by similarity only.
+        Results are immutable records without embeddings; ``fields`` limits
+        which payload fields they carry (see :class:`MemorySearchResult`).
+        """
+        fields = MemorySearchResult.projection(fields)
         try:
             query_embedding = await self._get_embedding(query)
+            self.refresh()
             
-            # Filter entries by agent and type if specified
-            filtered_entries = self.entries
-            if agent_name:
-                filtered_entries = [e for e in filtered_entries if e.agent_name == agent_name]
-            if entry_type:
-                filtered_entries = [e for e in filtered_entries if e.entry_type == entry_type]
+            with self._lock:
+                if scoring is None and self._ann is not None and len(self.entries) >= self.ann_min_entries:
+                    rows, scores = self._ann_search(query_embedding, top_k, agent_name, entry_type)
+                else:
+                    # Score every candidate row with one matrix-vector product
+                    rows, scores = self._index.search(query_embedding, top_k, agent_name, entry_type, scoring)
+                
+                return [MemorySearchResult.from_entry(self.entries[row], score, fields)
+                        for row, score in zip(rows.tolist(), scores.tolist())]
             
-            # Calculate similarities
-            for entry in filtered_entries:
-                entry.relevance_score = self._cosine_similarity(query_embedding, entry.embedding)
+        except Exception as e:
+            logger.error(f"Failed to search memory: {e}")
+            return []
+    
+    async def search_memory_many(self, queries: List[str], agent_name: Optional[str] = None,
+                                 entry_type: Optional[str] = None, top_k: int = 5,
+                                 scoring: Optional[ScoringOptions] = None,
+                                 fields: Optional[Sequence[str]] = None) -> List[List[MemorySearchResult]]:
+        """Search several queries at once, returning one result list per query.
+        
+        Queries are embedded in one batch and scored with a single
+        matrix-matrix product over the filtered rows.
+        """
+        fields = MemorySearchResult.projection(fields)
+        try:
+            if not queries:
+                return []
+            query_embeddings = await self._embed_batch(list(queries))
+            self.refresh()
             
-            # Sort by relevance and return top k
-            sorted_entries = sorted(filtered_entries, key=lambda x: x.relevance_score or 0, reverse=True)
-            return sorted_entries[:top_k]
+            with self._lock:
+                if scoring is None and self._ann is not None and len(self.entries) >= self.ann_min_entries:
+                    matches = [self._ann_search(embedding, top_k, agent_name, entry_type)
+                               for embedding in query_embeddings]
+                else:
+                    matches = self._index.search_many(query_embeddings, top_k, agent_name, entry_type, scoring)
+                
+                return [
+                    [MemorySearchResult.from_entry(self.entries[row], score, fields)
+                     for row, score in zip(rows.tolist(), scores.tolist())]
+                    for rows, scores in matches
+                ]
             
         except Exception as e:
             logger.error(f"Failed to search memory: {e}")
-            return []
+            return [[] for _ in queries]
+    
+    def _ann_add(self, entries: List[MemoryEntry]):
+        """Insert entries into the HNSW graph when the ANN index is enabled."""
+        if not self.use_ann:
+            return
+        for entry in entries:
+            if self._ann is None:
+                self._ann = HNSWIndex(len(entry.embedding), **self.ann_params)
+            self._ann.add(entry.id, entry.embedding)
+    
+    def _ann_search(self, query_embedding: List[float], top_k: int, agent_name: Optional[str],
+                    entry_type: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate search through the HNSW graph, mapped back to entry rows."""
+        mask = self._index.filter_mask(agent_name, entry_type)
+        if mask is not None and self._index.partitions.size(agent_name, entry_type) < self.ann_min_entries:
+            # Small partitions are cheaper to scan exactly
+            return self._index.search(query_embedding, top_k, agent_name, entry_type)
+        
+        accept = None
+        if mask is not None:
+            accept = lambda label: mask[self._rows_by_id[label]]
+        labels, scores = self._ann.search(query_embedding, top_k, accept=accept)
+        rows = np.array([self._rows_by_id[label] for label in labels], dtype=np.int64)
+        return rows, scores
+    
+    def _sync_ann(self):
+        """Load the persisted HNSW graph and reconcile it with the live entries."""
+        self._ann = None
+        if os.path.exists(self.ann_file):
+            try:
+                self._ann = HNSWIndex.load(self.ann_file)
+            except Exception as e:
+                logger.warning(f"Failed to load ANN index, rebuilding: {e}")
+        if self._ann is not None:
+            for label in self._ann.labels:
+                if label not in self._rows_by_id:
+                    self._ann.remove(label)
+            self._ann.compact()
+        self._ann_add([e for e in self.entries if self._ann is None or e.id not in self._ann])
+    
+    def get_ann_recall_report(self, sample_size: int = 100, top_k: int = 10,
+                              ef: Optional[int] = None) -> Dict[str, Any]:
+        """Compare ANN search quality and latency against exact search.
+        
+        Stored embeddings (sampled at random) are used as queries.
+        """
+        if self._ann is None or not self.entries:
+            return {"enabled": self.use_ann, "live_nodes": 0}
+        rng = np.random.default_rng()
+        sample = rng.choice(len(self.entries), size=min(sample_size, len(self.entries)), replace=False)
+        queries = np.array([self.entries[row].embedding for row in sample], dtype=np.float32)
+        return self._ann.recall_report(queries, top_k=top_k, ef=ef)
+    
+    def get_quantization_report(self, sample_size: int = 50, top_k: int = 10) -> Dict[str, Any]:
+        """Measure vector memory footprint and recall@k of the quantized index against exact search.
+        
+        ``vector_mb`` covers the index only. Entries added since the last
+        snapshot also hold their float32 vector in RAM (``entry_vector_mb``)
+        until compaction memory-maps it from disk.
+        """
+        if not isinstance(self._index, QuantizedVectorIndex) or not self.entries:
+            return {"mode": self.quantization}
+        
+        exact = DenseVectorIndex()
+        exact.add_batch([e.embedding for e in self.entries],
+                        [e.agent_name for e in self.entries], [e.entry_type for e in self.entries])
+        rng = np.random.default_rng()
+        sample = rng.choice(len(self.entries), size=min(sample_size, len(self.entries)), replace=False)
+        hits = 0
+        for row in sample:
+            query = self.entries[row].embedding
+            approx_rows, _ = self._index.search(query, top_k)
+            exact_rows, _ = exact.search(query, top_k)
+            hits += len(set(approx_rows.tolist()) & set(exact_rows.tolist()))
+        
+        footprint = self._index.memory_bytes()
+        return {
+            "mode": self.quantization,
+            "trained": self._quantizer.trained,
+            "rerank": self._index.rerank,
+            f"recall@{top_k}": hits / (len(sample) * min(top_k, len(self.entries))),
+            "vector_mb": footprint["vector_bytes"] / (1024 * 1024),
+            "float32_mb": footprint["float32_bytes"] / (1024 * 1024),
+            "compression_ratio": footprint["float32_bytes"] / max(footprint["vector_bytes"], 1),
+            "entry_vector_mb": sum(e.embedding.nbytes for e in self.entries
+                                   if not isinstance(e.embedding, np.memmap)) / (1024 * 1024)
+        }
     
     def add_conversation_turn(self, session_id: str, role: str, content: str, agent_name: Optional[str] = None):
         """Add a turn to a conversation."""
-        if session_id not in self.conversations:
-            self.conversations[session_id] = []
-        
         turn = ConversationTurn(
             role=role,
             content=content,
@@ -159,58 +634,289 @@ class VectorMemory:
             agent_name=agent_name
         )
         
-        self.conversations[session_id].append(turn)
-        self.save_conversations()
+        self.conversations.append(session_id, turn)
         
         logger.debug(f"Added conversation turn for session {session_id}")
     
     def get_conversation_history(self, session_id: str, last_n: Optional[int] = None) -> List[ConversationTurn]:
         """Get conversation history for a session."""
-        if session_id not in self.conversations:
+        return self.conversations.history(session_id, last_n)
+    
+    def get_conversation_window(self, session_id: str, max_tokens: int,
+                                use_summary: bool = True) -> List[ConversationTurn]:
+        """Most recent turns that fit in ``max_tokens``, ready to be placed in a prompt.
+        
+        When the session has a rolling summary (see :meth:`summarize_conversation`)
+        it leads the window as a ``system`` turn and only newer turns follow.
+        """
+        summary, turns = self.conversations.window(session_id, max_tokens, use_summary)
+        if summary is None:
+            return turns
+        summary_turn = ConversationTurn(role="system", content=summary["content"],
+                                        timestamp=summary["through"], tokens=summary["tokens"])
+        return [summary_turn] + turns
+    
+    def summarize_conversation(self, session_id: str, keep_tokens: int = 2000,
+                               summarizer=extractive_turn_summary) -> Optional[str]:
+        """Fold turns older than the newest ``keep_tokens`` into the session's rolling summary.
+        
+        ``summarizer(previous_summary, turns)`` returns the new summary text;
+        an LLM-backed summarizer can be passed in place of the extractive default.
+        """
+        try:
+            summary = self.conversations.summarize(session_id, summarizer, keep_tokens)
+            return summary["content"] if summary else None
+        except Exception as e:
+            logger.error(f"Failed to summarize conversation {session_id}: {e}")
+            return None
+    
+    async def search_conversations(self, query: str, session_id: Optional[str] = None,
+                                   role: Optional[str] = None, top_k: int = 5,
+                                   scoring: Optional[ScoringOptions] = None) -> List[ConversationSearchResult]:
+        """Search conversation turns across all sessions by similarity.
+        
+        Turns are indexed with the same dense index as memories, with
+        ``session_id`` and ``role`` as its partition filters, so the query is
+        one top-k selection instead of a scan of every session file. Turns
+        stored since the last search (by any process) are embedded first.
+        """
+        try:
+            query_embedding = await self._get_embedding(query)
+            await self._sync_conversation_index()
+            with self._lock:
+                rows, scores = self._turn_index.search(query_embedding, top_k, session_id, role, scoring)
+                return [ConversationSearchResult.from_turn(*self._turn_refs[row], score)
+                        for row, score in zip(rows.tolist(), scores.tolist())]
+        except Exception as e:
+            logger.error(f"Failed to search conversations: {e}")
             return []
+    
+    async def _sync_conversation_index(self):
+        """Embed and index the turns written to any session since the previous sync.
         
-        history = self.conversations[session_id]
-        if last_n:
-            return history[-last_n:]
-        return history
+        The index itself lives in memory, but turn vectors go through the
+        persistent embedding cache, so a restarted worker rebuilds it from
+        cache hits. A failed embedding call indexes nothing for the affected
+        sessions; they are read again on the next sync.
+        """
+        with self._lock:
+            changes = self.conversations.changes(self._turn_marks)
+            self._drop_turn_sessions({session_id for session_id, reset, _ in changes if reset})
+            pending = [(session_id, turn) for session_id, _, turns in changes for turn in turns]
+        if not pending:
+            return
+        
+        try:
+            embeddings = []
+            for start in range(0, len(pending), self.embedding_batch_size):
+                batch = pending[start:start + self.embedding_batch_size]
+                embeddings.extend(await self._embed_batch([turn.content for _, turn in batch], strict=True))
+        except Exception:
+            # Re-read these sessions in full on the next sync
+            with self._lock:
+                failed = {session_id for session_id, _ in pending}
+                self._drop_turn_sessions(failed)
+                for session_id in failed:
+                    self._turn_marks.pop(session_id, None)
+            raise
+        
+        with self._lock:
+            self._turn_index.add_batch(embeddings,
+                                       [session_id for session_id, _ in pending],
+                                       [turn.role for _, turn in pending],
+                                       [turn.timestamp for _, turn in pending])
+            self._turn_refs.extend(pending)
+    
+    def _drop_turn_sessions(self, session_ids: Set[str]):
+        if not session_ids or not self._turn_refs:
+            return
+        keep_mask = np.fromiter((session_id not in session_ids for session_id, _ in self._turn_refs),
+                                dtype=bool, count=len(self._turn_refs))
+        self._turn_index.keep(keep_mask)
+        self._turn_refs = [ref for ref, keep in zip(self._turn_refs, keep_mask.tolist()) if keep]
     
-    def get_agent_memories(self, agent_name: str, entry_type: Optional[str] = None) -> List[MemoryEntry]:
-        """Get all memories for a specific agent."""
-        memories = [e for e in self.entries if e.agent_name == agent_name]
-        if entry_type:
-            memories = [e for e in memories if e.entry_type == entry_type]
-        return sorted(memories, key=lambda x: x.timestamp, reverse=True)
+    def get_agent_memories(self, agent_name: str, entry_type: Optional[str] = None,
+                           limit: Optional[int] = None) -> List[MemoryEntry]:
+        """Get memories for a specific agent, newest first."""
+        self.refresh()
+        with self._lock:
+            rows = self._index.partitions.recent_rows(agent_name, entry_type, limit)
+            return [self.entries[row] for row in rows.tolist()]
     
     def cleanup_old_memories(self, max_age_days: int = 30):
         """Remove memories older than specified days."""
         cutoff_time = time.time() - (max_age_days * 24 * 60 * 60)
-        initial_count = len(self.entries)
+        self.refresh()
+        with self._lock:
+            initial_count = len(self.entries)
+            keep_mask = np.fromiter((e.timestamp > cutoff_time for e in self.entries),
+                                    dtype=bool, count=len(self.entries))
+            self._remove_entries(keep_mask)
         
-        self.entries = [e for e in self.entries if e.timestamp > cutoff_time]
-        
-        # Also cleanup old conversations
-        for session_id in list(self.conversations.keys()):
-            self.conversations[session_id] = [
-                turn for turn in self.conversations[session_id] 
-                if turn.timestamp > cutoff_time
-            ]
-            if not self.conversations[session_id]:
-                del self.conversations[session_id]
+        # Expire old conversation turns in the background
+        self.conversations.expire(cutoff_time)
         
         removed_count = initial_count - len(self.entries)
         if removed_count > 0:
             logger.info(f"Cleaned up {removed_count} old memory entries")
-            self.save_memory()
-            self.save_conversations()
+    
+    def _remove_entries(self, keep_mask: np.ndarray, log: bool = True) -> List[str]:
+        """Drop the entries whose ``keep_mask`` is False everywhere, returning their ids."""
+        removed_ids = [e.id for e, keep in zip(self.entries, keep_mask) if not keep]
+        if not removed_ids:
+            return []
+        self.entries = [e for e, keep in zip(self.entries, keep_mask) if keep]
+        self._index.keep(keep_mask)
+        self._rows_by_id = {e.id: row for row, e in enumerate(self.entries)}
+        for entry_id in removed_ids:
+            self._simhash.remove(entry_id)
+        if self._ann is not None:
+            for entry_id in removed_ids:
+                self._ann.remove(entry_id)
+            self._ann.compact()
+        if log:
+            self._store.append_delete(removed_ids)
+        return removed_ids
+    
+    def consolidate_memories(self, max_age_days: float = 7, entry_types=DEFAULT_CONSOLIDATE_TYPES,
+                             cluster_size: int = 20, min_cluster_size: int = 3,
+                             summarizer=None) -> Dict[str, Any]:
+        """Fold old memories into per-cluster summary entries.
+        
+        Entries of ``entry_types`` older than ``max_age_days`` are clustered per
+        agent and type with mini-batch k-means over their embeddings (about
+        ``cluster_size`` entries per cluster). Every cluster of at least
+        ``min_cluster_size`` entries is replaced by one summary entry embedded
+        at the cluster centroid, and its originals are moved to the archive,
+        from where :meth:`get_archived_memories` can restore them.
+        ``summarizer(contents)`` may replace the default extractive summary;
+        it receives member contents ordered by closeness to the centroid.
+        """
+        cutoff_time = time.time() - (max_age_days * 24 * 60 * 60)
+        self.refresh()
+        with self._lock:
+            partitions = self._index.partitions
+            groups: Dict[Tuple[str, str], List[int]] = {}
+            for entry_type in entry_types:
+                rows = partitions.rows(None, entry_type)
+                if rows is None or len(rows) == 0:
+                    continue
+                for row in rows[partitions.timestamps(rows) <= cutoff_time].tolist():
+                    groups.setdefault((self.entries[row].agent_name, entry_type), []).append(row)
+            
+            summaries: List[MemoryEntry] = []
+            archived: List[Tuple[str, List[MemoryEntry]]] = []
+            keep_mask = np.ones(len(self.entries), dtype=bool)
+            for (agent_name, entry_type), rows in groups.items():
+                if len(rows) < min_cluster_size:
+                    continue
+                vectors = np.array([self.entries[row].embedding for row in rows], dtype=np.float32)
+                centroids, labels = minibatch_kmeans(vectors, max(1, len(rows) // cluster_size))
+                norms = np.linalg.norm(vectors, axis=1)
+                norms[norms == 0] = 1.0
+                for cluster, centroid in enumerate(centroids):
+                    members = np.flatnonzero(labels == cluster)
+                    if len(members) < min_cluster_size:
+                        continue
+                    # Most central members first
+                    members = members[np.argsort(-(vectors[members] @ centroid) / norms[members], kind="stable")]
+                    originals = [self.entries[rows[i]] for i in members.tolist()]
+                    summary = self._summary_entry(originals, centroid, summarizer)
+                    summaries.append(summary)
+                    archived.append((summary.id, originals))
+                    keep_mask[[rows[i] for i in members.tolist()]] = False
+            
+            if not summaries:
+                return {"clusters": 0, "archived": 0, "entries": len(self.entries)}
+            # Archive before deleting so a crash never loses the originals
+            self.archive.append(archived)
+            self._remove_entries(keep_mask)
+            self._insert_entries(summaries)
+            archived_count = sum(len(originals) for _, originals in archived)
+            logger.info(f"Consolidated {archived_count} memories into {len(summaries)} summaries")
+            return {"clusters": len(summaries), "archived": archived_count, "entries": len(self.entries)}
+    
+    def _summary_entry(self, originals: List[MemoryEntry], centroid: np.ndarray, summarizer) -> MemoryEntry:
+        contents = [entry.content for entry in originals]
+        content = summarizer(contents) if summarizer else extractive_summary(contents, top_terms(contents))
+        first = originals[0]
+        metadata = {
+            "consolidated": True,
+            "source_ids": [entry.id for entry in originals],
+            "source_count": len(originals),
+            "first_timestamp": min(entry.timestamp for entry in originals),
+        }
+        importance = max(metadata_importance(entry.metadata) for entry in originals)
+        if importance:
+            metadata[IMPORTANCE_KEY] = importance
+        return MemoryEntry(
+            id=self._generate_id(content, first.agent_name),
+            content=content,
+            embedding=centroid.astype(np.float32).tolist(),
+            metadata=metadata,
+            timestamp=max(entry.timestamp for entry in originals),
+            agent_name=first.agent_name,
+            entry_type=first.entry_type,
+            hit_count=sum(entry.hit_count for entry in originals)
+        )
+    
+    def get_archived_memories(self, summary_id: str) -> List[MemoryEntry]:
+        """Original entries that were consolidated into ``summary_id``."""
+        try:
+            return self.archive.get(summary_id)
+        except Exception as e:
+            logger.error(f"Failed to read memory archive: {e}")
+            return []
+    
+    def export_memory(self, path: str) -> int:
+        """Export every entry to the columnar directory ``path``; returns the entry count."""
+        self.refresh()
+        with self._lock:
+            entries = list(self.entries)
+        return export_entries(path, entries, "vector", vector_field="embedding")
+    
+    def import_memory(self, path: str, batch_size: int = 10000) -> Dict[str, int]:
+        """Stream entries from a columnar export, indexing each batch as it is read.
+        
+        Only one batch of the export is held in memory besides the imported
+        entries themselves. Entries whose id already exists are skipped.
+        Embeddings come from the export, so nothing is re-embedded; exports
+        without embeddings (from the text backend) are rejected.
+        """
+        self.refresh()
+        imported = skipped = 0
+        try:
+            for rows, vectors in iter_import(path, batch_size, with_embeddings=True):
+                entries = []
+                with self._lock:
+                    for row, vector in zip(rows, vectors):
+                        if row["id"] in self._rows_by_id:
+                            skipped += 1
+                            continue
+                        entries.append(MemoryEntry(
+                            id=row["id"],
+                            content=row["content"],
+                            embedding=vector,
+                            metadata=row["metadata"],
+                            timestamp=row["timestamp"],
+                            agent_name=row["agent_name"],
+                            entry_type=row["entry_type"],
+                            hit_count=row["hit_count"]
+                        ))
+                    self._insert_entries(entries)
+                imported += len(entries)
+                self._store.flush()
+        finally:
+            if imported:
+                self.save_memory()
+        logger.info(f"Imported {imported} memory entries from {path} ({skipped} already present)")
+        return {"imported": imported, "skipped": skipped}
     
     def get_memory_stats(self) -> Dict[str, Any]:
         """Get memory system statistics."""
-        agent_counts = {}
-        type_counts = {}
-        
-        for entry in self.entries:
-            agent_counts[entry.agent_name] = agent_counts.get(entry.agent_name, 0) + 1
-            type_counts[entry.entry_type] = type_counts.get(entry.entry_type, 0) + 1
+        self.refresh()
+        agent_counts = self._index.partitions.counts(by_agent=True)
+        type_counts = self._index.partitions.counts(by_agent=False)
         
         return {
             "total_entries": len(self.entries),
@@ -219,7 +925,21 @@ class VectorMemory:
             "entries_by_type": type_counts,
             "oldest_entry": min((e.timestamp for e in self.entries), default=0),
             "newest_entry": max((e.timestamp for e in self.entries), default=0),
-            "memory_size_mb": self._estimate_memory_size()
+            "memory_size_mb": self._estimate_memory_size(),
+            "embedding_cache": self._embedding_cache.stats(),
+            "quantization": self.quantization,
+            "persistence": {
+                "pending_writes": self._store.pending,
+                "log_writes": self._store.write_count,
+                "shared": self._store.shared
+            },
+            "duplicates_merged": self.duplicates_merged,
+            "ann_index": {
+                "enabled": self.use_ann,
+                "active": self._ann is not None and len(self.entries) >= self.ann_min_entries,
+                "live_nodes": len(self._ann) if self._ann is not None else 0,
+                "tombstones": self._ann.tombstones if self._ann is not None else 0
+            }
         }
     
     def _estimate_memory_size(self) -> float:
@@ -236,56 +956,141 @@ class VectorMemory:
         except Exception:
             return 0.0
     
+    def flush(self):
+        """Write queued memory mutations to disk; call before shutdown."""
+        try:
+            self._store.flush()
+            self._embedding_cache.flush()
+            self.conversations.close()
+        except Exception as e:
+            logger.error(f"Failed to flush memory: {e}")
+    
     def save_memory(self):
-        """Save memory entries to disk."""
+        """Checkpoint memory entries into a compacted snapshot."""
         try:
-            with open(self.memory_file, 'wb') as f:
-                pickle.dump(self.entries, f)
+            self._store.compact(wait=True)
+            if self._ann is not None:
+                self._ann.save(self.ann_file)
+            if self._quantizer is not None and self._quantizer.trained:
+                save_quantizer(self._quantizer, self.quantizer_file)
         except Exception as e:
             logger.error(f"Failed to save memory: {e}")
     
     def load_memory(self):
-        """Load memory entries from disk."""
+        """Load memory entries from the snapshot and segment log."""
         try:
-            if os.path.exists(self.memory_file):
+            if self._store.is_empty() and os.path.exists(self.memory_file):
+                # Migrate a legacy full pickle into the log store once
                 with open(self.memory_file, 'rb') as f:
                     self.entries = pickle.load(f)
+                self._store.append_add(self.entries)
+                self._store.compact(wait=True)
+                logger.info(f"Migrated {len(self.entries)} entries from {self.memory_file}")
+            else:
+                self.entries = self._store.load()
         except Exception as e:
             logger.error(f"Failed to load memory: {e}")
             self.entries = []
+        self._rebuild_index()
+    
+    def refresh(self):
+        """Apply memory mutations that other processes sharing this directory have logged."""
+        try:
+            with self._lock:
+                records = self._store.refresh()
+                if records is None:
+                    logger.info("Memory log was compacted by another process; reloading")
+                    self.load_memory()
+                elif records:
+                    self._apply_records(records)
+        except Exception as e:
+            logger.error(f"Failed to refresh memory: {e}")
+    
+    def _apply_records(self, records: List[Tuple[str, Any]]):
+        """Replay foreign ``("add", entry)`` / ``("delete", ids)`` log records without re-logging them."""
+        added: Dict[str, MemoryEntry] = {}
+        deleted = set()
+        for op, payload in records:
+            if op == "add":
+                added[payload.id] = payload
+                deleted.discard(payload.id)
+            else:
+                for entry_id in payload:
+                    added.pop(entry_id, None)
+                    deleted.add(entry_id)
+        if deleted:
+            self._remove_entries(np.fromiter((e.id not in deleted for e in self.entries),
+                                             dtype=bool, count=len(self.entries)), log=False)
+        fresh = []
+        for entry in added.values():
+            row = self._rows_by_id.get(entry.id)
+            if row is None:
+                fresh.append(entry)
+            else:
+                # Re-logged entries (merged duplicates) keep their row and vector
+                self.entries[row] = entry
+                self._index.partitions.update_row(row, entry.timestamp, metadata_importance(entry.metadata))
+        self._insert_entries(fresh, log=False)
+    
+    def _rebuild_index(self):
+        """Rebuild the embedding matrix from the current entries.
+        
+        Entries still backed by the memory-mapped snapshot are adopted without
+        copying; only entries replayed from newer segments are copied into RAM.
+        """
+        self._index = self._new_index()
+        self._rows_by_id = {e.id: row for row, e in enumerate(self.entries)}
+        mapped = self._store.mapped_vectors
+        mapped_count = len(mapped) if mapped is not None else 0
+        if mapped_count:
+            head = self.entries[:mapped_count]
+            self._index.rebuild(
+                mapped,
+                [e.agent_name for e in head],
+                [e.entry_type for e in head],
+                norms=self._store.mapped_norms,
+                timestamps=[e.timestamp for e in head],
+                importance=[metadata_importance(e.metadata) for e in head]
+            )
+        rest = self.entries[mapped_count:]
+        if rest:
+            self._index.add_batch(
+                [e.embedding for e in rest],
+                [e.agent_name for e in rest],
+                [e.entry_type for e in rest],
+                [e.timestamp for e in rest],
+                [metadata_importance(e.metadata) for e in rest]
+            )
+        self._simhash = SimHashIndex(self._simhash.max_distance)
+        for entry in self.entries:
+            self._index_fingerprint(entry)
+        if self.use_ann:
+            self._sync_ann()
     
     def save_conversations(self):
-        """Save conversations to disk."""
+        """Wait for pending conversation expiry; turns are persisted as they are appended."""
         try:
-            # Convert ConversationTurn objects to dictionaries
-            serializable_conversations = {}
-            for session_id, turns in self.conversations.items():
-                serializable_conversations[session_id] = [asdict(turn) for turn in turns]
-            
-            with open(self.conversations_file, 'w') as f:
-                json.dump(serializable_conversations, f, indent=2)
+            self.conversations.close()
         except Exception as e:
             logger.error(f"Failed to save conversations: {e}")
     
     def load_conversations(self):
-        """Load conversations from disk."""
+        """Migrate the legacy single-file conversation history into per-session files."""
         try:
-            if os.path.exists(self.conversations_file):
+            if len(self.conversations) == 0 and os.path.exists(self.conversations_file):
                 with open(self.conversations_file, 'r') as f:
                     data = json.load(f)
                 
-                # Convert dictionaries back to ConversationTurn objects
-                self.conversations = {}
                 for session_id, turns in data.items():
-                    self.conversations[session_id] = [
-                        ConversationTurn(**turn) for turn in turns
-                    ]
+                    self.conversations.append_many(
+                        session_id, [ConversationTurn(**turn) for turn in turns]
+                    )
+                logger.info(f"Migrated {len(data)} conversations from {self.conversations_file}")
         except Exception as e:
             logger.error(f"Failed to load conversations: {e}")
-            self.conversations = {}
 
-# Global vector memory instance
-vector_memory = VectorMemory()
+# Global vector memory instance, opened on first use
+vector_memory = LazyInstance(VectorMemory)
 
 # Utility functions
 async def remember(content: str, agent_name: str, entry_type: str = "knowledge", 
@@ -293,10 +1098,24 @@ async def remember(content: str, agent_name: str, entry_type: str = "knowledge",
     """Add content to agent memory."""
     return await vector_memory.add_memory(content, agent_name, entry_type, metadata)
 
+async def remember_many(contents: List[str], agent_name: str, entry_type: str = "knowledge",
+                        metadata: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[str]:
+    """Add many pieces of content to agent memory in batches."""
+    return await vector_memory.add_memories_bulk(contents, agent_name, entry_type, metadata)
+
 async def recall(query: str, agent_name: Optional[str] = None, 
-                entry_type: Optional[str] = None, top_k: int = 5) -> List[MemoryEntry]:
+                entry_type: Optional[str] = None, top_k: int = 5,
+                scoring: Optional[ScoringOptions] = None,
+                fields: Optional[Sequence[str]] = None) -> List[MemorySearchResult]:
     """Search agent memory."""
-    return await vector_memory.search_memory(query, agent_name, entry_type, top_k)
+    return await vector_memory.search_memory(query, agent_name, entry_type, top_k, scoring, fields)
+
+async def recall_many(queries: List[str], agent_name: Optional[str] = None,
+                      entry_type: Optional[str] = None, top_k: int = 5,
+                      scoring: Optional[ScoringOptions] = None,
+                      fields: Optional[Sequence[str]] = None) -> List[List[MemorySearchResult]]:
+    """Search agent memory for several queries in one pass."""
+    return await vector_memory.search_memory_many(queries, agent_name, entry_type, top_k, scoring, fields)
 
 def add_to_conversation(session_id: str, role: str, content: str, agent_name: Optional[str] = None):
     """Add to conversation history."""
@@ -306,14 +1125,30 @@ def get_conversation(session_id: str, last_n: Optional[int] = None) -> List[Conv
     """Get conversation history."""
     return vector_memory.get_conversation_history(session_id, last_n)
 
+def get_conversation_window(session_id: str, max_tokens: int) -> List[ConversationTurn]:
+    """Get the most recent conversation turns that fit a token budget."""
+    return vector_memory.get_conversation_window(session_id, max_tokens)
+
+async def search_conversations(query: str, session_id: Optional[str] = None, role: Optional[str] = None,
+                               top_k: int = 5) -> List[ConversationSearchResult]:
+    """Search conversation turns across sessions."""
+    return await vector_memory.search_conversations(query, session_id, role, top_k)
+
 # Export main classes and functions
 __all__ = [
     "VectorMemory",
     "MemoryEntry",
     "ConversationTurn",
+    "ConversationSearchResult",
+    "ScoringOptions",
+    "MemorySearchResult",
     "vector_memory",
     "remember",
+    "remember_many",
     "recall",
+    "recall_many",
     "add_to_conversation",
-    "get_conversation"
+    "get_conversation",
+    "get_conversation_window",
+    "search_conversations"
 ]
@@ -10,13 +10,22 @@ import time
 import pickle
 import hashlib
 import logging
-from typing import Dict, Any, List, Optional, Union, Tuple
-from dataclasses import dataclass, asdict
-from datetime import datetime, timedelta
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
 import re
 from collections import Counter
 import math
 
+import numpy as np
+
+from memory_index import (InvertedIndex, RowPartitions, ScoringOptions, SimHashIndex, MemorySearchResult, IMPORTANCE_KEY,
+                          STOP_WORDS, metadata_importance)
+from memory_store import LazyInstance, MemoryLogStore
+from conversation_store import ConversationSearchResult, ConversationStore, extractive_turn_summary
+from memory_transfer import export_entries, iter_import
+from memory_consolidation import DEFAULT_CONSOLIDATE_TYPES, MemoryArchive, extractive_summary, keyword_clusters
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -31,6 +40,8 @@ class MemoryEntry:
     agent_name: str
     entry_type: str  # conversation, knowledge, task_result, etc.
     relevance_score: Optional[float] = None
+    hit_count: int = 1  # times this (near-)duplicate content was remembered
+    simhash: Optional[int] = None
 
 @dataclass
 class ConversationTurn:
@@ -39,22 +50,48 @@ class ConversationTurn:
     content: str
     timestamp: float
     agent_name: Optional[str] = None
+    tokens: Optional[int] = None  # cached token estimate, filled in when stored
 
 class TextSimilarityMemory:
     """Text similarity-based memory system for agents."""
     
-    def __init__(self, memory_dir: str = "agent_memory"):
+    def __init__(self, memory_dir: str = "agent_memory", flush_interval: float = 1.0,
+                 flush_max_records: int = 1024, dedup: bool = True, dedup_max_distance: int = 3,
+                 shared: bool = True):
         self.memory_dir = memory_dir
         self.entries: List[MemoryEntry] = []
-        self.conversations: Dict[str, List[ConversationTurn]] = {}
-        self.memory_file = os.path.join(memory_dir, "text_memory.pkl")
-        self.conversations_file = os.path.join(memory_dir, "conversations.json")
+        self._index = InvertedIndex()
+        self._entries_by_id: Dict[str, MemoryEntry] = {}
+        self._rows_by_id: Dict[str, int] = {}
+        self._partitions = RowPartitions()  # rows are positions in self.entries
+        self._lock = threading.RLock()  # guards entries and indexes within this process
+        self.dedup = dedup
+        self.duplicates_merged = 0
+        self._simhash = SimHashIndex(dedup_max_distance)
+        self.memory_file = os.path.join(memory_dir, "text_memory.pkl")  # legacy full pickle
+        self.log_dir = os.path.join(memory_dir, "text_memory_log")
+        self.conversations_file = os.path.join(memory_dir, "conversations.json")  # legacy single file
+        self.conversations_dir = os.path.join(memory_dir, "conversations")
+        self.archive_dir = os.path.join(memory_dir, "archive")
         
         # Create memory directory if it doesn't exist
         os.makedirs(memory_dir, exist_ok=True)
+        self._store = MemoryLogStore(self.log_dir, snapshot_source=lambda: self.entries, write_behind=True,
+                                     flush_interval=flush_interval, flush_max_records=flush_max_records,
+                                     shared=shared)
+        
+        self.conversations = ConversationStore(self.conversations_dir, ConversationTurn)
+        # Conversation turns get their own inverted index, caught up lazily on search
+        self._turn_index = InvertedIndex()
+        self._turns_by_id: Dict[str, Tuple[str, ConversationTurn]] = {}
+        self._turn_ids_by_session: Dict[str, List[str]] = {}
+        self._turn_marks: Dict[str, Tuple[int, Optional[float]]] = {}
+        self._next_turn_id = 0
+        self.archive = MemoryArchive(self.archive_dir)
         
         # Load existing memory
         self.load_memory()
+        self.load_conversations()
         
         logger.info(f"Text similarity memory initialized with {len(self.entries)} entries")
     
@@ -63,6 +100,88 @@ class TextSimilarityMemory:
         unique_str = f"{content}_{agent_name}_{time.time()}"
         return hashlib.sha256(unique_str.encode()).hexdigest()[:16]
     
+    def _tokenize(self, text: str) -> List[str]:
+        """Split text into the lowercase word tokens used for TF scoring."""
+        return re.findall(r'\b\w+\b', text.lower())
+    
+    def _index_entry(self, entry: MemoryEntry):
+        """Add an entry to the inverted and near-duplicate indexes."""
+        self._index.add(entry.id, self._tokenize(entry.content), entry.keywords)
+        self._entries_by_id[entry.id] = entry
+        if entry.simhash is None:
+            entry.simhash = SimHashIndex.fingerprint(entry.content)
+        self._simhash.add(entry.id, entry.simhash, (entry.agent_name, entry.entry_type))
+    
+    def _unindex_entry(self, entry: MemoryEntry):
+        """Remove an entry from the inverted and near-duplicate indexes."""
+        self._index.remove(entry.id)
+        self._entries_by_id.pop(entry.id, None)
+        self._simhash.remove(entry.id)
+    
+    def refresh(self):
+        """Apply memory mutations that other processes sharing this directory have logged."""
+        try:
+            with self._lock:
+                records = self._store.refresh()
+                if records is None:
+                    logger.info("Memory log was compacted by another process; reloading")
+                    self.load_memory()
+                elif records:
+                    self._apply_records(records)
+        except Exception as e:
+            logger.error(f"Failed to refresh memory: {e}")
+    
+    def _apply_records(self, records: List[Tuple[str, Any]]):
+        """Replay foreign ``("add", entry)`` / ``("delete", ids)`` log records without re-logging them."""
+        added: Dict[str, MemoryEntry] = {}
+        deleted = set()
+        for op, payload in records:
+            if op == "add":
+                added[payload.id] = payload
+                deleted.discard(payload.id)
+            else:
+                for entry_id in payload:
+                    added.pop(entry_id, None)
+                    deleted.add(entry_id)
+        if deleted:
+            self._remove_entries([entry.id not in deleted for entry in self.entries], log=False)
+        fresh = []
+        for entry in added.values():
+            row = self._rows_by_id.get(entry.id)
+            if row is None:
+                fresh.append(entry)
+            else:
+                # Re-logged entries (merged duplicates) keep their row
+                self._unindex_entry(self.entries[row])
+                self.entries[row] = entry
+                self._index_entry(entry)
+                self._partitions.update_row(row, entry.timestamp, metadata_importance(entry.metadata))
+        self._insert_entries(fresh, log=False)
+    
+    def _rebuild_index(self):
+        """Rebuild the inverted index from the current entries."""
+        self._index = InvertedIndex()
+        self._entries_by_id = {}
+        self._rows_by_id = {e.id: row for row, e in enumerate(self.entries)}
+        self._simhash = SimHashIndex(self._simhash.max_distance)
+        for entry in self.entries:
+            self._index_entry(entry)
+        self._partitions.rebuild(
+            [e.agent_name for e in self.entries],
+            [e.entry_type for e in self.entries],
+            [e.timestamp for e in self.entries],
+            [metadata_importance(e.metadata) for e in self.entries]
+        )
+    
+    def _apply_scoring(self, scores: Dict[str, float], scoring: Optional[ScoringOptions]) -> Dict[str, float]:
+        """Apply recency, importance and type weights to matched entries in one vectorized pass."""
+        if scoring is None or not scores:
+            return scores
+        doc_ids = list(scores)
+        rows = np.fromiter((self._rows_by_id[doc_id] for doc_id in doc_ids), dtype=np.int64, count=len(doc_ids))
+        values = np.fromiter(scores.values(), dtype=np.float64, count=len(doc_ids))
+        return dict(zip(doc_ids, scoring.apply(values, self._partitions, rows).tolist()))
+    
     def _extract_keywords(self, text: str) -> List[str]:
         """Extract keywords from text for similarity matching."""
         # Simple keyword extraction
@@ -71,15 +190,7 @@ class TextSimilarityMemory:
         words = re.findall(r'\b\w+\b', text)
         
         # Remove common stop words
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
-            'by', 'from', 'up', 'about', 'into', 'through', 'during', 'before', 'after',
-            'above', 'below', 'between', 'among', 'under', 'over', 'is', 'was', 'are', 'were',
-            'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
-            'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'
-        }
-        
-        keywords = [word for word in words if word not in stop_words and len(word) > 2]
+        keywords = [word for word in words if word not in STOP_WORDS and len(word) > 2]
         
         # Return most common keywords (up to 20)
         word_counts = Counter(keywords)
@@ -129,66 +240,130 @@ class TextSimilarityMemory:
     
     async def add_memory(self, content: str, agent_name: str, entry_type: str = "knowledge", 
                         metadata: Optional[Dict[str, Any]] = None) -> str:
-        """Add a new memory entry."""
+        """Add a new memory entry, merging rewordings of an existing entry into it.
+        
+        A close SimHash fingerprint only nominates the existing entry; it is
+        merged only if the texts differ at most in case, punctuation and a
+        few stop words, and it keeps its stored content.
+        """
         try:
-            keywords = self._extract_keywords(content)
-            entry_id = self._generate_id(content, agent_name)
-            
-            entry = MemoryEntry(
-                id=entry_id,
-                content=content,
-                keywords=keywords,
-                metadata=metadata or {},
-                timestamp=time.time(),
-                agent_name=agent_name,
-                entry_type=entry_type
-            )
-            
-            self.entries.append(entry)
-            self.save_memory()
-            
-            logger.debug(f"Added memory entry {entry_id} for agent {agent_name}")
-            return entry_id
+            self.refresh()
+            with self._lock:
+                fingerprint = SimHashIndex.fingerprint(content)
+                duplicate_id = self._simhash.find(
+                    fingerprint, (agent_name, entry_type),
+                    accept=lambda doc_id: SimHashIndex.same_wording(content, self._entries_by_id[doc_id].content)
+                ) if self.dedup else None
+                if duplicate_id is not None:
+                    duplicate = self._entries_by_id[duplicate_id]
+                    duplicate.hit_count += 1
+                    duplicate.timestamp = time.time()
+                    if metadata:
+                        duplicate.metadata.update(metadata)
+                    self._partitions.update_row(self._rows_by_id[duplicate_id], duplicate.timestamp,
+                                                metadata_importance(duplicate.metadata))
+                    self._store.append_add([duplicate])
+                    self.duplicates_merged += 1
+                    logger.debug(f"Merged duplicate memory into {duplicate_id} for agent {agent_name}")
+                    return duplicate_id
+                
+                keywords = self._extract_keywords(content)
+                entry_id = self._generate_id(content, agent_name)
+                
+                entry = MemoryEntry(
+                    id=entry_id,
+                    content=content,
+                    keywords=keywords,
+                    metadata=metadata or {},
+                    timestamp=time.time(),
+                    agent_name=agent_name,
+                    entry_type=entry_type,
+                    simhash=fingerprint
+                )
+                
+                self._insert_entries([entry])
+                
+                logger.debug(f"Added memory entry {entry_id} for agent {agent_name}")
+                return entry_id
             
         except Exception as e:
             logger.error(f"Failed to add memory: {e}")
             raise
     
     async def search_memory(self, query: str, agent_name: Optional[str] = None, 
-                           entry_type: Optional[str] = None, top_k: int = 5) -> List[MemoryEntry]:
-        """Search memory entries by similarity."""
+                           entry_type: Optional[str] = None, top_k: int = 5,
+                           scoring: Optional[ScoringOptions] = None,
+                           fields: Optional[Sequence[str]] = None) -> List[MemorySearchResult]:
+        """Search memory entries by similarity, optionally weighted by ``scoring``.
+        
+        Results are immutable records; ``fields`` limits which payload fields
+        they carry (see :class:`MemorySearchResult`).
+        """
+        fields = MemorySearchResult.projection(fields)
         try:
-            query_keywords = self._extract_keywords(query)
-            
-            # Filter entries by agent and type if specified
-            filtered_entries = self.entries
-            if agent_name:
-                filtered_entries = [e for e in filtered_entries if e.agent_name == agent_name]
-            if entry_type:
-                filtered_entries = [e for e in filtered_entries if e.entry_type == entry_type]
-            
-            # Calculate similarities
-            for entry in filtered_entries:
-                # Combine keyword similarity and TF-IDF similarity
-                keyword_sim = self._calculate_similarity(query_keywords, entry.keywords)
-                tfidf_sim = self._calculate_tfidf_similarity(query, entry.content)
+            self.refresh()
+            with self._lock:
+                query_keywords = self._extract_keywords(query)
                 
-                # Weighted combination (70% TF-IDF, 30% keywords)
-                entry.relevance_score = 0.7 * tfidf_sim + 0.3 * keyword_sim
-            
-            # Sort by relevance and return top k
-            sorted_entries = sorted(filtered_entries, key=lambda x: x.relevance_score or 0, reverse=True)
-            return sorted_entries[:top_k]
+                # Only entries sharing a term or keyword with the query get a score
+                scores = self._index.score(self._tokenize(query), query_keywords)
+                
+                # Filters restrict scoring to the rows of the matching partition
+                rows = self._partitions.rows(agent_name, entry_type)
+                candidates = self.entries if rows is None else [self.entries[row] for row in rows.tolist()]
+                if rows is not None:
+                    scores = {entry.id: scores[entry.id] for entry in candidates if entry.id in scores}
+                scores = self._apply_scoring(scores, scoring)
+                
+                return self._results(scores, candidates, top_k, fields)
             
         except Exception as e:
             logger.error(f"Failed to search memory: {e}")
             return []
     
+    async def search_memory_many(self, queries: List[str], agent_name: Optional[str] = None,
+                                 entry_type: Optional[str] = None, top_k: int = 5,
+                                 scoring: Optional[ScoringOptions] = None,
+                                 fields: Optional[Sequence[str]] = None) -> List[List[MemorySearchResult]]:
+        """Search several queries at once with one pass over the inverted index."""
+        fields = MemorySearchResult.projection(fields)
+        try:
+            self.refresh()
+            with self._lock:
+                all_scores = self._index.score_many(
+                    [(self._tokenize(query), self._extract_keywords(query)) for query in queries]
+                )
+                
+                rows = self._partitions.rows(agent_name, entry_type)
+                candidates = self.entries if rows is None else [self.entries[row] for row in rows.tolist()]
+                candidate_ids = None if rows is None else [entry.id for entry in candidates]
+                
+                results = []
+                for scores in all_scores:
+                    if candidate_ids is not None:
+                        scores = {doc_id: scores[doc_id] for doc_id in candidate_ids if doc_id in scores}
+                    scores = self._apply_scoring(scores, scoring)
+                    results.append(self._results(scores, candidates, top_k, fields))
+                return results
+            
+        except Exception as e:
+            logger.error(f"Failed to search memory: {e}")
+            return [[] for _ in queries]
+    
+    def _results(self, scores: Dict[str, float], candidates: List[MemoryEntry], top_k: int,
+                 fields: Tuple[str, ...]) -> List[MemorySearchResult]:
+        """Top-k results, padded with non-matching candidates in insertion order as a full sort would."""
+        results = [MemorySearchResult.from_entry(self._entries_by_id[doc_id], score, fields)
+                   for doc_id, score in self._index.top_k(scores, top_k)]
+        for entry in candidates:
+            if len(results) >= top_k:
+                break
+            if entry.id not in scores:
+                results.append(MemorySearchResult.from_entry(entry, 0.0, fields))
+        return results
+    
     def add_conversation_turn(self, session_id: str, role: str, content: str, agent_name: Optional[str] = None):
         """Add a turn to a conversation."""
-        if session_id not in self.conversations:
-            self.conversations[session_id] = []
-        
         turn = ConversationTurn(
             role=role,
             content=content,
@@ -196,58 +371,276 @@ class TextSimilarityMemory:
             agent_name=agent_name
         )
         
-        self.conversations[session_id].append(turn)
-        self.save_conversations()
+        self.conversations.append(session_id, turn)
         
         logger.debug(f"Added conversation turn for session {session_id}")
     
     def get_conversation_history(self, session_id: str, last_n: Optional[int] = None) -> List[ConversationTurn]:
         """Get conversation history for a session."""
-        if session_id not in self.conversations:
-            return []
+        return self.conversations.history(session_id, last_n)
+    
+    def get_conversation_window(self, session_id: str, max_tokens: int,
+                                use_summary: bool = True) -> List[ConversationTurn]:
+        """Most recent turns that fit in ``max_tokens``, ready to be placed in a prompt.
         
-        history = self.conversations[session_id]
-        if last_n:
-            return history[-last_n:]
-        return history
-    
-    def get_agent_memories(self, agent_name: str, entry_type: Optional[str] = None) -> List[MemoryEntry]:
-        """Get all memories for a specific agent."""
-        memories = [e for e in self.entries if e.agent_name == agent_name]
-        if entry_type:
-            memories = [e for e in memories if e.entry_type == entry_type]
-        return sorted(memories, key=lambda x: x.timestamp, reverse=True)
+        When the session has a rolling summary (see :meth:`summarize_conversation`)
+        it leads the window as a ``system`` turn and only newer turns follow.
+        """
+        summary, turns = self.conversations.window(session_id, max_tokens, use_summary)
+        if summary is None:
+            return turns
+        summary_turn = ConversationTurn(role="system", content=summary["content"],
+                                        timestamp=summary["through"], tokens=summary["tokens"])
+        return [summary_turn] + turns
+    
+    def summarize_conversation(self, session_id: str, keep_tokens: int = 2000,
+                               summarizer=extractive_turn_summary) -> Optional[str]:
+        """Fold turns older than the newest ``keep_tokens`` into the session's rolling summary.
+        
+        ``summarizer(previous_summary, turns)`` returns the new summary text;
+        an LLM-backed summarizer can be passed in place of the extractive default.
+        """
+        try:
+            summary = self.conversations.summarize(session_id, summarizer, keep_tokens)
+            return summary["content"] if summary else None
+        except Exception as e:
+            logger.error(f"Failed to summarize conversation {session_id}: {e}")
+            return None
+    
+    async def search_conversations(self, query: str, session_id: Optional[str] = None,
+                                   role: Optional[str] = None, top_k: int = 5) -> List[ConversationSearchResult]:
+        """Search conversation turns across all sessions by text similarity.
+        
+        Only turns sharing a term or keyword with the query are scored, through
+        the same inverted index used for memories; ``session_id`` and ``role``
+        filter the hits.
+        """
+        try:
+            with self._lock:
+                self._sync_conversation_index()
+                scores = self._turn_index.score(self._tokenize(query), self._extract_keywords(query))
+                if session_id is not None:
+                    session_turns = self._turn_ids_by_session.get(session_id, ())
+                    scores = {doc_id: scores[doc_id] for doc_id in session_turns if doc_id in scores}
+                if role is not None:
+                    scores = {doc_id: score for doc_id, score in scores.items()
+                              if self._turns_by_id[doc_id][1].role == role}
+                return [ConversationSearchResult.from_turn(*self._turns_by_id[doc_id], score)
+                        for doc_id, score in self._turn_index.top_k(scores, top_k)]
+        except Exception as e:
+            logger.error(f"Failed to search conversations: {e}")
+            return []
+    
+    def _sync_conversation_index(self):
+        """Index the turns written to any session since the previous sync."""
+        for session_id, reset, turns in self.conversations.changes(self._turn_marks):
+            if reset:
+                for doc_id in self._turn_ids_by_session.pop(session_id, []):
+                    self._turn_index.remove(doc_id)
+                    del self._turns_by_id[doc_id]
+            doc_ids = self._turn_ids_by_session.setdefault(session_id, [])
+            for turn in turns:
+                doc_id = str(self._next_turn_id)
+                self._next_turn_id += 1
+                self._turn_index.add(doc_id, self._tokenize(turn.content), self._extract_keywords(turn.content))
+                self._turns_by_id[doc_id] = (session_id, turn)
+                doc_ids.append(doc_id)
+    
+    def get_agent_memories(self, agent_name: str, entry_type: Optional[str] = None,
+                           limit: Optional[int] = None) -> List[MemoryEntry]:
+        """Get memories for a specific agent, newest first."""
+        self.refresh()
+        with self._lock:
+            rows = self._partitions.recent_rows(agent_name, entry_type, limit)
+            return [self.entries[row] for row in rows.tolist()]
     
     def cleanup_old_memories(self, max_age_days: int = 30):
         """Remove memories older than specified days."""
         cutoff_time = time.time() - (max_age_days * 24 * 60 * 60)
-        initial_count = len(self.entries)
+        self.refresh()
+        with self._lock:
+            initial_count = len(self.entries)
+            self._remove_entries([entry.timestamp > cutoff_time for entry in self.entries])
         
-        self.entries = [e for e in self.entries if e.timestamp > cutoff_time]
-        
-        # Also cleanup old conversations
-        for session_id in list(self.conversations.keys()):
-            self.conversations[session_id] = [
-                turn for turn in self.conversations[session_id] 
-                if turn.timestamp > cutoff_time
-            ]
-            if not self.conversations[session_id]:
-                del self.conversations[session_id]
+        # Expire old conversation turns in the background
+        self.conversations.expire(cutoff_time)
         
         removed_count = initial_count - len(self.entries)
         if removed_count > 0:
             logger.info(f"Cleaned up {removed_count} old memory entries")
-            self.save_memory()
-            self.save_conversations()
+    
+    def _insert_entries(self, entries: List[MemoryEntry], log: bool = True):
+        """Append entries to the indexes, partitions and (``log``) the log."""
+        if not entries:
+            return
+        for entry in entries:
+            self._rows_by_id[entry.id] = len(self.entries)
+            self.entries.append(entry)
+            self._index_entry(entry)
+        self._partitions.add([e.agent_name for e in entries], [e.entry_type for e in entries],
+                             [e.timestamp for e in entries], [metadata_importance(e.metadata) for e in entries])
+        if log:
+            self._store.append_add(entries)
+    
+    def _remove_entries(self, keep_mask: List[bool], log: bool = True) -> List[str]:
+        """Drop the entries whose ``keep_mask`` is False, returning their ids."""
+        kept_entries = []
+        removed_ids = []
+        for entry, keep in zip(self.entries, keep_mask):
+            if keep:
+                kept_entries.append(entry)
+            else:
+                removed_ids.append(entry.id)
+                self._unindex_entry(entry)
+        if not removed_ids:
+            return []
+        self.entries = kept_entries
+        self._rows_by_id = {e.id: row for row, e in enumerate(self.entries)}
+        self._partitions.keep(keep_mask)
+        if log:
+            self._store.append_delete(removed_ids)
+        return removed_ids
+    
+    def consolidate_memories(self, max_age_days: float = 7, entry_types=DEFAULT_CONSOLIDATE_TYPES,
+                             cluster_size: int = 20, min_cluster_size: int = 3,
+                             summarizer=None) -> Dict[str, Any]:
+        """Fold old memories into per-cluster summary entries.
+        
+        Entries of ``entry_types`` older than ``max_age_days`` are grouped per
+        agent and type by their most widespread keyword; groups larger than
+        ``cluster_size`` are split in time order. Every cluster of at least
+        ``min_cluster_size`` entries is replaced by one summary entry carrying
+        the cluster's top keywords, and its originals are moved to the archive.
+        """
+        cutoff_time = time.time() - (max_age_days * 24 * 60 * 60)
+        self.refresh()
+        with self._lock:
+            groups: Dict[Tuple[str, str], List[int]] = {}
+            for entry_type in entry_types:
+                rows = self._partitions.rows(None, entry_type)
+                if rows is None or len(rows) == 0:
+                    continue
+                for row in rows[self._partitions.timestamps(rows) <= cutoff_time].tolist():
+                    groups.setdefault((self.entries[row].agent_name, entry_type), []).append(row)
+            
+            summaries: List[MemoryEntry] = []
+            archived: List[Tuple[str, List[MemoryEntry]]] = []
+            keep_mask = [True] * len(self.entries)
+            for rows in groups.values():
+                if len(rows) < min_cluster_size:
+                    continue
+                clusters: Dict[int, List[int]] = {}
+                for row, label in zip(rows, keyword_clusters([self.entries[row].keywords for row in rows])):
+                    if label >= 0:
+                        clusters.setdefault(label, []).append(row)
+                for members in clusters.values():
+                    members.sort(key=lambda row: self.entries[row].timestamp)
+                    for start in range(0, len(members), cluster_size):
+                        chunk = members[start:start + cluster_size]
+                        if len(chunk) < min_cluster_size:
+                            continue
+                        originals = [self.entries[row] for row in chunk]
+                        summary = self._summary_entry(originals, summarizer)
+                        summaries.append(summary)
+                        archived.append((summary.id, originals))
+                        for row in chunk:
+                            keep_mask[row] = False
+            
+            if not summaries:
+                return {"clusters": 0, "archived": 0, "entries": len(self.entries)}
+            # Archive before deleting so a crash never loses the originals
+            self.archive.append(archived)
+            self._remove_entries(keep_mask)
+            self._insert_entries(summaries)
+            archived_count = sum(len(originals) for _, originals in archived)
+            logger.info(f"Consolidated {archived_count} memories into {len(summaries)} summaries")
+            return {"clusters": len(summaries), "archived": archived_count, "entries": len(self.entries)}
+    
+    def _summary_entry(self, originals: List[MemoryEntry], summarizer) -> MemoryEntry:
+        keyword_counts = Counter(keyword for entry in originals for keyword in entry.keywords)
+        keywords = [keyword for keyword, _ in keyword_counts.most_common(10)]
+        # Members sharing the most cluster keywords first
+        ranked = sorted(originals, key=lambda entry: -sum(keyword_counts[k] for k in set(entry.keywords)))
+        contents = [entry.content for entry in ranked]
+        content = summarizer(contents) if summarizer else extractive_summary(contents, keywords[:5])
+        first = originals[0]
+        metadata = {
+            "consolidated": True,
+            "source_ids": [entry.id for entry in originals],
+            "source_count": len(originals),
+            "first_timestamp": min(entry.timestamp for entry in originals),
+        }
+        importance = max(metadata_importance(entry.metadata) for entry in originals)
+        if importance:
+            metadata[IMPORTANCE_KEY] = importance
+        return MemoryEntry(
+            id=self._generate_id(content, first.agent_name),
+            content=content,
+            keywords=keywords,
+            metadata=metadata,
+            timestamp=max(entry.timestamp for entry in originals),
+            agent_name=first.agent_name,
+            entry_type=first.entry_type,
+            hit_count=sum(entry.hit_count for entry in originals)
+        )
+    
+    def get_archived_memories(self, summary_id: str) -> List[MemoryEntry]:
+        """Original entries that were consolidated into ``summary_id``."""
+        try:
+            return self.archive.get(summary_id)
+        except Exception as e:
+            logger.error(f"Failed to read memory archive: {e}")
+            return []
+    
+    def export_memory(self, path: str) -> int:
+        """Export every entry to the columnar directory ``path``; returns the entry count."""
+        self.refresh()
+        with self._lock:
+            entries = list(self.entries)
+        return export_entries(path, entries, "text", table_fields=("id", "content", "metadata", "keywords"))
+    
+    def import_memory(self, path: str, batch_size: int = 10000) -> Dict[str, int]:
+        """Stream entries from a columnar export, indexing each batch as it is read.
+        
+        Only one batch of the export is held in memory besides the imported
+        entries themselves. Entries whose id already exists are skipped.
+        Exports from the vector backend are accepted; their embeddings are
+        ignored and keywords are extracted from the content.
+        """
+        self.refresh()
+        imported = skipped = 0
+        try:
+            for rows, _ in iter_import(path, batch_size):
+                entries = []
+                with self._lock:
+                    for row in rows:
+                        if row["id"] in self._rows_by_id:
+                            skipped += 1
+                            continue
+                        entries.append(MemoryEntry(
+                            id=row["id"],
+                            content=row["content"],
+                            keywords=row.get("keywords") or self._extract_keywords(row["content"]),
+                            metadata=row["metadata"],
+                            timestamp=row["timestamp"],
+                            agent_name=row["agent_name"],
+                            entry_type=row["entry_type"],
+                            hit_count=row["hit_count"]
+                        ))
+                    self._insert_entries(entries)
+                imported += len(entries)
+                self._store.flush()
+        finally:
+            if imported:
+                self.save_memory()
+        logger.info(f"Imported {imported} memory entries from {path} ({skipped} already present)")
+        return {"imported": imported, "skipped": skipped}
     
     def get_memory_stats(self) -> Dict[str, Any]:
         """Get memory system statistics."""
-        agent_counts = {}
-        type_counts = {}
-        
-        for entry in self.entries:
-            agent_counts[entry.agent_name] = agent_counts.get(entry.agent_name, 0) + 1
-            type_counts[entry.entry_type] = type_counts.get(entry.entry_type, 0) + 1
+        self.refresh()
+        agent_counts = self._partitions.counts(by_agent=True)
+        type_counts = self._partitions.counts(by_agent=False)
         
         return {
             "total_entries": len(self.entries),
@@ -256,62 +649,74 @@ class TextSimilarityMemory:
             "entries_by_type": type_counts,
             "oldest_entry": min((e.timestamp for e in self.entries), default=0),
             "newest_entry": max((e.timestamp for e in self.entries), default=0),
+            "duplicates_merged": self.duplicates_merged,
+            "persistence": {
+                "pending_writes": self._store.pending,
+                "log_writes": self._store.write_count,
+                "shared": self._store.shared
+            },
             "memory_type": "text_similarity"
         }
     
+    def flush(self):
+        """Write queued memory mutations to disk; call before shutdown."""
+        try:
+            self._store.flush()
+            self.conversations.close()
+        except Exception as e:
+            logger.error(f"Failed to flush memory: {e}")
+    
     def save_memory(self):
-        """Save memory entries to disk."""
+        """Checkpoint memory entries into a compacted snapshot."""
         try:
-            with open(self.memory_file, 'wb') as f:
-                pickle.dump(self.entries, f)
+            self._store.compact(wait=True)
         except Exception as e:
             logger.error(f"Failed to save memory: {e}")
     
     def load_memory(self):
-        """Load memory entries from disk."""
+        """Load memory entries from the snapshot and segment log."""
         try:
-            if os.path.exists(self.memory_file):
+            if self._store.is_empty() and os.path.exists(self.memory_file):
+                # Migrate a legacy full pickle into the log store once
                 with open(self.memory_file, 'rb') as f:
                     self.entries = pickle.load(f)
+                self._store.append_add(self.entries)
+                self._store.compact(wait=True)
+                logger.info(f"Migrated {len(self.entries)} entries from {self.memory_file}")
+            else:
+                self.entries = self._store.load()
         except Exception as e:
             logger.error(f"Failed to load memory: {e}")
             self.entries = []
+        self._rebuild_index()
     
     def save_conversations(self):
-        """Save conversations to disk."""
+        """Wait for pending conversation expiry; turns are persisted as they are appended."""
         try:
-            # Convert ConversationTurn objects to dictionaries
-            serializable_conversations = {}
-            for session_id, turns in self.conversations.items():
-                serializable_conversations[session_id] = [asdict(turn) for turn in turns]
-            
-            with open(self.conversations_file, 'w') as f:
-                json.dump(serializable_conversations, f, indent=2)
+            self.conversations.close()
         except Exception as e:
             logger.error(f"Failed to save conversations: {e}")
     
     def load_conversations(self):
-        """Load conversations from disk."""
+        """Migrate the legacy single-file conversation history into per-session files."""
         try:
-            if os.path.exists(self.conversations_file):
+            if len(self.conversations) == 0 and os.path.exists(self.conversations_file):
                 with open(self.conversations_file, 'r') as f:
                     data = json.load(f)
                 
-                # Convert dictionaries back to ConversationTurn objects
-                self.conversations = {}
                 for session_id, turns in data.items():
-                    self.conversations[session_id] = [
-                        ConversationTurn(**turn) for turn in turns
-                    ]
+                    self.conversations.append_many(
+                        session_id, [ConversationTurn(**turn) for turn in turns]
+                    )
+                logger.info(f"Migrated {len(data)} conversations from {self.conversations_file}")
         except Exception as e:
             logger.error(f"Failed to load conversations: {e}")
-            self.conversations = {}
 
 # Create a compatibility alias for the VectorMemory class
 VectorMemory = TextSimilarityMemory
 
-# Global memory instance
-vector_memory = TextSimilarityMemory()
+# Global memory instance, opened on first use
+vector_memory = LazyInstance(TextSimilarityMemory)
 
 # Utility functions
 async def remember(content: str, agent_name: str, entry_type: str = "knowledge", 
@@ -320,9 +725,18 @@ async def remember(content: str, agent_name: str, entry_type: str = "knowledge",
     return await vector_memory.add_memory(content, agent_name, entry_type, metadata)
 
 async def recall(query: str, agent_name: Optional[str] = None, 
-                entry_type: Optional[str] = None, top_k: int = 5) -> List[MemoryEntry]:
+                entry_type: Optional[str] = None, top_k: int = 5,
+                scoring: Optional[ScoringOptions] = None,
+                fields: Optional[Sequence[str]] = None) -> List[MemorySearchResult]:
     """Search agent memory."""
-    return await vector_memory.search_memory(query, agent_name, entry_type, top_k)
+    return await vector_memory.search_memory(query, agent_name, entry_type, top_k, scoring, fields)
+
+async def recall_many(queries: List[str], agent_name: Optional[str] = None,
+                      entry_type: Optional[str] = None, top_k: int = 5,
+                      scoring: Optional[ScoringOptions] = None,
+                      fields: Optional[Sequence[str]] = None) -> List[List[MemorySearchResult]]:
+    """Search agent memory for several queries in one pass."""
+    return await vector_memory.search_memory_many(queries, agent_name, entry_type, top_k, scoring, fields)
 
 def add_to_conversation(session_id: str, role: str, content: str, agent_name: Optional[str] = None):
     """Add to conversation history."""
@@ -332,15 +746,30 @@ def get_conversation(session_id: str, last_n: Optional[int] = None) -> List[Conv
     """Get conversation history."""
     return vector_memory.get_conversation_history(session_id, last_n)
 
+def get_conversation_window(session_id: str, max_tokens: int) -> List[ConversationTurn]:
+    """Get the most recent conversation turns that fit a token budget."""
+    return vector_memory.get_conversation_window(session_id, max_tokens)
+
+async def search_conversations(query: str, session_id: Optional[str] = None, role: Optional[str] = None,
+                               top_k: int = 5) -> List[ConversationSearchResult]:
+    """Search conversation turns across sessions."""
+    return await vector_memory.search_conversations(query, session_id, role, top_k)
+
 # Export main classes and functions
 __all__ = [
     "VectorMemory",
     "TextSimilarityMemory",
     "MemoryEntry",
     "ConversationTurn",
+    "ConversationSearchResult",
+    "ScoringOptions",
+    "MemorySearchResult",
     "vector_memory",
     "remember",
     "recall",
+    "recall_many",
     "add_to_conversation",
-    "get_conversation"
+    "get_conversation",
+    "get_conversation_window",
+    "search_conversations"
 ]